@@ -1,8 +1,13 @@
-import subprocess
-import json
 from textwrap import dedent
 
-def synthesize_answer(question: str, contexts: list[str]) -> str:
+from deadline import DEFAULT_BUDGET, Deadline
+from generators import get_generator
+
+# a teljes hossz beleférjen az alap költségvetésbe (15 s, 25 token/s → ~340 token),
+# különben a "generate" minden kérésnél megkurtítottnak számítana
+MAX_TOKENS = 300
+
+def synthesize_answer(question: str, contexts: list[str], deadline: Deadline = None) -> str:
     prompt = dedent(f"""
     You are a Rackhost internal knowledgebase assistant.
     You MUST answer only from the provided context. Never add new information.
@@ -19,9 +24,23 @@ def synthesize_answer(question: str, contexts: list[str]) -> str:
     - Direct links if included in context
     """)
 
-    result = subprocess.run(
-        ["ollama", "run", "mistral"],
-        input=prompt.encode("utf-8"),
-        stdout=subprocess.PIPE
-    )
-    return result.stdout.decode("utf-8").strip()
+    # hosszú életű Ollama backend (meleg modell, timeout, circuit breaker);
+    # a válasz hossza és a várakozás a hátralévő időhöz igazodik (deadline.py)
+    llm = get_generator("ollama", model="mistral:latest")
+    deadline = deadline or Deadline(DEFAULT_BUDGET)
+    max_tokens = deadline.max_tokens(MAX_TOKENS)
+    answer = None
+    if max_tokens:
+        answer = deadline.run(llm.generate, prompt, max_tokens=max_tokens, timeout=llm.timeout,
+                              timeout_arg="timeout" if llm.interruptible else None)
+
+    # LLM nem elérhető / nem végzett időben → a legjobb kontextus rövid kivonata
+    if not answer:
+        if not contexts:
+            answer = "Erre a kérdésre nem találtam választ a tudásbázisban."
+        else:
+            answer = " ".join(contexts[0].split()[:60]) + "..."
+    # a határidő miatt megkurtított lépések a válasz végére (mint a többi QA útvonalon)
+    if deadline.cut:
+        answer += f"\n\n⏱️  Határidő miatt megkurtítva: {', '.join(deadline.cut)}"
+    return answer
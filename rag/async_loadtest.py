@@ -0,0 +1,112 @@
+# rag/async_loadtest.py
+"""
+Terheléses teszt az aszinkron QA útvonalra stub LLM-mel.
+
+N szimulált ügyfélszolgálatos egyszerre kérdez; a stub LLM fix késleltetéssel
+válaszol és legfeljebb --backend-limit kérést szolgál ki párhuzamosan (mint
+az Ollama OLLAMA_NUM_PARALLEL beállítása). Az áteresztőképességnek kb.
+lineárisan kell nőnie N-nel, amíg el nem éri a backend limitjét.
+
+    python rag/async_loadtest.py --agents 1 2 4 8 16 --requests 40
+    python rag/async_loadtest.py --real-retrieval   # valódi embedder + Chroma
+"""
+import argparse
+import asyncio
+import time
+
+from async_qa import AsyncQA, Overloaded
+
+QUESTIONS = [
+    "Hogyan állítsam be a domain-t?",
+    "Hogyan tudok cPanelbe belépni?",
+    "Mennyi ideig tart a domain átregisztráció?",
+    "Hogyan állítok be e-mail fiókot?",
+    "Mi az a VPS?",
+]
+
+
+def make_stub_generate(latency: float, backend_limit: int):
+    backend = asyncio.Semaphore(backend_limit)
+
+    async def generate(prompt: str) -> str:
+        async with backend:
+            await asyncio.sleep(latency)
+        return "Stub válasz: " + prompt[-60:].replace("\n", " ")
+
+    return generate
+
+
+def stub_retrieve(question: str):
+    time.sleep(0.002)  # ~ embedding + lekérdezés CPU ideje
+    return [{"text": "stub kontextus " * 20, "title": "Stub", "url": "", "distance": 0.3, "rank": 1}]
+
+
+def stub_prompt(question: str, contexts: list) -> str:
+    return f"{contexts[0]['text']}\n\nKÉRDÉS: {question}"
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+async def run_level(n_agents: int, n_requests: int, args) -> dict:
+    generate = make_stub_generate(args.latency, args.backend_limit)
+    if args.real_retrieval:
+        engine = AsyncQA(generate=generate, max_generations=args.backend_limit, max_pending=args.max_pending)
+    else:
+        engine = AsyncQA(retrieve=stub_retrieve, build_prompt=stub_prompt, fallback=lambda c: "fallback",
+                         generate=generate, max_generations=args.backend_limit, max_pending=args.max_pending)
+
+    latencies = []
+    rejected = 0
+    counter = iter(range(n_requests))
+
+    async def agent():
+        nonlocal rejected
+        for i in counter:
+            t0 = time.perf_counter()
+            try:
+                await engine.answer_question(QUESTIONS[i % len(QUESTIONS)])
+                latencies.append(time.perf_counter() - t0)
+            except Overloaded:
+                rejected += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(agent() for _ in range(n_agents)))
+    wall = time.perf_counter() - t0
+    await engine.aclose()
+
+    return {
+        "agents": n_agents,
+        "throughput": len(latencies) / wall,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "rejected": rejected,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Async QA terheléses teszt stub LLM-mel")
+    ap.add_argument("--agents", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--requests", type=int, default=40, help="kérések száma szintenként")
+    ap.add_argument("--latency", type=float, default=0.2, help="stub LLM válaszideje (s)")
+    ap.add_argument("--backend-limit", type=int, default=8, help="stub LLM párhuzamossága")
+    ap.add_argument("--max-pending", type=int, default=64)
+    ap.add_argument("--real-retrieval", action="store_true", help="valódi embedder + Chroma")
+    args = ap.parse_args()
+
+    print(f"Stub LLM: {args.latency * 1000:.0f} ms, backend limit: {args.backend_limit}\n")
+    print(f"{'agentek':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'elutasítva':>10}")
+    base = None
+    for n in args.agents:
+        r = asyncio.run(run_level(n, args.requests, args))
+        base = base or r["throughput"]
+        print(f"{r['agents']:>8} {r['throughput']:>8.1f} {r['p50'] * 1000:>8.0f} "
+              f"{r['p95'] * 1000:>8.0f} {r['rejected']:>10}   (×{r['throughput'] / base:.1f})")
+
+
+if __name__ == "__main__":
+    main()
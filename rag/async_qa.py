@@ -0,0 +1,221 @@
+# rag/async_qa.py
+"""
+Aszinkron QA útvonal több párhuzamos ügyfélszolgálatos számára.
+
+- előre generált GYIK válasz (faq_table.py) esetén nincs retrieval és LLM hívás
+- az embedding + Chroma lekérdezés (CPU / blokkoló) egy korlátos
+  thread poolban fut, nem blokkolja az event loopot
+- a generálás a generátor-réteg agenerate() hívásán megy (Ollamánál httpx)
+- kérésenkénti megszakítás: cancel(request_id), ha az agent továbblép
+- backpressure: MAX_PENDING fölött azonnal Overloaded hibát adunk,
+  nem sorakoztatjuk a kéréseket a végtelenségig
+- határidő (deadline.py): a sorban állás + generálás legfeljebb a
+  kérés költségvetéséig tart, utána snippet fallback; a num_predict a
+  hátralévő időhöz igazodik
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from deadline import DEFAULT_BUDGET, HEDGE_RESERVE, Deadline
+from query_log import log_query
+
+CPU_WORKERS = 2          # embedding / retrieval párhuzamosság
+MAX_GENERATIONS = 4      # egyszerre futó LLM hívások (≈ OLLAMA_NUM_PARALLEL)
+MAX_PENDING = 32         # ennél több függő kérésnél elutasítunk
+MAX_NEW_TOKENS = 200
+
+
+class Overloaded(RuntimeError):
+    """Túl sok függő kérés – a hívó próbálja újra később."""
+
+
+class AsyncQA:
+    def __init__(self,
+                 retrieve: Optional[Callable] = None,
+                 build_prompt: Optional[Callable] = None,
+                 fallback: Optional[Callable] = None,
+                 generate: Optional[Callable] = None,
+                 gate: Optional[Callable] = None,
+                 faq: Optional[Callable] = None,
+                 cpu_workers: int = CPU_WORKERS,
+                 max_generations: int = MAX_GENERATIONS,
+                 max_pending: int = MAX_PENDING,
+                 budget: Optional[float] = DEFAULT_BUDGET):
+        # a saját retrieval a határidőt is megkapja (szűkös időnél kevesebb újrapontozás, Chroma timeout)
+        self._retrieve_deadline = retrieve is None
+        if retrieve is None or build_prompt is None or fallback is None:
+            # lusta import: az embedder csak akkor töltődik, ha tényleg kell
+            import rag_qa_ollama
+            retrieve = retrieve or rag_qa_ollama.retrieve_best_contexts
+            build_prompt = build_prompt or rag_qa_ollama.build_prompt
+            fallback = fallback or rag_qa_ollama.fallback_snippet_answer
+            if gate is None:
+                from confidence_gate import get_gate
+                gate = lambda contexts: get_gate(rag_qa_ollama.COLLECTION_NAME).decide(contexts)
+            if faq is None:
+                # a kérdés embeddingje cache-be kerül, a retrieval már onnan veszi
+                from faq_table import get_faq_table
+                faq = lambda question: get_faq_table().lookup(rag_qa_ollama.embed_query(question))
+
+        self._retrieve = retrieve
+        self._build_prompt = build_prompt
+        self._fallback = fallback
+        self._generate = generate or self._ollama_generate
+        self._adaptive = generate is None   # a saját generátor kapja a határidőhöz igazított max_tokens-t
+        self._budget = budget
+        self._gate = gate or (lambda contexts: "generate" if contexts else "refuse")
+        self._faq = faq or (lambda question: None)
+
+        self._executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="qa-cpu")
+        self._max_generations = max_generations
+        self._gen_slots = None  # a futó event loopban hozzuk létre (Python 3.9)
+        self._http = None       # httpx.AsyncClient, a motor event loopjához kötve; aclose() zárja
+        self._max_pending = max_pending
+        self._pending = 0
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # ---------- generálás ----------
+
+    async def _ollama_generate(self, prompt: str, max_tokens: int = MAX_NEW_TOKENS) -> Optional[str]:
+        from rag_qa_ollama import get_llm
+        if self._http is None:
+            try:
+                import httpx
+                self._http = httpx.AsyncClient()
+            except ImportError:
+                pass
+        return await get_llm().agenerate(prompt, max_tokens=max_tokens, client=self._http)
+
+    async def _generate_in_slot(self, prompt: str, max_tokens: int, timings: dict) -> Optional[str]:
+        t1 = time.perf_counter()
+        async with self._gen_slots:
+            timings["queue"] = time.perf_counter() - t1
+            if self._adaptive:
+                return await self._generate(prompt, max_tokens)
+            return await self._generate(prompt)
+
+    # ---------- fő útvonal ----------
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def answer_question(self, question: str) -> dict:
+        if self._pending >= self._max_pending:
+            raise Overloaded(f"Túl sok függő kérés ({self._pending})")
+
+        if self._gen_slots is None:
+            self._gen_slots = asyncio.Semaphore(self._max_generations)
+
+        self._pending += 1
+        t0 = time.perf_counter()
+        deadline = Deadline(self._budget)
+        timings = {}
+        contexts, decision = [], None
+        try:
+            loop = asyncio.get_running_loop()
+
+            # előre generált, jóváhagyott GYIK válasz → nincs retrieval és LLM hívás
+            faq = await loop.run_in_executor(self._executor, self._faq, question)
+            timings["faq"] = time.perf_counter() - t0
+            if faq:
+                decision = "faq"
+                return {"answer": faq["answer"], "contexts": contexts, "fallback": False, "faq": faq,
+                        "decision": decision, "timings": timings, "cut": deadline.cut}
+
+            t1 = time.perf_counter()
+            retrieve = (functools.partial(self._retrieve, question, deadline=deadline)
+                        if self._retrieve_deadline else functools.partial(self._retrieve, question))
+            contexts = await loop.run_in_executor(self._executor, retrieve)
+            timings["retrieve"] = time.perf_counter() - t1
+
+            # magabiztossági kapu: elutasítás / snippet generálás nélkül
+            decision = self._gate(contexts)
+            if decision == "refuse":
+                return {"answer": None, "contexts": contexts, "fallback": True, "decision": decision,
+                        "timings": timings, "cut": deadline.cut}
+            if decision == "snippet":
+                return {"answer": self._fallback(contexts), "contexts": contexts, "fallback": True,
+                        "decision": decision, "timings": timings, "cut": deadline.cut}
+
+            prompt = self._build_prompt(question, contexts)
+
+            # ha már MIN_GEN_TOKENS sem fér bele a hátralévő időbe, nem hívunk LLM-et
+            max_tokens = deadline.max_tokens(MAX_NEW_TOKENS)
+            llm_answer = None
+            t1 = time.perf_counter()
+            if max_tokens:
+                try:
+                    # hedge: sorban állás + generálás együtt is a határidő előtt ér véget
+                    llm_answer = await asyncio.wait_for(self._generate_in_slot(prompt, max_tokens, timings),
+                                                        timeout=deadline.timeout(reserve=HEDGE_RESERVE))
+                except asyncio.TimeoutError:
+                    deadline.mark_cut("generate")
+            timings["generate"] = time.perf_counter() - t1
+
+            use_fallback = not llm_answer or len(llm_answer) < 30
+            answer = self._fallback(contexts) if use_fallback else llm_answer
+            return {"answer": answer, "contexts": contexts, "fallback": use_fallback,
+                    "decision": decision, "timings": timings, "cut": deadline.cut}
+        finally:
+            timings["total"] = time.perf_counter() - t0
+            self._pending -= 1
+            log_query("async_qa", question, contexts, timings, decision=decision, cut=deadline.cut)
+
+    def submit(self, request_id: str, question: str) -> asyncio.Task:
+        """Kérés indítása azonosítóval, hogy később megszakítható legyen."""
+        task = asyncio.ensure_future(self.answer_question(question))
+        self._tasks[request_id] = task
+        task.add_done_callback(lambda t: self._forget(request_id, t))
+        return task
+
+    def _forget(self, request_id: str, task: asyncio.Task) -> None:
+        # újrahasznált azonosítónál a régi task ne vegye ki az újat
+        if self._tasks.get(request_id) is task:
+            del self._tasks[request_id]
+
+    def cancel(self, request_id: str) -> bool:
+        """Az agent elnavigált: a futó generálás HTTP kérése is megszakad."""
+        task = self._tasks.get(request_id)
+        if task is None or task.done():
+            return False
+        return task.cancel()
+
+    async def aclose(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self._executor.shutdown(wait=False)
+
+
+async def answer_question(question: str, engine: Optional[AsyncQA] = None) -> dict:
+    """Egyszerű belépési pont: egy kérdés, alapértelmezett motorral."""
+    own = engine is None
+    engine = engine or AsyncQA()
+    try:
+        return await engine.answer_question(question)
+    finally:
+        if own:
+            await engine.aclose()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print('Használat: python3 rag/async_qa.py "kérdés szövege"')
+        sys.exit(1)
+
+    result = asyncio.run(answer_question(" ".join(sys.argv[1:])))
+    print(result["answer"] or "Erre a kérdésre nem találtam választ a tudásbázisban.")
+    print({k: round(v, 3) for k, v in result["timings"].items()})
+    if result["cut"]:
+        print(f"⏱️  Határidő miatt megkurtítva: {', '.join(result['cut'])}")
+
+    from confidence_gate import report as confidence_gate_report
+    print("\n" + confidence_gate_report())
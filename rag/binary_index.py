@@ -0,0 +1,165 @@
+# rag/binary_index.py
+"""
+Bináris kvantált első kör + lebegőpontos újrapontozás.
+
+Minden chunk embeddingjéből előjel-bit kódot képzünk (dimenziónként 1 bit,
+uint64 szavakba csomagolva). Keresésnél:
+
+    1. Hamming-távolság popcount-tal az összes kódon → top-N jelölt
+    2. a jelölteket a teljes pontosságú vektorokkal újrapontozzuk
+       (négyzetes L2, ugyanaz a skála, mint a Chroma "l2" távolsága)
+
+384 dimenziónál egy kód 48 bájt (float32-ben 1536 bájt), így a teljes
+multi-source korpusz kódjai elférnek az L2/L3 cache-ben. A lebegőpontos
+vektorokat mmap-pel nyitjuk meg, csak a jelöltek lapjai töltődnek be.
+
+Az index a Chroma snapshot mellé kerül (<index könyvtár>/binary/).
+
+    python rag/binary_index.py build [kollekció]     # export az élő kollekcióból
+    python rag/binary_index.py bench [kollekció]     # recall@k vs. pontos keresés
+"""
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+BINARY_DIR = "binary"
+RESCORE_FACTOR = 10          # első körben top_k * RESCORE_FACTOR jelölt
+
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_signs(vectors: np.ndarray) -> np.ndarray:
+    """(n, d) float → (n, ceil(d/64)) uint64 előjel-bit kód."""
+    bits = np.asarray(vectors) > 0
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    pad = (-packed.shape[1]) % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def hamming(codes: np.ndarray, q_code: np.ndarray) -> np.ndarray:
+    x = np.bitwise_xor(codes, q_code)
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0: natív popcount
+        return np.bitwise_count(x).sum(axis=1, dtype=np.uint32)
+    return _POPCOUNT_LUT[x.view(np.uint8)].reshape(len(codes), -1).sum(axis=1, dtype=np.uint32)
+
+
+def build_from_arrays(ids: Sequence[str], embeddings, index_dir: Path) -> Path:
+    out = Path(index_dir) / BINARY_DIR
+    out.mkdir(parents=True, exist_ok=True)
+    vectors = np.asarray(embeddings, dtype=np.float32)
+
+    np.save(out / "codes.npy", pack_signs(vectors))
+    np.save(out / "vectors.npy", vectors)
+    with (out / "ids.json").open("w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+    return out
+
+
+def build_from_collection(col, index_dir: Path) -> Path:
+    """Az (akár inkrementálisan bővített) kollekció összes vektorából."""
+    got = col.get(include=["embeddings"])
+    return build_from_arrays(got["ids"], got["embeddings"], index_dir)
+
+
+class BinaryIndex:
+    def __init__(self, index_dir: Path):
+        path = Path(index_dir) / BINARY_DIR
+        self.codes = np.load(path / "codes.npy")                       # kicsi, memóriában
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")    # nagy, mmap
+        with (path / "ids.json").open("r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        return (Path(index_dir) / BINARY_DIR / "codes.npy").exists()
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def search(self, q_emb, top_k: int = 5, rescore: Optional[int] = None) -> List[tuple]:
+        """[(chunk_id, négyzetes L2 távolság), ...] növekvő távolság szerint."""
+        q = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+        n = len(self.ids)
+        n_cand = min(n, rescore or top_k * RESCORE_FACTOR)
+
+        dist = hamming(self.codes, pack_signs(q))
+        if n_cand < n:
+            cand = np.argpartition(dist, n_cand - 1)[:n_cand]
+        else:
+            cand = np.arange(n)
+
+        cand = np.sort(cand)  # mmap-ben sorrendben olvasva kevesebb laphiba
+        diff = self.vectors[cand] - q
+        l2 = np.einsum("ij,ij->i", diff, diff)
+        order = np.argsort(l2)[:top_k]
+        return [(self.ids[cand[i]], float(l2[i])) for i in order]
+
+    def exact(self, q_emb, top_k: int = 5) -> List[tuple]:
+        q = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+        diff = self.vectors - q
+        l2 = np.einsum("ij,ij->i", diff, diff)
+        order = np.argsort(l2)[:top_k]
+        return [(self.ids[i], float(l2[i])) for i in order]
+
+
+# ================== CLI ==================
+
+def export_collection(name: str) -> Path:
+    from kb_registry import get_registry
+
+    registry = get_registry()
+    return build_from_collection(registry.get_collection(name), Path(registry.index_path(name)))
+
+
+def bench(index: BinaryIndex, queries: np.ndarray, k: int = 5) -> None:
+    d = index.dim
+    code_bytes = index.codes.shape[1] * 8
+    print(f"Vektorok: {len(index.ids)} × {d} dim")
+    print(f"Memória / vektor: bináris kód {code_bytes} B, float32 {d * 4} B (×{d * 4 / code_bytes:.0f})")
+
+    t0 = time.perf_counter()
+    exact = [{cid for cid, _ in index.exact(q, k)} for q in queries]
+    t_exact = (time.perf_counter() - t0) / len(queries)
+    print(f"\nPontos keresés: {t_exact * 1000:.2f} ms/lekérdezés")
+
+    print(f"{'jelölt':>8} {'recall@' + str(k):>10} {'ms/lekérdezés':>14}")
+    for factor in (2, 5, 10, 20, 50):
+        t0 = time.perf_counter()
+        found = 0
+        for q, truth in zip(queries, exact):
+            got = {cid for cid, _ in index.search(q, k, rescore=k * factor)}
+            found += len(got & truth)
+        dt = (time.perf_counter() - t0) / len(queries)
+        print(f"{k * factor:>8} {found / (k * len(queries)):>10.3f} {dt * 1000:>14.2f}")
+
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("build", "bench"):
+        print(__doc__)
+        return 1
+
+    from kb_registry import get_registry, DEFAULT_COLLECTION
+    name = argv[1] if len(argv) > 1 else DEFAULT_COLLECTION
+
+    if argv[0] == "build":
+        print(f"Bináris index írva: {export_collection(name)}")
+        return 0
+
+    index = BinaryIndex(Path(get_registry().index_path(name)))
+    rng = np.random.default_rng(0)
+    # lekérdezésnek zajjal eltolt chunk vektorok (ne önmagát találja meg triviálisan)
+    sample = np.asarray(index.vectors[rng.choice(len(index.ids), size=min(200, len(index.ids)), replace=False)])
+    queries = sample + rng.normal(0, 0.02, size=sample.shape).astype(np.float32)
+    bench(index, queries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,52 +1,26 @@
-# scripts/build_index.py
-
+# rag/build_local_index.py
+"""
+Régi belépési pont a lokális (MiniLM) index építéséhez. Az építés,
+a mellékfájlok (vetítés, bináris és mondat-index, kapu küszöbök), a
+validálás, az élesítés és a régi snapshotok törlése egy helyen,
+a scripts/build_index.py index_records()-ában történik.
+
+    python rag/build_local_index.py [kollekció]
+"""
+import sys
 from pathlib import Path
-import chromadb
-from chromadb.utils import embedding_functions
-import json
 
 BASE_DIR = Path(__file__).resolve().parent.parent  # rackhostllm gyökér
-DB_DIR = BASE_DIR / "chroma_kb"                    # IDE épül az index
-
-def build_index():
-    client = chromadb.PersistentClient(path=str(DB_DIR))
-
-    collection = client.get_or_create_collection(
-        name="rackhost_kb"  # <<< EZ A NÉV KÖTELEZŐEN UGYANAZ, mint a rag_cli-ben
-    )
-
-    # például:
-    kb_path = BASE_DIR / "data" / "kb_chunks.jsonl"
-    print(f"Loading from: {kb_path}")
-
-    texts = []
-    metadatas = []
-    ids = []
+sys.path.insert(0, str(BASE_DIR / "scripts"))
 
-    with kb_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            obj = json.loads(line)
-            ids.append(obj["id"])
-            texts.append(obj["body"])
-            metadatas.append({
-                "url": obj.get("url", ""),
-                "title": obj.get("title", ""),
-                "category": obj.get("category", "")
-            })
+from build_index import KB_PATH, build_index as _build_index
+from kb_registry import DEFAULT_COLLECTION
 
-    # SentenceTransformers embedder – lokális, ingyen
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
 
-    collection.add(
-        ids=ids,
-        documents=texts,
-        metadatas=metadatas,
-        embeddings=embedding_fn(texts)
-    )
+def build_index(name: str = DEFAULT_COLLECTION, kb_path: Path = KB_PATH) -> bool:
+    # a chunk_kb.py kimenete (chunk_id / text), a regiszter konfigjában megadott kollekcióba
+    return _build_index(name, kb_path)
 
-    print(f"Index építve. Összes elem: {len(ids)}")
 
 if __name__ == "__main__":
-    build_index()
+    sys.exit(0 if build_index(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_COLLECTION) else 1)
@@ -1,31 +1,28 @@
 # rag/rag_cli.py
 
+import sys
+import time
 from pathlib import Path
-import chromadb
-from chromadb.utils import embedding_functions
 
-BASE_DIR = Path(__file__).resolve().parent.parent    # rackhostllm
-DB_DIR = BASE_DIR / "chroma_kb"                      # UGYANAZ mint build_index.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # rag/ → kb_registry
+from deadline import DEFAULT_BUDGET, Deadline
+from generators import get_generator
+from kb_registry import get_registry, DEFAULT_COLLECTION
+from query_log import log_query
 
-client = chromadb.PersistentClient(path=str(DB_DIR))
+MODEL_NAME = "mistral:latest"
+MAX_TOKENS = 400
 
-collection = client.get_collection("rackhost_kb")    # UGYANAZ a név
+registry = get_registry()                            # UGYANAZ a kollekció-konfig mint mindenhol
 
-
-embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-
-def retrieve(query: str, top_k: int = 5):
-    q_emb = embedder.encode([query]).tolist()[0]
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=top_k
-    )
+def retrieve(query: str, top_k: int = 5, deadline: Deadline = None):
+    hits = registry.query(query, names=[DEFAULT_COLLECTION], top_k=top_k, deadline=deadline)
     docs = []
-    for i in range(len(res["ids"][0])):
+    for hit in hits:
         docs.append({
-            "id": res["ids"][0][i],
-            "text": res["documents"][0][i],
-            "meta": res["metadatas"][0][i]
+            "id": hit["id"],
+            "text": hit["text"],
+            "meta": {k: hit.get(k, "") for k in ("title", "url", "category")}
         })
     return docs
 
@@ -54,34 +51,43 @@ VÁLASZ (röviden, lényegre törően, magyarul):"""
 
     return system, user_prompt
 
-def call_ollama(system_prompt: str, user_prompt: str) -> str:
-    url = "http://localhost:11434/api/chat"
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        "stream": False
-    }
-    resp = requests.post(url, json=payload)
-    resp.raise_for_status()
-    data = resp.json()
-    return data["message"]["content"]
-
-def answer(query: str):
-    docs = retrieve(query, top_k=5)
+def call_ollama(system_prompt: str, user_prompt: str, deadline: Deadline = None) -> str:
+    # közös generátor-réteg: timeout + circuit breaker, nem blokkol a végtelenségig
+    llm = get_generator("ollama", model=MODEL_NAME)
+    deadline = deadline or Deadline(DEFAULT_BUDGET)
+    # num_predict a hátralévő időhöz igazodik, a határidőnél nem várunk tovább
+    max_tokens = deadline.max_tokens(MAX_TOKENS)
+    reply = None
+    if max_tokens:
+        reply = deadline.run(llm.generate, user_prompt, system=system_prompt, max_tokens=max_tokens,
+                             timeout=llm.timeout,
+                             timeout_arg="timeout" if llm.interruptible else None)
+    if not reply and "generate" in deadline.cut:
+        return "⏱️ Az LLM nem válaszolt időben, a legrelevánsabb cikkek alább."
+    return reply or "⚠️ Az LLM most nem érhető el, a legrelevánsabb cikkek alább."
+
+def answer(query: str, deadline: Deadline = None):
+    deadline = deadline or Deadline(DEFAULT_BUDGET)
+    t0 = time.perf_counter()
+    docs = retrieve(query, top_k=5, deadline=deadline)
+    timings = {"retrieve": time.perf_counter() - t0}
     if not docs:
+        log_query("chroma_kb/rag_cli", query, [], timings)
         return "Nincs találat a tudásbázisban erre a kérdésre."
 
     system_prompt, user_prompt = build_prompt(query, docs)
-    reply = call_ollama(system_prompt, user_prompt)
+    t = time.perf_counter()
+    reply = call_ollama(system_prompt, user_prompt, deadline)
+    timings["generate"] = time.perf_counter() - t
+    log_query("chroma_kb/rag_cli", query, docs, timings, cut=deadline.cut)
 
     debug_sources = "\n\nForrások:\n" + "\n".join(
         f"- {d['meta'].get('title','')} | {d['meta'].get('url','')}"
         for d in docs
     )
 
+    if deadline.cut:
+        debug_sources += f"\n\n(Határidő miatt megkurtítva: {', '.join(deadline.cut)})"
     return reply + debug_sources
 
 if __name__ == "__main__":
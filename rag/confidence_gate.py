@@ -0,0 +1,275 @@
+# rag/confidence_gate.py
+"""
+Generálás előtti magabiztossági kapu.
+
+A retrieval találatai (távolságok) alapján dönt, mielőtt bármilyen LLM
+hívás történne:
+
+    "refuse"   – a legjobb találat is túl messze van → determinisztikus elutasítás
+    "snippet"  – van releváns cikk, de a találat bizonytalan (kicsi a rés az
+                 első és második között, vagy lapos a távolság-eloszlás) →
+                 forrásolt kivonat, generálás nélkül
+    "generate" – magabiztos találat → mehet az LLM
+
+A küszöböket címkézett kérdéshalmazból tanuljuk (kategóriánként, ha van
+elég minta), és az index mellé mentjük (confidence_gate.json), így
+snapshottal együtt verziózódnak.
+
+    python rag/confidence_gate.py fit labels.jsonl     # {"question": ..., "answerable": true}
+    python rag/confidence_gate.py eval labels.jsonl
+"""
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+GATE_FILE = "confidence_gate.json"
+
+# Tanulás nélküli alapértékek = a korábbi viselkedés (dist > 1.5 → nincs találat)
+DEFAULT_REFUSE = 1.5
+DEFAULT_GENERATE = 1.5
+TARGET_PRECISION = 0.95       # "generate" zónában ennyi legyen a valóban megválaszolható
+MAX_LOST_ANSWERABLE = 0.05    # rés / eloszlás szabály legfeljebb ennyi jó választ tolhat snippetbe
+MIN_CATEGORY_SAMPLES = 10
+ASSUMED_GENERATION_S = 2.5    # ha még nincs mért generálási idő (README: 2-3 s)
+
+# A jellemzők mindig ugyanarra a találatszámra és szűrésre vonatkoznak, amin
+# a küszöböket tanultuk: az első GATE_K találat MAX_DISTANCE alatt, a hiányzó
+# helyek MAX_DISTANCE-szel kitöltve. Minden hívó legalább GATE_K találatot kér.
+GATE_K = 5
+MAX_DISTANCE = 1.5
+
+REFUSAL_TEXT = "Erre a kérdésre nem találtam választ a tudásbázisban."
+
+
+def features(hits: List[dict]) -> dict:
+    """
+    Távolság-alapú jellemzők a rangsorolt találatokból, fix GATE_K ablakon:
+    gap = 2. − 1. távolság, spread = GATE_K-adik − 1. távolság. Így a
+    hívó által kért top_k (2, 5, 6 …) nem változtatja a jellemzők jelentését.
+    """
+    hits = [h for h in hits if h["distance"] <= MAX_DISTANCE]
+    if not hits:
+        return {"top1": float("inf"), "gap": 0.0, "spread": 0.0, "category": ""}
+    dists = sorted(h["distance"] for h in hits)[:GATE_K]
+    dists += [MAX_DISTANCE] * (GATE_K - len(dists))
+    top = min(hits, key=lambda h: h["distance"])
+    return {
+        "top1": dists[0],
+        "gap": dists[1] - dists[0],
+        "spread": dists[-1] - dists[0],
+        "category": top.get("category", ""),
+    }
+
+
+class GateStats:
+    def __init__(self):
+        self.counts = {"generate": 0, "snippet": 0, "refuse": 0}
+        self._lock = threading.Lock()
+
+    def add(self, decision: str) -> None:
+        with self._lock:
+            self.counts[decision] += 1
+
+    @property
+    def skipped(self) -> int:
+        return self.counts["snippet"] + self.counts["refuse"]
+
+    def report(self, avg_generation_s: float = 0.0) -> str:
+        total = sum(self.counts.values())
+        if not total:
+            return "Kapu: még nem volt kérdés."
+        share = 100.0 * self.skipped / total
+        saved = self.skipped * avg_generation_s
+        return (f"Kapu: {total} kérdés, generálás kihagyva {self.skipped} ({share:.0f}%) "
+                f"[snippet {self.counts['snippet']}, elutasítás {self.counts['refuse']}], "
+                f"megspórolt generálási idő ≈ {saved:.1f} s")
+
+
+STATS = GateStats()   # folyamatszintű, snapshot váltáson át is megmarad
+
+
+class ConfidenceGate:
+    def __init__(self, thresholds: Optional[dict] = None, stats: Optional[GateStats] = None):
+        t = thresholds or {}
+        self.refuse = t.get("refuse", DEFAULT_REFUSE)
+        self.generate = t.get("generate", DEFAULT_GENERATE)
+        self.min_gap = t.get("min_gap", 0.0)
+        self.min_spread = t.get("min_spread", 0.0)
+        self.per_category: Dict[str, dict] = t.get("per_category", {})
+        self.stats = stats or STATS
+
+    @classmethod
+    def load(cls, index_dir) -> "ConfidenceGate":
+        path = Path(index_dir) / GATE_FILE
+        if not path.exists():
+            return cls()
+        with path.open("r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def to_dict(self) -> dict:
+        return {"refuse": self.refuse, "generate": self.generate, "min_gap": self.min_gap,
+                "min_spread": self.min_spread, "per_category": self.per_category}
+
+    def save(self, index_dir) -> Path:
+        path = Path(index_dir) / GATE_FILE
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def _decide(self, f: dict) -> str:
+        cat = self.per_category.get(f["category"], {})
+        if f["top1"] > cat.get("refuse", self.refuse):
+            return "refuse"
+        if f["top1"] > cat.get("generate", self.generate):
+            return "snippet"
+        if f["gap"] < self.min_gap or f["spread"] < self.min_spread:
+            return "snippet"
+        return "generate"
+
+    def decide(self, hits: List[dict]) -> str:
+        decision = self._decide(features(hits))
+        self.stats.add(decision)
+        return decision
+
+    def peek(self, hits: List[dict]) -> str:
+        """Ugyanaz a döntés, statisztika nélkül (pl. rag_chat jelölt-pool próbája)."""
+        return self._decide(features(hits))
+
+
+def report() -> str:
+    """Kihagyott generálások aránya és a megspórolt idő a mért átlagos generálási idővel."""
+    avg = ASSUMED_GENERATION_S
+    try:
+        from generators import metrics_report
+        measured = [m["avg"] for m in metrics_report().values() if m["calls"]]
+        if measured:
+            avg = sum(measured) / len(measured)
+    except ImportError:
+        pass
+    return STATS.report(avg)
+
+
+_gates: Dict[str, ConfidenceGate] = {}
+
+
+def get_gate(collection: str = "rackhost_kb") -> ConfidenceGate:
+    """Az éppen kiszolgált index (snapshot) mellé mentett küszöbök."""
+    from kb_registry import get_registry
+
+    index_dir = get_registry().index_path(collection)
+    gate = _gates.get(index_dir)
+    if gate is None:
+        gate = _gates[index_dir] = ConfidenceGate.load(index_dir)
+    return gate
+
+
+# ================== TANULÁS ==================
+
+def _best_refuse(samples: List[tuple]) -> float:
+    """A top1 küszöb, ami a kiegyensúlyozott pontosságot maximalizálja."""
+    pos = [d for d, y in samples if y]
+    neg = [d for d, y in samples if not y]
+    if not pos or not neg:
+        return max(pos) if pos else DEFAULT_REFUSE
+    best_t, best_acc = DEFAULT_REFUSE, -1.0
+    for t in sorted({d for d, _ in samples}):
+        acc = (sum(d <= t for d in pos) / len(pos) + sum(d > t for d in neg) / len(neg)) / 2
+        if acc > best_acc:
+            best_t, best_acc = t, acc
+    return best_t
+
+
+def _best_generate(samples: List[tuple], refuse: float) -> float:
+    """A legnagyobb top1 küszöb, ami alatt a megválaszolhatók aránya ≥ TARGET_PRECISION."""
+    best = min((d for d, y in samples if y), default=refuse)
+    ordered = sorted(samples)
+    ok = 0
+    for i, (d, y) in enumerate(ordered, 1):
+        ok += y
+        if d > refuse:
+            break
+        if ok / i >= TARGET_PRECISION:
+            best = d
+    return min(best, refuse)
+
+
+def _low_percentile(values: List[float], share: float) -> float:
+    values = sorted(v for v in values if v != float("inf"))
+    if not values:
+        return 0.0
+    return values[int(share * (len(values) - 1))]
+
+
+def fit(labelled: List[dict]) -> ConfidenceGate:
+    """labelled: [{"features": features(hits), "answerable": bool}, ...]"""
+    samples = [(x["features"]["top1"], bool(x["answerable"])) for x in labelled]
+    gate = ConfidenceGate()
+    gate.refuse = _best_refuse(samples)
+    gate.generate = _best_generate(samples, gate.refuse)
+
+    confident = [x["features"] for x in labelled if x["answerable"] and x["features"]["top1"] <= gate.generate]
+    gate.min_gap = _low_percentile([f["gap"] for f in confident], MAX_LOST_ANSWERABLE)
+    gate.min_spread = _low_percentile([f["spread"] for f in confident], MAX_LOST_ANSWERABLE)
+
+    by_cat: Dict[str, List[tuple]] = {}
+    for x in labelled:
+        by_cat.setdefault(x["features"]["category"], []).append((x["features"]["top1"], bool(x["answerable"])))
+    for cat, cat_samples in by_cat.items():
+        if cat and len(cat_samples) >= MIN_CATEGORY_SAMPLES:
+            refuse = _best_refuse(cat_samples)
+            gate.per_category[cat] = {"refuse": refuse, "generate": _best_generate(cat_samples, refuse)}
+    return gate
+
+
+# ================== CLI ==================
+
+def _labelled_features(path: Path, collection: str, top_k: int = GATE_K) -> List[dict]:
+    from kb_registry import get_registry
+
+    registry = get_registry()
+    out = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            hits = registry.query(item["question"], names=[collection], top_k=top_k)
+            out.append({"features": features(hits), "answerable": item["answerable"]})
+    return out
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) < 2 or argv[0] not in ("fit", "eval"):
+        print(__doc__)
+        return 1
+
+    from kb_registry import get_registry, DEFAULT_COLLECTION
+
+    registry = get_registry()
+    registry.get_collection(DEFAULT_COLLECTION)
+    index_dir = registry.index_path(DEFAULT_COLLECTION)
+    labelled = _labelled_features(Path(argv[1]), DEFAULT_COLLECTION)
+
+    stats = GateStats()
+    gate = fit(labelled) if argv[0] == "fit" else ConfidenceGate.load(index_dir)
+    gate.stats = stats
+    correct = 0
+    for x in labelled:
+        decision = gate._decide(x["features"])
+        gate.stats.add(decision)
+        # elutasítás akkor helyes, ha tényleg nem megválaszolható; snippet/generate fordítva
+        correct += (decision == "refuse") != bool(x["answerable"])
+
+    print(json.dumps(gate.to_dict(), ensure_ascii=False, indent=2))
+    print(f"Pontosság (válaszol / elutasít): {correct / max(1, len(labelled)):.2f}")
+    print(gate.stats.report(ASSUMED_GENERATION_S))
+
+    if argv[0] == "fit":
+        print(f"Mentve: {gate.save(index_dir)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
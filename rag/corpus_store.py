@@ -0,0 +1,313 @@
+# rag/corpus_store.py
+"""
+Kompakt, mmap-elhető bináris korpusz a kb_chunks.jsonl helyett.
+
+Felépítés (little-endian):
+
+    fejléc   | MAGIC, flagek, darabszámok, szakasz-offsetek
+    blob     | a chunk szövegek egymás után (opcionálisan chunkonként zstd)
+    index    | chunkonként egy fix méretű rekord: offset, hossz, string-indexek
+    strings  | JSON lista: először a chunk_id-k sorrendben, utána az
+               internált metaadatok (url, title, category, source, doc_id)
+    zdict    | opcionális zstd szótár (a kis chunkok így is jól tömörödnek)
+
+A metaadat-stringek egyszer szerepelnek, a szöveget csak lekéréskor
+dekódoljuk, így chunk_id szerint véletlen elérés van a teljes korpusz
+betöltése nélkül.
+
+Használat:
+    python rag/corpus_store.py build [--zstd] [kb_chunks.jsonl] [kb_corpus.rkc]
+    python rag/corpus_store.py get <chunk_id>
+    python rag/corpus_store.py bench [kb_chunks.jsonl] [kb_corpus.rkc]
+"""
+import json
+import mmap
+import random
+import struct
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # opcionális függőség
+    zstandard = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_JSONL = BASE_DIR / "data" / "kb_chunks.jsonl"
+DEFAULT_CORPUS = BASE_DIR / "data" / "kb_corpus.rkc"
+
+MAGIC = b"RKCORP1\0"
+FLAG_ZSTD = 1
+
+# flags, n_chunks, n_strings, blob_off, blob_len, index_off, strings_off, strings_len, zdict_off, zdict_len
+HEADER = struct.Struct("<8sIIIQQQQQQQ")
+# text_off, text_len, doc_id, local_index, url, title, category, source
+RECORD = struct.Struct("<QIIIIIII")
+
+META_FIELDS = ("doc_id", "url", "title", "category", "source")
+ZSTD_LEVEL = 9
+ZSTD_DICT_SIZE = 64 * 1024
+
+
+# ================== ÍRÁS ==================
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_corpus(records: Iterable[dict], out_path: Path, compress: bool = False) -> dict:
+    """
+    Rekordok (chunk_kb.py formátum) kiírása bináris korpuszba.
+    A szöveg azonnal a fájlba megy, csak az index és a stringek vannak memóriában.
+    """
+    if compress and zstandard is None:
+        raise RuntimeError("A --zstd módhoz a zstandard csomag kell (pip install zstandard).")
+
+    records = list(records) if compress else records  # szótár-tanításhoz minta kell
+    zdict = b""
+    cctx = None
+    if compress:
+        samples = [r.get("text", "").encode("utf-8") for r in records]
+        zdict = zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zstandard.ZstdCompressionDict(zdict))
+
+    chunk_ids: List[str] = []
+    interned: dict = {}
+    rows = []
+
+    def intern(value) -> int:
+        value = value or ""
+        idx = interned.get(value)
+        if idx is None:
+            idx = interned[value] = len(interned)
+        return idx
+
+    raw_bytes = 0
+    with out_path.open("wb") as f:
+        f.write(b"\0" * HEADER.size)
+        blob_off = f.tell()
+
+        for rec in records:
+            data = (rec.get("text") or "").encode("utf-8")
+            raw_bytes += len(data)
+            if cctx is not None:
+                data = cctx.compress(data)
+            off = f.tell() - blob_off
+            f.write(data)
+
+            chunk_ids.append(rec.get("chunk_id") or f"{rec.get('doc_id', 'kb')}-chunk-{len(chunk_ids)}")
+            rows.append((
+                off, len(data),
+                intern(rec.get("doc_id")), int(rec.get("chunk_local_index") or 0),
+                intern(rec.get("url")), intern(rec.get("title")),
+                intern(rec.get("category")), intern(rec.get("source")),
+            ))
+
+        blob_len = f.tell() - blob_off
+        n = len(chunk_ids)
+
+        index_off = f.tell()
+        for row in rows:
+            f.write(RECORD.pack(*row))
+
+        # a metaadat string-indexeket a chunk_id-k után toljuk el
+        strings = chunk_ids + list(interned)
+        strings_blob = json.dumps(strings, ensure_ascii=False).encode("utf-8")
+        strings_off = f.tell()
+        f.write(strings_blob)
+
+        zdict_off = f.tell()
+        f.write(zdict)
+
+        f.seek(0)
+        f.write(HEADER.pack(
+            MAGIC, FLAG_ZSTD if compress else 0, n, len(strings),
+            blob_off, blob_len, index_off, strings_off, len(strings_blob), zdict_off, len(zdict),
+        ))
+
+    return {"chunks": n, "strings": len(interned), "text_bytes": raw_bytes,
+            "blob_bytes": blob_len, "file_bytes": out_path.stat().st_size}
+
+
+# ================== OLVASÁS ==================
+
+class CorpusReader:
+    """Véletlen elérés chunk_id szerint egy mmap-elt korpuszfájlon."""
+
+    def __init__(self, path: Path = DEFAULT_CORPUS):
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, flags, n, _n_strings, blob_off, _blob_len, index_off,
+         strings_off, strings_len, zdict_off, zdict_len) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Nem korpuszfájl: {self.path}")
+
+        self._n = n
+        self._blob_off = blob_off
+        self._index_off = index_off
+
+        strings = json.loads(self._mm[strings_off:strings_off + strings_len].decode("utf-8"))
+        self._ids = strings[:n]
+        self._strings = strings[n:]
+        self._row_of = {cid: i for i, cid in enumerate(self._ids)}
+
+        self._dctx = None
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("A korpusz zstd-vel tömörített, a zstandard csomag hiányzik.")
+            zdict = zstandard.ZstdCompressionDict(self._mm[zdict_off:zdict_off + zdict_len])
+            self._dctx = zstandard.ZstdDecompressor(dict_data=zdict)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._row_of
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    @property
+    def ids(self) -> List[str]:
+        return self._ids
+
+    def _row(self, i: int):
+        return RECORD.unpack_from(self._mm, self._index_off + i * RECORD.size)
+
+    def _text(self, off: int, length: int) -> str:
+        start = self._blob_off + off
+        data = self._mm[start:start + length]
+        if self._dctx is not None:
+            data = self._dctx.decompress(data)
+        return data.decode("utf-8")
+
+    def text(self, chunk_id: str) -> Optional[str]:
+        i = self._row_of.get(chunk_id)
+        if i is None:
+            return None
+        off, length = self._row(i)[:2]
+        return self._text(off, length)
+
+    def texts(self, chunk_ids: Iterable[str]) -> List[Optional[str]]:
+        return [self.text(cid) for cid in chunk_ids]
+
+    def _record(self, i: int, with_text: bool = True) -> dict:
+        off, length, doc_id, local_idx, url, title, category, source = self._row(i)
+        rec = {
+            "doc_id": self._strings[doc_id],
+            "chunk_local_index": local_idx,
+            "chunk_id": self._ids[i],
+            "source": self._strings[source],
+            "url": self._strings[url],
+            "title": self._strings[title],
+            "category": self._strings[category],
+        }
+        if with_text:
+            rec["text"] = self._text(off, length)
+        return rec
+
+    def get(self, chunk_id: str, with_text: bool = True) -> Optional[dict]:
+        i = self._row_of.get(chunk_id)
+        return None if i is None else self._record(i, with_text)
+
+    def iter_chunks(self) -> Iterator[dict]:
+        for i in range(self._n):
+            yield self._record(i)
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Egységes bemenet az indexelőknek: .rkc korpusz vagy JSONL."""
+    path = Path(path)
+    if path.suffix == ".rkc":
+        with CorpusReader(path) as reader:
+            yield from reader.iter_chunks()
+    else:
+        yield from iter_jsonl(path)
+
+
+# ================== BENCHMARK ==================
+
+def bench(jsonl_path: Path, corpus_path: Path, lookups: int = 200) -> None:
+    def measure(fn):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, dt, peak
+
+    def load_jsonl():
+        return {r["chunk_id"]: r for r in iter_jsonl(jsonl_path)}
+
+    by_id, t_json, m_json = measure(load_jsonl)
+    reader, t_open, m_open = measure(lambda: CorpusReader(corpus_path))
+
+    sample = random.sample(reader.ids, min(lookups, len(reader)))
+    t0 = time.perf_counter()
+    for cid in sample:
+        reader.text(cid)
+    t_get = (time.perf_counter() - t0) / max(1, len(sample))
+
+    for cid in sample[:20]:
+        assert reader.text(cid) == by_id[cid]["text"], f"Eltérés: {cid}"
+
+    print(f"JSONL   : {jsonl_path.stat().st_size / 1e6:.2f} MB, betöltés {t_json * 1000:.1f} ms, "
+          f"memória {m_json / 1e6:.2f} MB")
+    print(f"Korpusz : {corpus_path.stat().st_size / 1e6:.2f} MB, megnyitás {t_open * 1000:.1f} ms, "
+          f"memória {m_open / 1e6:.2f} MB, lekérés {t_get * 1e6:.1f} µs/chunk")
+    reader.close()
+
+
+# ================== CLI ==================
+
+def main(argv: List[str]) -> int:
+    if not argv:
+        print(__doc__)
+        return 1
+
+    cmd, args = argv[0], argv[1:]
+    compress = "--zstd" in args
+    args = [a for a in args if a != "--zstd"]
+
+    if cmd == "build":
+        src = Path(args[0]) if args else DEFAULT_JSONL
+        dst = Path(args[1]) if len(args) > 1 else DEFAULT_CORPUS
+        t0 = time.perf_counter()
+        stats = write_corpus(iter_jsonl(src), dst, compress=compress)
+        print(f"Korpusz írva: {dst} ({time.perf_counter() - t0:.2f} s)")
+        print(f"  chunkok: {stats['chunks']}, internált stringek: {stats['strings']}")
+        print(f"  szöveg: {stats['text_bytes'] / 1e6:.2f} MB → blob {stats['blob_bytes'] / 1e6:.2f} MB, "
+              f"fájl {stats['file_bytes'] / 1e6:.2f} MB (JSONL: {src.stat().st_size / 1e6:.2f} MB)")
+    elif cmd == "get" and args:
+        with CorpusReader(DEFAULT_CORPUS) as reader:
+            rec = reader.get(args[0])
+        print(json.dumps(rec, ensure_ascii=False, indent=2) if rec else "Nincs ilyen chunk_id.")
+    elif cmd == "bench":
+        src = Path(args[0]) if args else DEFAULT_JSONL
+        dst = Path(args[1]) if len(args) > 1 else DEFAULT_CORPUS
+        bench(src, dst)
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
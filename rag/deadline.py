@@ -0,0 +1,136 @@
+# rag/deadline.py
+"""
+Kérésenkénti határidő (latencia költségvetés) a QA útvonalon.
+
+Egy Deadline objektum megy végig az embed → retrieve → rerank → generate
+lépéseken; mindegyik a hátralévő időből gazdálkodik:
+
+- retrieve: több kollekciónál a határidőig be nem futó kollekció kimarad
+- rerank:   szűkös időnél a bináris első kör kevesebb jelöltet pontoz újra
+- generate: a max_tokens (num_predict / max_new_tokens) a hátralévő időhöz
+  igazodik; ha már a minimum sem fér bele, nincs LLM hívás
+- hedge:    a generálás legfeljebb a határidő előtti tartalékig fut, utána
+  a hívó azonnal a (már kész) snippet fallbacket adja vissza. A timeoutot
+  betartó (HTTP) backendek a hívó szálán futnak, a hátralévő idő a
+  timeoutjuk – így a párhuzamosságot csak a backend limitje szabja meg.
+  A meg nem szakítható (in-process HF) generálás egy hedge poolban fut.
+
+A megkurtított lépéseket a Deadline.cut gyűjti, a válasz ezzel
+annotálható (és a query logba is bekerül).
+
+    RAG_DEADLINE=15         # s, kérésenkénti költségvetés (0 = nincs határidő)
+    RAG_GEN_TOKENS_PER_S=25 # a generátor becsült sebessége
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional
+
+DEFAULT_BUDGET = float(os.getenv("RAG_DEADLINE", "15"))
+GEN_TOKENS_PER_S = float(os.getenv("RAG_GEN_TOKENS_PER_S", "25"))
+GEN_OVERHEAD = 1.0       # s, prompt feldolgozás + HTTP, a tokenek előtt
+MIN_GEN_TOKENS = 40      # ennél rövidebb válaszért nem hívunk LLM-et
+HEDGE_RESERVE = 0.3      # s, a fallback összeállítására és visszaadására
+RERANK_MIN_REMAINING = 2.0   # s, ez alatt szűkített újrapontozás
+
+# csak a meg nem szakítható backendekhez (HF: egy modellpéldány, soros generálás)
+HEDGE_WORKERS = int(os.getenv("RAG_HEDGE_WORKERS", "8"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    # a szülő poolja a gyerekben használhatatlan, lustán újat indítunk
+    global _pool, _pool_lock
+    _pool, _pool_lock = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+    return _pool
+
+
+class Deadline:
+    def __init__(self, budget: Optional[float] = DEFAULT_BUDGET):
+        # budget None / 0: nincs határidő (a régi viselkedés)
+        self.budget = budget or None
+        self.started = time.monotonic()
+        self.cut: List[str] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        if self.budget is None:
+            return float("inf")
+        return max(0.0, self.budget - self.elapsed())
+
+    def mark_cut(self, stage: str) -> None:
+        if stage not in self.cut:
+            self.cut.append(stage)
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+        """Hívásonkénti timeout: a hátralévő idő (tartalékkal), legfeljebb cap."""
+        left = self.remaining() - reserve
+        if cap is None:
+            return None if left == float("inf") else max(0.0, left)
+        return max(0.0, min(cap, left))
+
+    def max_tokens(self, wanted: int, tokens_per_s: float = GEN_TOKENS_PER_S,
+                   overhead: float = GEN_OVERHEAD, reserve: float = HEDGE_RESERVE) -> int:
+        """
+        A hátralévő időbe beleférő generálási hossz (legfeljebb wanted).
+        0, ha MIN_GEN_TOKENS sem fér bele – ilyenkor "generate" kimarad.
+        """
+        usable = self.remaining() - overhead - reserve
+        if usable == float("inf"):
+            return wanted
+        tokens = min(wanted, int(usable * tokens_per_s))
+        if tokens < wanted:
+            self.mark_cut("generate")
+        return tokens if tokens >= MIN_GEN_TOKENS else 0
+
+    def rescore(self, top_k: int, default: int) -> int:
+        """Bináris első kör újrapontozott jelöltjei: szűkös időnél csak top_k × 2."""
+        if self.remaining() >= RERANK_MIN_REMAINING:
+            return default
+        self.mark_cut("rerank")
+        return min(default, top_k * 2)
+
+    def run(self, fn: Callable, *args, reserve: float = HEDGE_RESERVE, stage: str = "generate",
+            timeout_arg: Optional[str] = None, **kwargs):
+        """
+        fn futtatása legfeljebb a határidő előtti tartalékig (hedge).
+
+        timeout_arg megadásakor fn maga tartja be a timeoutot (HTTP backend):
+        a hívó szálán fut, ebben a kulcsszóban a tartalékig hátralévő időt
+        kapja (a megadott értéknél nem többet), pool slotot nem foglal.
+        Egyébként a hedge poolban fut; lejáratkor None, a stage bekerül a
+        cut listába, a még el sem indult hívást visszavonjuk, a már futó
+        eredményét eldobjuk.
+        """
+        if self.budget is None:
+            return fn(*args, **kwargs)
+        if timeout_arg is not None:
+            kwargs[timeout_arg] = self.timeout(cap=kwargs.get(timeout_arg), reserve=reserve)
+            result = fn(*args, **kwargs)
+            if result is None and self.remaining() <= reserve:
+                self.mark_cut(stage)
+            return result
+        future = _get_pool().submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout(reserve=reserve))
+        except FutureTimeout:
+            future.cancel()
+            self.mark_cut(stage)
+            return None
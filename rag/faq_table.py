@@ -0,0 +1,190 @@
+# rag/faq_table.py
+"""
+Előre generált GYIK válaszok táblája (scripts/build_faq.py építi éjszakánként).
+
+Felépítés (data/faq/):
+    CURRENT                   | az élő verzió könyvtárának neve
+    v-<időbélyeg>/faq.jsonl   | soronként: id, doc_id, content_hash, question,
+                                answer, title, url, reviewed
+    v-<időbélyeg>/faq_embeddings.npy
+                              | a kérdések normalizált embeddingje, faq.jsonl sorrendjében
+
+A két fájl együtt, egy verzió-könyvtárban készül el; élesíteni a CURRENT
+mutató atomikus cseréje élesít, így olvasó soha nem párosít új embeddinget
+régi válasszal. (CURRENT nélkül a régi, lapos data/faq/ elrendezést olvassuk.)
+
+Lekérdezéskor a kérdés embeddingjét a tábla összes kérdésével egy
+mátrixszorzással vetjük össze; magabiztos találatnál (és ha a választ
+valaki jóváhagyta) LLM hívás nélkül visszaadjuk az előre generált választ.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FAQ_DIR = BASE_DIR / "data" / "faq"
+ENTRIES_NAME = "faq.jsonl"
+EMBEDDINGS_NAME = "faq_embeddings.npy"
+POINTER_NAME = "CURRENT"
+KEEP_VERSIONS = 2             # a lecserélt verzió marad, hátha épp olvassa valaki
+FAQ_CHECK_INTERVAL = 2.0      # mp, ennyi időnként nézzük meg a CURRENT mutatót
+
+FAQ_MIN_SIMILARITY = 0.90     # koszinusz; alatta a normál RAG útvonal fut
+FAQ_REQUIRE_REVIEWED = True   # csak jóváhagyott válasz mehet ki automatikusan
+
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(norms, 1e-12)
+
+
+def current_dir(faq_dir: Path = FAQ_DIR) -> Path:
+    """Az élő verzió könyvtára (CURRENT mutató), vagy a régi lapos elrendezésnél maga faq_dir."""
+    faq_dir = Path(faq_dir)
+    try:
+        name = (faq_dir / POINTER_NAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return faq_dir
+    return faq_dir / name
+
+
+def pointer_mtime(faq_dir: Path = FAQ_DIR) -> float:
+    try:
+        return (Path(faq_dir) / POINTER_NAME).stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _read_entries(version: Path) -> List[dict]:
+    path = Path(version) / ENTRIES_NAME
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_entries(faq_dir: Path = FAQ_DIR) -> List[dict]:
+    return _read_entries(current_dir(faq_dir))
+
+
+def load_table(faq_dir: Path = FAQ_DIR) -> Tuple[List[dict], np.ndarray]:
+    """Sorok + embeddingek ugyanabból a verzióból (a mutatót egyszer oldjuk fel)."""
+    version = current_dir(faq_dir)
+    entries = _read_entries(version)
+    emb_path = version / EMBEDDINGS_NAME
+    if entries and emb_path.exists():
+        return entries, np.load(emb_path)
+    return entries, np.zeros((0, 0), dtype=np.float32)
+
+
+def save_table(entries: List[dict], embeddings: np.ndarray, faq_dir: Path = FAQ_DIR) -> None:
+    """Atomikus élesítés: új verzió-könyvtár, majd a CURRENT mutató cseréje."""
+    faq_dir = Path(faq_dir)
+    faq_dir.mkdir(parents=True, exist_ok=True)
+    version = Path(tempfile.mkdtemp(prefix=f"v-{time.strftime('%Y%m%d-%H%M%S')}-", dir=faq_dir))
+
+    with (version / EMBEDDINGS_NAME).open("wb") as f:
+        np.save(f, normalize(embeddings) if len(entries) else np.zeros((0, 0), dtype=np.float32))
+    with (version / ENTRIES_NAME).open("w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+    tmp_pointer = faq_dir / (POINTER_NAME + ".tmp")
+    tmp_pointer.write_text(version.name, encoding="utf-8")
+    os.replace(tmp_pointer, faq_dir / POINTER_NAME)
+
+    # régi verziók takarítása (a legutóbbi KEEP_VERSIONS marad)
+    versions = sorted((p for p in faq_dir.glob("v-*") if p.is_dir()), key=lambda p: p.stat().st_mtime)
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != version:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+class FaqTable:
+    def __init__(self, faq_dir: Path = FAQ_DIR):
+        self.faq_dir = Path(faq_dir)
+        self.entries, self.embeddings = load_table(self.faq_dir)
+
+        if len(self.entries) != len(self.embeddings):
+            print(f"⚠️  GYIK tábla inkonzisztens ({len(self.entries)} sor vs "
+                  f"{len(self.embeddings)} embedding) – kikapcsolva.")
+            self.entries, self.embeddings = [], np.zeros((0, 0), dtype=np.float32)
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, q_emb, min_similarity: float = FAQ_MIN_SIMILARITY,
+               require_reviewed: bool = FAQ_REQUIRE_REVIEWED) -> Optional[dict]:
+        if not self.entries:
+            self.misses += 1
+            return None
+
+        q = normalize(np.asarray(q_emb, dtype=np.float32).reshape(1, -1))
+        if q.shape[1] != self.embeddings.shape[1]:
+            self.misses += 1
+            return None
+
+        sims = (self.embeddings @ q[0])
+        for i in np.argsort(-sims)[:5]:
+            if sims[i] < min_similarity:
+                break
+            entry = self.entries[i]
+            if require_reviewed and not entry.get("reviewed"):
+                continue
+            self.hits += 1
+            return dict(entry, similarity=float(sims[i]))
+
+        self.misses += 1
+        return None
+
+
+_table: Optional[FaqTable] = None
+_pointer_seen = 0.0
+_checked_at = 0.0
+_table_lock = threading.Lock()
+
+
+def get_faq_table() -> FaqTable:
+    """
+    A folyamat GYIK táblája; ha a build_faq.py új verziót élesített (a
+    CURRENT mutató mtime-ja változott), legfeljebb FAQ_CHECK_INTERVAL
+    késéssel újratöltjük, a kb_registry snapshot-cseréjéhez hasonlóan.
+    """
+    global _table, _pointer_seen, _checked_at
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < FAQ_CHECK_INTERVAL:
+        return _table
+
+    with _table_lock:
+        if _table is not None and now - _checked_at < FAQ_CHECK_INTERVAL:
+            return _table
+        _checked_at = now
+        mtime = pointer_mtime()
+        if _table is not None and mtime == _pointer_seen:
+            return _table
+        try:
+            table = FaqTable()
+        except Exception as e:
+            if _table is None:
+                raise
+            # ugyanarra a mutatóra nem próbálkozunk újra, a régi tábla marad
+            _pointer_seen = mtime
+            print(f"⚠️  GYIK tábla újratöltése sikertelen: {e}")
+            return _table
+        if _table is not None:
+            # a találati statisztika a váltáson át is folytatódik
+            table.hits, table.misses = _table.hits, _table.misses
+            print(f"🔄 Új GYIK tábla aktív: {current_dir()} ({len(table)} sor)")
+        _table, _pointer_seen = table, mtime
+    return _table
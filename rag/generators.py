@@ -0,0 +1,453 @@
+# rag/generators.py
+"""
+Egységes generátor-réteg cserélhető backendekkel.
+
+Minden belépési pont (rag_qa, rag_qa_ollama, rag_cli, async_qa, rag_chat)
+ezen keresztül generál, nem saját subprocess / HTTP hívással. A backendek
+hosszú életűek (egyszer töltött modell, keep-alive HTTP session), és
+mindegyik kap:
+
+- health checket
+- határidőt (timeout) minden hívásra
+- circuit breakert: sorozatos hiba után egy ideig azonnal None-t ad,
+  a hívó pedig a snippet fallbackre vált
+- backendenkénti latencia-metrikákat (p50 / p95, hibák, elutasítások)
+
+    python rag/generators.py health          # backendek állapota
+    python rag/generators.py ask "kérdés"    # próba generálás
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+
+DEFAULT_BACKEND = os.getenv("RAG_GENERATOR", "ollama")
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = "mistral:latest"
+OLLAMA_KEEP_ALIVE = "30m"          # a modell ne töltődjön ki két kérdés között
+
+LLAMACPP_URL = os.getenv("LLAMACPP_URL", "http://localhost:8080")
+
+HF_MODEL = "google/flan-t5-small"
+HF_MAX_INPUT_TOKENS = 512
+
+OPENAI_MODEL = "gpt-4.1-mini"
+
+# Terheléses teszthez (rag/replay.py): fix késleltetésű, hálózat nélküli backend
+STUB_LATENCY = float(os.getenv("RAG_STUB_LATENCY", "0.5"))
+STUB_PARALLEL = int(os.getenv("RAG_STUB_PARALLEL", "4"))   # mint OLLAMA_NUM_PARALLEL
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_TOKENS = 200
+
+BREAKER_FAILURES = 3               # ennyi egymás utáni hiba után nyit
+BREAKER_RESET = 30.0               # mp, utána egy próbahívást engedünk
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened_at = None
+        self._probing = False          # half-open: egyetlen próbahívás van úton
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Zárt állapotban mindenki mehet; half-openben csak az első hívó (próba)."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._count += 1
+            if self._count >= self.failures or self._opened_at is not None:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def abandon(self) -> None:
+        # megszakított (cancel) próbahívás: a következő hívó próbálhat
+        with self._lock:
+            self._probing = False
+
+
+class LatencyStats:
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total += seconds
+            self.recent.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def percentile(self, p: float) -> float:
+        values = sorted(self.recent)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg": self.total / self.calls if self.calls else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+# ================== ALAP ==================
+
+class Generator:
+    name = "base"
+    interruptible = True   # a timeout argumentumot betartja (HTTP); deadline.run a hívó szálán futtatja
+
+    def __init__(self, model: str, timeout: float = DEFAULT_TIMEOUT, breaker: Optional[CircuitBreaker] = None):
+        self.model = model
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = LatencyStats()
+
+    def _generate(self, prompt: str, system: Optional[str], max_tokens: int, timeout: float) -> str:
+        raise NotImplementedError
+
+    def health(self) -> bool:
+        raise NotImplementedError
+
+    def generate(self, prompt: str, system: Optional[str] = None,
+                 max_tokens: int = DEFAULT_MAX_TOKENS, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Generált szöveg, vagy None (hiba, timeout, nyitott breaker) –
+        ilyenkor a hívó a snippet fallbacket használja.
+        """
+        # a határidőből elfogyott (0) keret nem esik vissza az alapértelmezett timeoutra
+        timeout = self.timeout if timeout is None else timeout
+        if timeout <= 0:
+            return None
+        if not self.breaker.allow():
+            self.stats.reject()
+            return None
+
+        t0 = time.perf_counter()
+        try:
+            text = self._generate(prompt, system, max_tokens, timeout)
+        except Exception as e:
+            self.breaker.failure()
+            self.stats.observe(time.perf_counter() - t0, ok=False)
+            print(f"❌ {self.name} hiba: {e}")
+            return None
+
+        self.breaker.success()
+        self.stats.observe(time.perf_counter() - t0)
+        text = (text or "").strip()
+        return text or None
+
+    async def agenerate(self, prompt: str, system: Optional[str] = None,
+                        max_tokens: int = DEFAULT_MAX_TOKENS, timeout: Optional[float] = None,
+                        client=None) -> Optional[str]:
+        # alapból threadben futtatjuk a blokkoló hívást; client: lásd OllamaGenerator
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.generate(prompt, system, max_tokens, timeout))
+
+
+# ================== BACKENDEK ==================
+
+class OllamaGenerator(Generator):
+    """Ollama HTTP API, keep-alive sessionnel (nincs hideg `ollama run` subprocess)."""
+    name = "ollama"
+
+    def __init__(self, model: str = OLLAMA_MODEL, base_url: str = OLLAMA_URL, options: Optional[dict] = None, **kw):
+        super().__init__(model, **kw)
+        self.base_url = base_url.rstrip("/")
+        self.options = options or {"temperature": 0.7, "top_p": 0.9, "top_k": 40}
+        self.session = requests.Session()
+
+    def _payload(self, prompt, system, max_tokens) -> dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": dict(self.options, num_predict=max_tokens),
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    def _generate(self, prompt, system, max_tokens, timeout):
+        try:
+            resp = self.session.post(f"{self.base_url}/api/generate",
+                                     json=self._payload(prompt, system, max_tokens), timeout=timeout)
+        except requests.exceptions.ConnectionError:
+            raise RuntimeError("Nem lehet csatlakozni az Ollama-hoz! Futtasd: brew services start ollama")
+        resp.raise_for_status()
+        return resp.json().get("response", "")
+
+    def health(self) -> bool:
+        try:
+            resp = self.session.get(f"{self.base_url}/api/tags", timeout=2)
+            resp.raise_for_status()
+            names = {m.get("name") for m in resp.json().get("models", [])}
+            return self.model in names or f"{self.model}:latest" in names
+        except requests.RequestException:
+            return False
+
+    async def agenerate(self, prompt, system=None, max_tokens=DEFAULT_MAX_TOKENS, timeout=None, client=None):
+        """
+        client: a hívó event loopjához tartozó httpx.AsyncClient (pl. az
+        AsyncQA motoré, ami aclose()-ban zárja). A generátor folyamatszintű
+        singleton, saját AsyncClientet nem tarthat: az az első event loophoz
+        kötődne. client nélkül hívásonként egy rövid életű klienst nyitunk.
+        """
+        try:
+            import httpx
+        except ImportError:
+            return await super().agenerate(prompt, system, max_tokens, timeout)
+
+        timeout = self.timeout if timeout is None else timeout
+        if timeout <= 0:
+            return None
+        if not self.breaker.allow():
+            self.stats.reject()
+            return None
+
+        t0 = time.perf_counter()
+        try:
+            if client is None:
+                async with httpx.AsyncClient() as own:
+                    resp = await self._apost(own, prompt, system, max_tokens, timeout)
+            else:
+                resp = await self._apost(client, prompt, system, max_tokens, timeout)
+            resp.raise_for_status()
+            text = resp.json().get("response", "").strip()
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            # httpx.HTTPError, hibás JSON, ...: mint a szinkron generate-nél
+            self.breaker.failure()
+            self.stats.observe(time.perf_counter() - t0, ok=False)
+            print(f"❌ {self.name} hiba: {e}")
+            return None
+
+        self.breaker.success()
+        self.stats.observe(time.perf_counter() - t0)
+        return text or None
+
+    async def _apost(self, client, prompt, system, max_tokens, timeout):
+        return await client.post(f"{self.base_url}/api/generate",
+                                 json=self._payload(prompt, system, max_tokens),
+                                 timeout=timeout)
+
+
+class LlamaCppGenerator(Generator):
+    """llama.cpp `server` (vagy kompatibilis) /completion végpont."""
+    name = "llamacpp"
+
+    def __init__(self, model: str = "local", base_url: str = LLAMACPP_URL, **kw):
+        super().__init__(model, **kw)
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def _generate(self, prompt, system, max_tokens, timeout):
+        full = f"{system}\n\n{prompt}" if system else prompt
+        resp = self.session.post(f"{self.base_url}/completion",
+                                 json={"prompt": full, "n_predict": max_tokens, "temperature": 0.7},
+                                 timeout=timeout)
+        resp.raise_for_status()
+        return resp.json().get("content", "")
+
+    def health(self) -> bool:
+        try:
+            return self.session.get(f"{self.base_url}/health", timeout=2).status_code == 200
+        except requests.RequestException:
+            return False
+
+
+class HFSeq2SeqGenerator(Generator):
+    """In-process HF seq2seq modell (flan-t5), egyszer töltve."""
+    name = "hf"
+    interruptible = False
+
+    def __init__(self, model: str = HF_MODEL, device: Optional[str] = None, **kw):
+        super().__init__(model, **kw)
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+        # Az MPS/VRAM problémák miatt szándékosan nincs "mps" (8GB RAM), csak CUDA vagy CPU
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.hf_model = AutoModelForSeq2SeqLM.from_pretrained(model).to(self.device)
+        self.hf_model.eval()
+        self._lock = threading.Lock()  # egy modellpéldány, soros generálás
+
+    def _generate(self, prompt, system, max_tokens, timeout):
+        full = f"{system}\n\n{prompt}" if system else prompt
+        enc = self.tokenizer(full, return_tensors="pt", truncation=True,
+                             max_length=HF_MAX_INPUT_TOKENS, padding=True)
+        # a generálás nem szakítható meg: a timeoutot a tokenszám korlátozza
+        with self._lock, self._torch.no_grad():
+            out_ids = self.hf_model.generate(
+                input_ids=enc["input_ids"].to(self.device),
+                attention_mask=enc["attention_mask"].to(self.device),
+                max_new_tokens=max_tokens,
+                do_sample=False,
+                num_beams=1,
+                early_stopping=False,  # a kis modell befulladásának elkerülésére
+            )
+        return self.tokenizer.decode(out_ids[0], skip_special_tokens=True)
+
+    def health(self) -> bool:
+        """Betöltött modell és tokenizer, és egy egytokenes generálás le is fut."""
+        if getattr(self, "hf_model", None) is None or getattr(self, "tokenizer", None) is None:
+            return False
+        try:
+            self._generate("ok", None, 1, None)
+        except Exception:
+            return False
+        return True
+
+
+class OpenAIChatGenerator(Generator):
+    """OpenAI chat completions (scripts/rag_chat.py)."""
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_MODEL, temperature: float = 0.1, **kw):
+        super().__init__(model, **kw)
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.temperature = temperature
+
+    def _generate(self, prompt, system, max_tokens, timeout):
+        msgs = [{"role": "system", "content": system}] if system else []
+        msgs.append({"role": "user", "content": prompt})
+        resp = self.client.chat.completions.create(
+            model=self.model, messages=msgs, temperature=self.temperature,
+            max_tokens=max_tokens, timeout=timeout,
+        )
+        return resp.choices[0].message.content
+
+    def health(self) -> bool:
+        try:
+            self.client.models.retrieve(self.model, timeout=5)
+            return True
+        except Exception:
+            return False
+
+
+class StubGenerator(Generator):
+    """Fix késleltetésű, korlátozott párhuzamosságú ál-LLM (visszajátszás, terheléses teszt)."""
+    name = "stub"
+
+    def __init__(self, model: str = "stub", latency: float = STUB_LATENCY, parallel: int = STUB_PARALLEL, **kw):
+        super().__init__(model, **kw)
+        self.latency = latency
+        self._slots = threading.BoundedSemaphore(parallel)
+
+    def _generate(self, prompt, system, max_tokens, timeout):
+        # mint egy HTTP backend: a sorban állás + válaszidő is a timeoutig tart
+        t0 = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"nincs szabad slot {timeout:.1f} s alatt")
+        try:
+            left = timeout - (time.monotonic() - t0)
+            if self.latency > left:
+                time.sleep(max(0.0, left))
+                raise TimeoutError(f"read timeout ({timeout:.1f} s)")
+            time.sleep(self.latency)
+        finally:
+            self._slots.release()
+        return "Stub válasz a terheléses teszthez: " + prompt[-80:].replace("\n", " ")
+
+    def health(self) -> bool:
+        return True
+
+
+BACKENDS = {
+    "ollama": OllamaGenerator,
+    "llamacpp": LlamaCppGenerator,
+    "hf": HFSeq2SeqGenerator,
+    "openai": OpenAIChatGenerator,
+    "stub": StubGenerator,
+}
+
+_instances: Dict[tuple, Generator] = {}
+_instances_lock = threading.Lock()
+
+
+def get_generator(backend: Optional[str] = None, **kwargs) -> Generator:
+    """Folyamatszintű, hosszú életű backend példány (backend + beállítások szerint)."""
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise KeyError(f"Ismeretlen generátor backend: {backend} (ismert: {', '.join(BACKENDS)})")
+
+    key = (backend, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    gen = _instances.get(key)
+    if gen is None:
+        with _instances_lock:
+            gen = _instances.get(key)
+            if gen is None:
+                gen = _instances[key] = BACKENDS[backend](**kwargs)
+    return gen
+
+
+def metrics_report() -> Dict[str, dict]:
+    return {
+        f"{g.name}:{g.model}": dict(g.stats.summary(), breaker=g.breaker.state)
+        for g in _instances.values()
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "health"
+    if cmd == "health":
+        for name in ("ollama", "llamacpp"):
+            ok = get_generator(name).health()
+            print(f"{name:10} {'✓ elérhető' if ok else '✗ nem elérhető'}")
+    elif cmd == "ask" and len(sys.argv) > 2:
+        print(get_generator().generate(" ".join(sys.argv[2:])) or "(nincs válasz)")
+        for name, m in metrics_report().items():
+            print(f"{name}: {m['avg'] * 1000:.0f} ms, breaker: {m['breaker']}")
+    else:
+        print(__doc__)
@@ -0,0 +1,213 @@
+# rag/index_snapshots.py
+"""
+Verziózott index-snapshotok.
+
+Az index-építés soha nem az élő könyvtárba ír: minden build egy új
+<root>/snapshots/<verzió>/ könyvtárba kerül, validálás után pedig a
+<root>/CURRENT mutató atomikusan (os.replace) átáll rá. Az olvasók
+(kb_registry) a mutatót figyelik, és újraindítás nélkül átváltanak.
+
+Használat:
+    python rag/index_snapshots.py list
+    python rag/index_snapshots.py current
+    python rag/index_snapshots.py publish <verzió>
+    python rag/index_snapshots.py rollback
+    python rag/index_snapshots.py prune
+"""
+import os
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_ROOT = BASE_DIR / "chroma_kb"
+
+POINTER_NAME = "CURRENT"
+HISTORY_NAME = "HISTORY"
+SNAPSHOT_DIR = "snapshots"
+
+KEEP_SNAPSHOTS = 5          # ennyi legutóbbi snapshot marad meg prune után
+MIN_SAMPLE_RECALL = 0.9     # önvisszakeresési recall küszöb validáláskor
+SAMPLE_SIZE = 50
+
+PathLike = Union[str, Path]
+
+
+class SnapshotError(RuntimeError):
+    pass
+
+
+# ================== MUTATÓ ==================
+
+def _write_atomic(path: Path, content: str) -> None:
+    tmp = path.with_name(path.name + f".tmp-{os.getpid()}")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def current_version(root: PathLike = DEFAULT_ROOT) -> Optional[str]:
+    pointer = Path(root) / POINTER_NAME
+    if not pointer.exists():
+        return None
+    return pointer.read_text(encoding="utf-8").strip() or None
+
+
+def resolve_index_path(root: PathLike = DEFAULT_ROOT) -> Path:
+    """
+    Az aktuálisan élő Chroma könyvtár. Ha még nincs snapshot (régi,
+    közvetlenül a root-ba épített index), maga a root.
+    """
+    version = current_version(root)
+    if version is None:
+        return Path(root)
+    return Path(root) / SNAPSHOT_DIR / version
+
+
+def pointer_mtime(root: PathLike = DEFAULT_ROOT) -> float:
+    try:
+        return (Path(root) / POINTER_NAME).stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def history(root: PathLike = DEFAULT_ROOT) -> List[str]:
+    path = Path(root) / HISTORY_NAME
+    if not path.exists():
+        return []
+    return [line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def list_snapshots(root: PathLike = DEFAULT_ROOT) -> List[str]:
+    snap_root = Path(root) / SNAPSHOT_DIR
+    if not snap_root.exists():
+        return []
+    return sorted(p.name for p in snap_root.iterdir() if p.is_dir())
+
+
+# ================== BUILD / PUBLISH ==================
+
+def new_snapshot_dir(root: PathLike = DEFAULT_ROOT) -> Path:
+    version = time.strftime("%Y%m%d-%H%M%S")
+    path = Path(root) / SNAPSHOT_DIR / version
+    suffix = 1
+    while path.exists():
+        path = Path(root) / SNAPSHOT_DIR / f"{version}-{suffix}"
+        suffix += 1
+    path.mkdir(parents=True)
+    return path
+
+
+def validate_snapshot(path: PathLike, collection_name: str, expected_count: int,
+                      sample_size: int = SAMPLE_SIZE, top_k: int = 5) -> dict:
+    """
+    Elemszám + minta-recall ellenőrzés: véletlen chunkokat a saját
+    embeddingjükkel kérdezünk le, és elvárjuk, hogy visszajöjjenek top_k-ban.
+    """
+    from chromadb import PersistentClient
+
+    client = PersistentClient(path=str(path))
+    col = client.get_collection(collection_name)
+
+    count = col.count()
+    report = {"count": count, "expected": expected_count, "recall": None, "ok": False}
+    if count != expected_count:
+        report["error"] = f"elemszám eltér: {count} != {expected_count}"
+        return report
+
+    all_ids = col.get(include=[])["ids"]
+    sample = random.sample(all_ids, min(sample_size, len(all_ids)))
+    if not sample:
+        report["error"] = "üres kollekció"
+        return report
+
+    got = col.get(ids=sample, include=["embeddings"])
+    res = col.query(query_embeddings=list(got["embeddings"]), n_results=top_k, include=[])
+    found = sum(1 for cid, hits in zip(got["ids"], res["ids"]) if cid in hits)
+
+    report["recall"] = found / len(sample)
+    report["ok"] = report["recall"] >= MIN_SAMPLE_RECALL
+    if not report["ok"]:
+        report["error"] = f"minta recall túl alacsony: {report['recall']:.2f}"
+    return report
+
+
+def publish(version: str, root: PathLike = DEFAULT_ROOT) -> None:
+    root = Path(root)
+    if not (root / SNAPSHOT_DIR / version).is_dir():
+        raise SnapshotError(f"Nincs ilyen snapshot: {version}")
+
+    hist = history(root)
+    if not hist or hist[-1] != version:
+        hist.append(version)
+    _write_atomic(root / HISTORY_NAME, "\n".join(hist) + "\n")
+    _write_atomic(root / POINTER_NAME, version + "\n")
+
+
+def rollback(root: PathLike = DEFAULT_ROOT) -> str:
+    """Vissza az előző publikált snapshotra."""
+    root = Path(root)
+    hist = history(root)
+    current = current_version(root)
+    if current in hist:
+        hist = hist[:hist.index(current)]
+    hist = [v for v in hist if (root / SNAPSHOT_DIR / v).is_dir()]
+    if not hist:
+        raise SnapshotError("Nincs korábbi snapshot, amire vissza lehetne állni.")
+
+    target = hist[-1]
+    _write_atomic(root / HISTORY_NAME, "\n".join(hist) + "\n")
+    _write_atomic(root / POINTER_NAME, target + "\n")
+    return target
+
+
+def prune(root: PathLike = DEFAULT_ROOT, keep: int = KEEP_SNAPSHOTS) -> List[str]:
+    """A legutóbbi `keep` snapshot és az aktuális kivételével mindent töröl."""
+    root = Path(root)
+    versions = list_snapshots(root)
+    keep_set = set(versions[-keep:] if keep > 0 else []) | {current_version(root)}
+    removed = []
+    for v in versions:
+        if v not in keep_set:
+            shutil.rmtree(root / SNAPSHOT_DIR / v, ignore_errors=True)
+            removed.append(v)
+    return removed
+
+
+# ================== CLI ==================
+
+def main(argv: List[str]) -> int:
+    if not argv:
+        print(__doc__)
+        return 1
+
+    cmd, args = argv[0], argv[1:]
+    root = DEFAULT_ROOT
+
+    if cmd == "list":
+        current = current_version(root)
+        for v in list_snapshots(root):
+            print(("* " if v == current else "  ") + v)
+    elif cmd == "current":
+        print(current_version(root) or "(nincs snapshot – közvetlen index)")
+    elif cmd == "publish" and args:
+        publish(args[0], root)
+        print(f"Aktuális snapshot: {args[0]}")
+    elif cmd == "rollback":
+        print(f"Visszaállítva: {rollback(root)}")
+    elif cmd == "prune":
+        removed = prune(root)
+        print(f"Törölve: {', '.join(removed) or '-'}")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,528 @@
+# rag/kb_registry.py
+"""
+Kollekció-regiszter.
+
+Minden konfigurált Chroma kollekciót (márka / nyelv / historikus ticketek)
+egyszer nyit meg, a kliens- és kollekció-handle-öket cache-eli, és egy
+kérdést több kollekcióra párhuzamosan tud lefuttatni. Minden kollekció
+saját embedder-identitást hordoz, az eltérő embeddinggel érkező lekérdezést
+a regiszter elutasítja, mielőtt a Chroma-ig érne.
+
+Ha a kollekció könyvtára snapshot-gyökér (index_snapshots), a regiszter a
+CURRENT mutatót figyeli, az új snapshotot háttérszálon megnyitja és
+bemelegíti, majd a handle-t atomikusan lecseréli – újraindítás nélkül.
+
+Párhuzamos kéréseknél a kérdés-embedding és a Chroma lekérdezés
+mikro-batchben fut (micro_batch.py): egy encode és egy több-vektoros
+collection.query szolgál ki több hívót.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from chromadb import PersistentClient
+
+from index_snapshots import pointer_mtime, resolve_index_path
+from micro_batch import BATCH_MAX, BATCH_WINDOW, MicroBatcher, run_chroma_queries
+
+# ================== ALAP BEÁLLÍTÁSOK ==================
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CHROMA_PATH = BASE_DIR / "chroma_kb"
+DEFAULT_COLLECTION = "rackhost_kb"
+DEFAULT_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Opcionális konfig: JSON lista, elemei a CollectionSpec mezői
+COLLECTIONS_FILE = Path(os.getenv("RAG_COLLECTIONS_FILE", str(BASE_DIR / "collections.json")))
+
+MAX_WORKERS = 4
+SEARCH_MODES = ("exact", "binary")   # binary: bites első kör + float újrapontozás (binary_index)
+SNAPSHOT_CHECK_INTERVAL = 2.0   # mp, ennyi időnként nézzük meg a CURRENT mutatót
+
+
+class EmbedderMismatchError(ValueError):
+    """A lekérdező vektor nem a kollekcióhoz tartozó embedderből jön."""
+
+
+@dataclass(frozen=True)
+class CollectionSpec:
+    name: str                          # logikai név, erre hivatkoznak a hívók
+    collection: str = DEFAULT_COLLECTION
+    path: str = str(DEFAULT_CHROMA_PATH)
+    embed_model: str = DEFAULT_EMBED_MODEL
+    tenant: str = "rackhost"
+    weight: float = 1.0
+    corpus: str = ""                   # opcionális .rkc korpusz: a szöveg innen jön, nem a Chroma-ból
+
+
+def load_specs(path: Path = COLLECTIONS_FILE) -> List[CollectionSpec]:
+    """
+    Kollekció-konfig betöltése. Ha nincs konfig fájl, az egyetlen
+    alapértelmezett rackhost_kb kollekcióval dolgozunk.
+    """
+    if not path.exists():
+        return [CollectionSpec(name=DEFAULT_COLLECTION)]
+
+    with path.open("r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    specs = []
+    for item in raw:
+        p = Path(item.get("path") or DEFAULT_CHROMA_PATH)
+        if not p.is_absolute():
+            p = BASE_DIR / p  # relatív út mindig a repo gyökeréhez képest
+        item = dict(item, path=str(p))
+        if item.get("corpus") and not Path(item["corpus"]).is_absolute():
+            item["corpus"] = str(BASE_DIR / item["corpus"])
+        specs.append(CollectionSpec(**item))
+    return specs
+
+
+def distance_to_score(dist: float, space: str = "l2") -> float:
+    """
+    Chroma távolság → koszinusz-hasonlóság jellegű pontszám, hogy a
+    különböző kollekciók találatai összevethetők legyenek.
+    (Normalizált embeddingeknél a négyzetes L2 = 2 - 2*cos.)
+    """
+    if space == "l2":
+        return 1.0 - dist / 2.0
+    # "cosine" és "ip" esetén a Chroma 1 - hasonlóságot ad vissza
+    return 1.0 - dist
+
+
+# ================== REGISZTER ==================
+
+class CollectionRegistry:
+    def __init__(self, specs: Optional[Sequence[CollectionSpec]] = None):
+        self.specs: Dict[str, CollectionSpec] = {s.name: s for s in (specs or load_specs())}
+        self._clients: Dict[str, PersistentClient] = {}
+        self._collections = {}          # név → (feloldott index út, kollekció)
+        self._pointer_seen: Dict[str, float] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._swapping = set()
+        self._embedders = {}
+        self._corpora = {}
+        self._binary = {}               # index út → BinaryIndex
+        self._projections = {}          # index út → Projection vagy None
+        self._sentences = {}            # index út → SentenceIndex vagy None
+        self._batchers: Dict[str, MicroBatcher] = {}   # "embed:<modell>" / "chroma:<spec név>" → MicroBatcher
+        self.batch_window = BATCH_WINDOW
+        self.batch_max = BATCH_MAX
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="kb-query")
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        """
+        Fork után (prefork_server): a Chroma kliens sqlite kapcsolata, a
+        szálkészlet és a batcher szálak nem vihetők át a gyerekbe, ezeket a
+        gyerek újranyitja.
+        Az embedderek és az mmap-elt / numpy indexek (korpusz, bináris,
+        mondat-index, vetítés) maradnak, ezek lapjai megosztottak.
+        """
+        self._clients = {}
+        self._collections = {}
+        self._pointer_seen = {}
+        self._checked_at = {}
+        self._swapping = set()
+        self._batchers = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="kb-query")
+
+    # ---------- handle-ök ----------
+
+    def spec(self, name: str) -> CollectionSpec:
+        if name not in self.specs:
+            raise KeyError(f"Ismeretlen kollekció: {name} (ismert: {', '.join(self.specs)})")
+        return self.specs[name]
+
+    def _client(self, path: str) -> PersistentClient:
+        client = self._clients.get(path)
+        if client is None:
+            client = PersistentClient(path=path)
+            self._clients[path] = client
+        return client
+
+    def _open(self, spec: CollectionSpec):
+        path = str(resolve_index_path(spec.path))
+        col = self._client(path).get_collection(spec.collection)
+        self._check_identity(spec, col)
+        return path, col
+
+    def get_collection(self, name: str = DEFAULT_COLLECTION):
+        entry = self._collections.get(name)
+        if entry is not None:
+            self._maybe_swap(name)
+            return self._collections[name][1]
+
+        with self._lock:
+            entry = self._collections.get(name)
+            if entry is None:
+                spec = self.spec(name)
+                self._pointer_seen[name] = pointer_mtime(spec.path)
+                entry = self._open(spec)
+                self._collections[name] = entry
+        return entry[1]
+
+    def index_path(self, name: str = DEFAULT_COLLECTION) -> str:
+        """Az éppen kiszolgált index könyvtára (snapshot esetén a snapshoté)."""
+        return self.served(name)[0]
+
+    def served(self, name: str = DEFAULT_COLLECTION):
+        """(index út, kollekció) egy snapshotból: a két handle-t a _swap együtt cseréli."""
+        self.get_collection(name)
+        return self._collections[name]
+
+    # ---------- snapshot hot-swap ----------
+
+    def _maybe_swap(self, name: str) -> None:
+        now = time.monotonic()
+        if now - self._checked_at.get(name, 0.0) < SNAPSHOT_CHECK_INTERVAL:
+            return
+        self._checked_at[name] = now
+
+        mtime = pointer_mtime(self.spec(name).path)
+        with self._lock:
+            if mtime == self._pointer_seen.get(name) or name in self._swapping:
+                return
+            # a régi handle-lel tovább szolgálunk, amíg az új be nem melegszik
+            self._swapping.add(name)
+        threading.Thread(target=self._swap, args=(name, mtime), daemon=True).start()
+
+    def _swap(self, name: str, mtime: float) -> None:
+        spec = self.spec(name)
+        try:
+            path, col = self._open(spec)
+
+            # bemelegítés: sqlite + HNSW szegmens betöltése egy valódi lekérdezéssel
+            peek = col.peek(1)
+            if len(peek["ids"]):
+                col.query(query_embeddings=[list(peek["embeddings"][0])], n_results=1, include=[])
+            # a vetítés az új handle-lel együtt élesedik, különben a kérdés rossz térbe kerülne
+            projection = self._load_projection(name, path, col)
+
+            with self._lock:
+                old_path = self._collections[name][0]
+                self._collections[name] = (path, col)
+                self._projections[path] = projection
+                self._pointer_seen[name] = mtime
+                if old_path != path and all(p != old_path for p, _ in self._collections.values()):
+                    # a régi snapshot mmap-jei (bináris / mondat-index) se tartsák a törölt fájlokat
+                    self._clients.pop(old_path, None)
+                    self._binary.pop(old_path, None)
+                    self._projections.pop(old_path, None)
+                    self._sentences.pop(old_path, None)
+            print(f"🔄 Új index snapshot aktív ({name}): {path}")
+        except Exception as e:
+            # ugyanarra a mutatóra nem próbálkozunk újra, a régi index marad
+            with self._lock:
+                self._pointer_seen[name] = mtime
+            print(f"⚠️  Snapshot váltás sikertelen ({name}): {e}")
+        finally:
+            with self._lock:
+                self._swapping.discard(name)
+
+    def get_embedder(self, model_name: str):
+        emb = self._embedders.get(model_name)
+        if emb is not None:
+            return emb
+
+        with self._lock:
+            emb = self._embedders.get(model_name)
+            if emb is None:
+                from sentence_transformers import SentenceTransformer
+                emb = SentenceTransformer(model_name)
+                self._embedders[model_name] = emb
+        return emb
+
+    def _batcher(self, key: str, fn) -> MicroBatcher:
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            with self._lock:
+                batcher = self._batchers.get(key)
+                if batcher is None:
+                    batcher = MicroBatcher(key, fn, self.batch_window, self.batch_max)
+                    self._batchers[key] = batcher
+        return batcher
+
+    def embed_batcher(self, model_name: str) -> MicroBatcher:
+        embedder = self.get_embedder(model_name)
+        return self._batcher(f"embed:{model_name}",
+                             lambda texts: [v.tolist() for v in embedder.encode(texts, batch_size=len(texts))])
+
+    def configure_batching(self, window: float, max_batch: int) -> None:
+        """Ablak (s, negatív = kikapcsolva) és batch méret; a meglévő batcherek újraépülnek."""
+        with self._lock:
+            self.batch_window, self.batch_max = window, max_batch
+            self._batchers = {}
+
+    def batch_stats(self) -> Dict[str, dict]:
+        return {key: b.summary() for key, b in self._batchers.items()}
+
+    def get_corpus(self, name: str):
+        """A kollekcióhoz rendelt mmap-elt korpusz, vagy None."""
+        spec = self.spec(name)
+        if not spec.corpus:
+            return None
+        reader = self._corpora.get(spec.corpus)
+        if reader is None:
+            with self._lock:
+                reader = self._corpora.get(spec.corpus)
+                if reader is None:
+                    from corpus_store import CorpusReader
+                    reader = self._corpora[spec.corpus] = CorpusReader(Path(spec.corpus))
+        return reader
+
+    def get_binary_index(self, name: str, path: Optional[str] = None):
+        """
+        Az éppen kiszolgált (vagy a megadott) snapshot melletti bináris index;
+        snapshot váltáskor újratöltjük, a régit a _swap kidobja.
+        """
+        path = path or self.index_path(name)
+        index = self._binary.get(path)
+        if index is None:
+            with self._lock:
+                index = self._binary.get(path)
+                if index is None:
+                    from binary_index import BinaryIndex
+                    if not BinaryIndex.exists(Path(path)):
+                        raise FileNotFoundError(
+                            f"Nincs bináris index ({name}): python rag/binary_index.py build {name}")
+                    index = BinaryIndex(Path(path))
+                    # közben lecserélt snapshotot nem cache-elünk újra
+                    if any(p == path for p, _ in self._collections.values()):
+                        self._binary[path] = index
+        return index
+
+    @staticmethod
+    def _load_projection(name: str, path: str, col):
+        from projection import Projection
+        proj = Projection.load(path)
+        meta = col.metadata or {}
+        if meta.get("projection") and (proj is None or proj.dim != int(meta.get("embed_dim", 0))):
+            raise EmbedderMismatchError(
+                f"'{name}': az index vetített ({meta['projection']}) vektorokat tárol, "
+                f"de a {path} alatti projection.npz hiányzik vagy nem illik hozzá."
+            )
+        return proj
+
+    def get_projection(self, name: str, served=None):
+        """
+        Az éppen kiszolgált (vagy a served=(út, kollekció) párral megadott)
+        snapshot mellé mentett dimenziócsökkentő vetítés, vagy None.
+        """
+        path, col = served or self.served(name)
+        if path in self._projections:
+            return self._projections[path]
+        with self._lock:
+            if path not in self._projections:
+                proj = self._load_projection(name, path, col)
+                # közben lecserélt snapshotot nem cache-elünk újra
+                if not any(p == path for p, _ in self._collections.values()):
+                    return proj
+                self._projections[path] = proj
+            return self._projections[path]
+
+    def get_sentence_index(self, name: str):
+        """A snapshot melletti mondat-index (kontextus tömörítéshez), vagy None."""
+        path = self.index_path(name)
+        if path not in self._sentences:
+            with self._lock:
+                if path not in self._sentences:
+                    from sentence_index import SentenceIndex
+                    self._sentences[path] = SentenceIndex.load(path)
+        return self._sentences[path]
+
+    # ---------- embedder-identitás ----------
+
+    @staticmethod
+    def _check_identity(spec: CollectionSpec, col) -> None:
+        meta = col.metadata or {}
+        built_with = meta.get("embed_model")
+        if built_with and built_with != spec.embed_model:
+            raise EmbedderMismatchError(
+                f"A(z) '{spec.name}' kollekció {built_with} embedderrel épült, "
+                f"a konfig viszont {spec.embed_model}-t ad meg."
+            )
+
+    def check_embedding(self, name: str, embed_model: str, dim: int) -> None:
+        """
+        Lekérdezés előtti ellenőrzés: ugyanaz az embedder és ugyanaz a
+        dimenzió, mint amivel a kollekció épült. Vetített indexnél a
+        kérdés vektorának az eredeti (vetítés előtti) dimenziója számít.
+        """
+        spec = self.spec(name)
+        meta = self.get_collection(name).metadata or {}
+
+        built_with = meta.get("embed_model") or spec.embed_model
+        if embed_model != built_with:
+            raise EmbedderMismatchError(
+                f"'{name}': a lekérdezés {embed_model} embeddinget használ, "
+                f"az index viszont {built_with}-vel épült."
+            )
+
+        built_dim = meta.get("source_dim") or meta.get("embed_dim")
+        if built_dim and int(built_dim) != int(dim):
+            raise EmbedderMismatchError(
+                f"'{name}': a lekérdező vektor {dim} dimenziós, az index {built_dim} dimenziós."
+            )
+
+    # ---------- lekérdezés ----------
+
+    def embed(self, model_name: str, text: str) -> List[float]:
+        # párhuzamos hívók kérdései egy encode hívásban (micro_batch.py)
+        return self.embed_batcher(model_name).submit(text)
+
+    def chroma_query(self, name: str, col, q_emb: List[float], n_results: int, include: List[str],
+                     where=None, timeout: Optional[float] = None) -> dict:
+        """
+        Egysoros col.query, a párhuzamos hívókéval egy több-vektoros
+        lekérdezésbe fogva (regisztrált kollekciónként külön batcher, hogy a
+        több kollekciós lekérdezés ágai párhuzamosan fussanak). A kulcs a
+        spec neve: más útvonalon ugyanazzal a Chroma névvel (rackhost_kb)
+        futó kollekciók nem osztoznak batcheren. Metaadat-szűrős kérdés
+        közvetlenül fut. timeout után TimeoutError.
+        """
+        if where is not None:
+            return col.query(query_embeddings=[q_emb], n_results=n_results, where=where, include=include)
+        return self._batcher(f"chroma:{name}", run_chroma_queries).submit(
+            (col, q_emb, n_results, tuple(include)), timeout)
+
+    def _query_binary(self, name: str, path: str, col, q_emb: List[float], top_k: int, include: List[str],
+                      rescore: Optional[int] = None):
+        """
+        Bináris első kör a kollekcióval egy snapshotból (path) származó kódokon,
+        a metaadat ID alapján a Chroma-ból. Ha a bináris index mégis régebbi a
+        kollekciónál, a benne maradt, Chroma-ban már nem létező ID-kat kihagyjuk.
+        """
+        found = self.get_binary_index(name, path).search(q_emb, top_k, rescore)
+        got = col.get(ids=[cid for cid, _ in found], include=[i for i in include if i != "distances"])
+        by_id = {cid: k for k, cid in enumerate(got["ids"])}
+        found = [(cid, d) for cid, d in found if cid in by_id]
+        order = [by_id[cid] for cid, _ in found]
+        docs = [got["documents"][k] for k in order] if "documents" in include else []
+        metas = [got["metadatas"][k] for k in order]
+        return [cid for cid, _ in found], docs, metas, [d for _, d in found]
+
+    def query_collection(self, name: str, q_emb: List[float], top_k: int, where=None,
+                         mode: str = "exact", deadline=None) -> List[dict]:
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Ismeretlen keresési mód: {mode} (lehet: {', '.join(SEARCH_MODES)})")
+        spec = self.spec(name)
+        self.check_embedding(name, spec.embed_model, len(q_emb))
+        # kollekció és vetítés ugyanabból a snapshotból (közben lehet csere)
+        path, col = self.served(name)
+        corpus = self.get_corpus(name)
+
+        projection = self.get_projection(name, (path, col))
+        if projection is not None:
+            q_emb = projection.apply(q_emb).tolist()
+
+        # ha van korpusz, a szöveget nem a Chroma-ból húzzuk, hanem mmap-ből ID alapján
+        include = ["metadatas", "distances"] if corpus is not None else ["documents", "metadatas", "distances"]
+
+        # a bináris index nem ismeri a metaadat-szűrőt → szűrt kérdés marad a Chroma-n
+        if mode == "binary" and where is None:
+            # szűkös határidőnél kevesebb jelöltet pontozunk újra (deadline.py)
+            rescore = None
+            if deadline is not None:
+                from binary_index import RESCORE_FACTOR
+                rescore = deadline.rescore(top_k, top_k * RESCORE_FACTOR)
+            ids, docs, metas, distances = self._query_binary(name, path, col, q_emb, top_k, include, rescore)
+        else:
+            res = self.chroma_query(name, col, q_emb, top_k, include, where,
+                                    timeout=deadline.timeout() if deadline is not None else None)
+            ids = res.get("ids", [[]])[0]
+            docs = res.get("documents", [[]])[0] if corpus is None else []
+            metas = res.get("metadatas", [[]])[0]
+            distances = res.get("distances", [[]])[0]
+
+        if corpus is not None:
+            docs = [corpus.text(cid) or "" for cid in ids]
+        # a bináris index négyzetes L2-t ad, ugyanazon a skálán, mint az l2 kollekció
+        space = "l2" if mode == "binary" and where is None else (col.metadata or {}).get("hnsw:space", "l2")
+
+        hits = []
+        for chunk_id, doc, meta, dist in zip(ids, docs, metas, distances):
+            meta = meta or {}
+            hits.append({
+                "id": chunk_id,
+                "text": doc,
+                "title": meta.get("title", ""),
+                "url": meta.get("url", ""),
+                "category": meta.get("category", ""),
+                "source": meta.get("source", ""),
+                "distance": dist,
+                "score": distance_to_score(dist, space) * spec.weight,
+                "collection": name,
+            })
+        return hits
+
+    def query(self, question: str, names: Optional[Sequence[str]] = None, top_k: int = 5, where=None,
+              q_embs: Optional[Dict[str, List[float]]] = None, mode: str = "exact",
+              deadline=None) -> List[dict]:
+        """
+        Kérdés szétosztása több kollekcióra párhuzamosan. Embedderenként
+        egyszer embeddelünk, a találatokat normalizált pontszám szerint
+        fésüljük össze. A q_embs-ben (embedder neve → vektor) átadott,
+        már kiszámolt embeddingeket nem számoljuk újra. mode: "exact"
+        (Chroma HNSW) vagy "binary" (binary_index első kör + újrapontozás).
+        deadline (deadline.Deadline): a határidőig be nem futó kollekciók
+        kimaradnak, ezt a deadline.cut jelzi ("retrieve:<név>").
+        """
+        names = list(names or self.specs)
+
+        # embedderenként egy encode hívás
+        by_model: Dict[str, List[float]] = dict(q_embs or {})
+        for name in names:
+            model_name = self.spec(name).embed_model
+            if model_name not in by_model:
+                by_model[model_name] = self.embed(model_name, question)
+
+        if len(names) == 1:
+            try:
+                hits = self.query_collection(names[0], by_model[self.spec(names[0]).embed_model], top_k, where,
+                                             mode, deadline)
+            except TimeoutError:
+                # a batch a határidőig sem futott le (pl. beragadt Chroma hívás)
+                deadline.mark_cut(f"retrieve:{names[0]}")
+                hits = []
+        else:
+            futures = {
+                name: self._pool.submit(self.query_collection, name, by_model[self.spec(name).embed_model],
+                                        top_k, where, mode, deadline)
+                for name in names
+            }
+            hits = []
+            for i, (name, fut) in enumerate(futures.items()):
+                # az első kollekcióra mindig várunk, a többire csak a határidőig
+                timeout = deadline.timeout() if deadline is not None and i else None
+                try:
+                    hits.extend(fut.result(timeout=timeout))
+                except (FutureTimeout, TimeoutError):
+                    deadline.mark_cut(f"retrieve:{name}")
+
+        hits.sort(key=lambda h: h["score"], reverse=True)
+        for i, h in enumerate(hits[:top_k], 1):
+            h["rank"] = i
+        return hits[:top_k]
+
+
+_registry: Optional[CollectionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CollectionRegistry:
+    """Folyamatszintű, egyszer létrehozott regiszter."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CollectionRegistry()
+    return _registry
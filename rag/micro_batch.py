@@ -0,0 +1,282 @@
+# rag/micro_batch.py
+"""
+Mikro-batch a lekérdezés embeddinghez és a Chroma kereséshez.
+
+Párhuzamos kéréseknél mindegyik szál egy-egy encode([kérdés]) és egy
+egysoros collection.query hívást indítana; CPU-n ilyenkor az idő nagy
+része hívásonkénti rezsi (tokenizálás, modell-hívás, sqlite / HNSW
+kör), nem hasznos mátrixszorzás. A MicroBatcher a beérkező elemeket
+egy rövid ablakig (RAG_BATCH_WINDOW_MS) vagy BATCH_MAX elemig gyűjti,
+egyetlen hívással dolgozza fel, majd az eredményt szétosztja a
+várakozó hívóknak.
+
+    RAG_BATCH_WINDOW_MS=2   # gyűjtési ablak; 0 = csak ami az előző batch alatt összegyűlt,
+                            # negatív = kikapcsolva (minden hívás közvetlenül fut)
+    RAG_BATCH_MAX=32        # egy batch legfeljebb ennyi elem
+
+A regiszter (kb_registry) embedderenként egy embed batchert és
+kollekciónként egy Chroma batchert tart, így a több kollekciós lekérdezés
+ágai nem sorosodnak egy szálon. Áteresztőképesség vs. latencia szintetikus terhelésen:
+
+    python rag/micro_batch.py bench --clients 1 4 16 --window -1 0 2 5
+    python rag/micro_batch.py bench --real --clients 1 8   # élő embedder + index
+"""
+import argparse
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+BATCH_WINDOW = float(os.getenv("RAG_BATCH_WINDOW_MS", "2")) / 1000.0
+BATCH_MAX = int(os.getenv("RAG_BATCH_MAX", "32"))
+
+
+class _Slot:
+    __slots__ = ("item", "event", "result", "error")
+
+    def __init__(self, item):
+        self.item = item
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    fn(elemek listája) → eredmények listája (azonos sorrendben). Egy
+    eredmény lehet kivétel is: azt csak a saját hívója kapja meg, a batch
+    többi eleme nem bukik vele. A submit() blokkol, amíg az elem batch-e
+    lefut (legfeljebb timeout ideig). Egy háttérszál gyűjt és hív, így fn
+    mindig egy szálon fut (az embedder / sqlite kapcsolat felé ez úgyis
+    sorosítva lenne). Fork után (prefork_server) a szál a gyerekben nem él:
+    a tulajdonos regiszter új batchert hoz létre.
+    """
+
+    def __init__(self, name: str, fn: Callable[[list], list],
+                 window: float = BATCH_WINDOW, max_batch: int = BATCH_MAX):
+        self.name = name
+        self.fn = fn
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._pending: List[_Slot] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window >= 0 and self.max_batch > 1
+
+    def submit(self, item, timeout: Optional[float] = None):
+        """
+        Az elem eredménye. timeout (s) után TimeoutError: a még el nem indult
+        elem kikerül a sorból, a már futó batch eredményét eldobjuk.
+        """
+        if not self.enabled:
+            self._count(1)
+            result = self.fn([item])[0]
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        slot = _Slot(item)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"batch-{self.name}", daemon=True)
+                self._thread.start()
+            self._pending.append(slot)
+            self._cond.notify()
+        if not slot.event.wait(timeout):
+            with self._cond:
+                if slot in self._pending:
+                    self._pending.remove(slot)
+            raise TimeoutError(f"{self.name}: nincs eredmény {timeout:.2f} s alatt")
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _take(self) -> List[_Slot]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # az első elemtől számítva legfeljebb window ideig várunk társakra
+            until = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch:
+                left = until - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take()
+            try:
+                results = self.fn([s.item for s in batch])
+                for s, r in zip(batch, results):
+                    if isinstance(r, BaseException):
+                        s.error = r
+                    else:
+                        s.result = r
+            except Exception as e:
+                for s in batch:
+                    s.error = e
+            self._count(len(batch))
+            for s in batch:
+                s.event.set()
+
+    def _count(self, n: int) -> None:
+        self.batches += 1
+        self.items += n
+        self.largest = max(self.largest, n)
+
+    def summary(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg": self.items / self.batches if self.batches else 0.0,
+            "max": self.largest,
+        }
+
+
+# ================== CHROMA: TÖBB LEKÉRDEZÉS EGY HÍVÁSBAN ==================
+
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+
+def run_chroma_queries(items: Sequence[tuple]) -> List[object]:
+    """
+    items: (kollekció, vektor, n_results, include) elemek. Kollekciónként
+    és include-onként egy col.query(query_embeddings=[...]) a legnagyobb
+    n_results-szal; a sorokat elemenként az egysoros Chroma alakra vágjuk.
+    Ha egy csoport hívása hibát dob, a kivétel csak annak elemeihez kerül.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for i, (col, _, _, include) in enumerate(items):
+        groups.setdefault((id(col), tuple(include)), []).append(i)
+
+    out: List[object] = [None] * len(items)
+    for idx in groups.values():
+        col, _, _, include = items[idx[0]]
+        try:
+            res = col.query(
+                query_embeddings=[list(items[i][1]) for i in idx],
+                n_results=max(items[i][2] for i in idx),
+                include=list(include),
+            )
+        except Exception as e:
+            for i in idx:
+                out[i] = e
+            continue
+        for row, i in enumerate(idx):
+            n = items[i][2]
+            out[i] = {key: [res[key][row][:n]] for key in RESULT_KEYS if res.get(key) is not None}
+    return out
+
+
+# ================== BENCHMARK ==================
+
+class SyntheticEncoder:
+    """
+    CPU-s embedder modellje: egy encode hívás overhead + n × per_item ideig
+    foglalja a (közös) számítási erőforrást – a torch egy hívással is az
+    összes magot használja, két párhuzamos hívás nem fut gyorsabban.
+    """
+
+    def __init__(self, overhead: float, per_item: float):
+        self.overhead = overhead
+        self.per_item = per_item
+        self._busy = threading.Lock()
+
+    def encode(self, texts: list) -> list:
+        with self._busy:
+            time.sleep(self.overhead + self.per_item * len(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def run_load(call: Callable[[str], object], clients: int, n_requests: int) -> dict:
+    """Zárt hurok: clients szál, mindegyik az előző válasz után küldi a következőt."""
+    from async_loadtest import percentile
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            call(f"teszt kérdés {i}")
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return {
+        "throughput": len(latencies) / wall,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def bench(args) -> None:
+    if args.real:
+        from kb_registry import DEFAULT_COLLECTION, DEFAULT_EMBED_MODEL, get_registry
+
+        registry = get_registry()
+        registry.get_collection(DEFAULT_COLLECTION)
+        print("🚀 Élő embedder + index (embed + Chroma lekérdezés kérésenként)")
+    else:
+        encoder = SyntheticEncoder(args.overhead / 1000.0, args.per_item / 1000.0)
+        print(f"Szintetikus encoder: {args.overhead:g} ms / hívás + {args.per_item:g} ms / elem")
+
+    print(f"\n{'kliens':>6} {'ablak ms':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'átl. batch':>11}")
+    for clients in args.clients:
+        for window_ms in args.window:
+            window = window_ms / 1000.0
+            if args.real:
+                registry.configure_batching(window, args.max_batch)
+
+                def call(q):
+                    registry.query(q, names=[DEFAULT_COLLECTION], top_k=5)
+
+                batcher = lambda: registry.embed_batcher(DEFAULT_EMBED_MODEL)
+            else:
+                b = MicroBatcher("bench", encoder.encode, window, args.max_batch)
+                call, batcher = b.submit, lambda: b
+            r = run_load(call, clients, args.requests)
+            label = "ki" if window < 0 else f"{window_ms:g}"
+            print(f"{clients:>6} {label:>9} {r['throughput']:>8.1f} {r['p50'] * 1000:>8.1f} "
+                  f"{r['p99'] * 1000:>8.1f} {batcher().summary()['avg']:>11.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Mikro-batch áteresztőképesség vs. latencia")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench")
+    b.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    b.add_argument("--window", type=float, nargs="+", default=[-1, 0, 2, 5],
+                   help="gyűjtési ablak(ok) ms-ban; negatív = batch nélkül")
+    b.add_argument("--max-batch", type=int, default=BATCH_MAX)
+    b.add_argument("--requests", type=int, default=400, help="kérések száma mérési pontonként")
+    b.add_argument("--real", action="store_true", help="élő embedder + Chroma a szintetikus encoder helyett")
+    b.add_argument("--overhead", type=float, default=8.0, help="szintetikus: ms / encode hívás")
+    b.add_argument("--per-item", type=float, default=0.5, help="szintetikus: ms / kérdés")
+    args = ap.parse_args(argv)
+    bench(args)
+
+
+if __name__ == "__main__":
+    main()
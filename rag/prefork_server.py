@@ -0,0 +1,374 @@
+# rag/prefork_server.py
+"""
+Pre-fork QA szerver (rag_qa.py: MiniLM + flan-t5).
+
+A master egyszer tölti be a modelleket és az mmap-elhető indexeket,
+gc.freeze()-zel kiveszi őket a szemétgyűjtő látóköréből (különben a GC
+referenciaszámláló-írásai lapról lapra lemásolnák a megosztott memóriát),
+majd N workert forkol. A workerek ugyanazon a socketen fogadják a
+kéréseket, és copy-on-write módon osztoznak a modell-lapokon. A Chroma
+kapcsolatot minden worker maga nyitja újra (kb_registry._after_fork), és
+a kérések fogadása előtt a master kérdéseivel be is melegíti
+(warmup.warm_worker).
+
+    python rag/prefork_server.py serve --workers 4 --port 8088
+    python rag/prefork_server.py bench --workers 1 2 4 --requests 100
+
+    curl -s localhost:8088/ask -d '{"question": "Hogyan állítsam be a domain-t?"}'
+    curl -s localhost:8088/stats
+    curl -s localhost:8088/ready     # 503, amíg a bemelegítés (warmup.py) tart
+
+A bench mindkét módot méri: prefork (1 master + N worker) és N független
+folyamat (mindegyik saját modellekkel, SO_REUSEPORT-tal ugyanazon a porton),
+és összeveti az RSS / PSS összegét és az áteresztőképességet.
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List
+
+HOST = "127.0.0.1"
+PORT = 8088
+WORKERS = os.cpu_count() or 2
+TORCH_THREADS_PER_WORKER = 1    # N worker × sok torch szál = túlfoglalt magok
+LISTEN_BACKLOG = 128
+
+QUESTIONS = [
+    "Hogyan állítsam be a domain-t?",
+    "Hogyan tudok cPanelbe belépni?",
+    "Mennyi ideig tart a domain átregisztráció?",
+    "Hogyan állítok be e-mail fiókot?",
+    "Mi az a VPS?",
+]
+
+
+# ================== MEMÓRIA ==================
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """Rss / Pss / Shared / Private (kB) a /proc/<pid>/smaps_rollup-ból (Linux)."""
+    out = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if not rest.strip().endswith("kB"):
+                    continue
+                val = int(rest.split()[0])
+                if key == "Rss":
+                    out["rss"] = val
+                elif key == "Pss":
+                    out["pss"] = val
+                elif key in ("Shared_Clean", "Shared_Dirty"):
+                    out["shared"] += val
+                elif key in ("Private_Clean", "Private_Dirty"):
+                    out["private"] += val
+    except OSError:
+        pass
+    return out
+
+
+def child_pids(pid: int) -> List[int]:
+    pids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                pids.extend(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+# ================== KISZOLGÁLÁS ==================
+
+def preload():
+    """
+    Modellek + indexek betöltése és bemelegítése a masterben, fork előtt
+    (warmup.py): próba encode / generálás, index fájlok a page cache-be,
+    mmap-elt / numpy mellékindexek, a query log gyakori kérdései. A
+    lapok a workerek között megosztottak, az első kérés sem hideg.
+    """
+    import rag_qa
+    from warmup import format_report
+
+    report = rag_qa.warm_up()
+    QAHandler.warmup = report
+
+    gc.collect()
+    gc.freeze()   # a betöltött objektumokat a GC többé nem járja be → nem koszolja a lapokat
+    print(format_report(report) + f", gc.freeze: {gc.get_freeze_count()} objektum")
+    return rag_qa
+
+
+class QAHandler(BaseHTTPRequestHandler):
+    qa = None
+    warmup = None   # a bemelegítés riportja (preload)
+
+    def log_message(self, fmt, *args):
+        pass  # terhelés alatt nem írunk soronként
+
+    def _send(self, code: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"ok": True, "pid": os.getpid()})
+        elif self.path == "/ready":
+            from warmup import is_ready
+            ready = is_ready()
+            self._send(200 if ready else 503, {"ready": ready, "pid": os.getpid(), "warmup": self.warmup})
+        elif self.path == "/stats":
+            master = os.getppid() if os.environ.get("RAG_PREFORK_CHILD") else os.getpid()
+            pids = [master] + child_pids(master)
+            # a kapu számlálói folyamatonkéntiek: a választ adó workeré
+            from confidence_gate import STATS, report as confidence_gate_report
+            self._send(200, {"pid": os.getpid(), "processes": {p: memory_kb(p) for p in pids},
+                             "gate": {"counts": dict(STATS.counts), "report": confidence_gate_report()}})
+        else:
+            self._send(404, {"error": "ismeretlen útvonal"})
+
+    def do_POST(self):
+        if self.path != "/ask":
+            self._send(404, {"error": "ismeretlen útvonal"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            question = json.loads(self.rfile.read(length) or b"{}").get("question", "").strip()
+        except (ValueError, json.JSONDecodeError):
+            self._send(400, {"error": "hibás JSON"})
+            return
+        if not question:
+            self._send(400, {"error": "hiányzó question"})
+            return
+        if self.qa is None:
+            self._send(503, {"error": "bemelegítés folyamatban"})
+            return
+        t0 = time.perf_counter()
+        result = self.qa.answer(question)
+        self._send(200, dict(result, pid=os.getpid(), latency=time.perf_counter() - t0))
+
+
+def make_socket(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+def serve_on(sock: socket.socket, qa) -> None:
+    QAHandler.qa = qa
+    server = HTTPServer(sock.getsockname(), QAHandler, bind_and_activate=False)
+    server.socket = sock
+    server.serve_forever()
+
+
+def warming_probe(sock: socket.socket) -> HTTPServer:
+    """
+    Bemelegítés alatt a master maga felel a socketen: /health 200, /ready és
+    /ask 503 – a load balancer / orchestrator még nem küld forgalmat. Fork
+    előtt leállítjuk (shutdown), a socket nyitva marad a workereknek.
+    """
+    server = HTTPServer(sock.getsockname(), QAHandler, bind_and_activate=False)
+    server.socket = sock
+    threading.Thread(target=server.serve_forever, name="warmup-probe", daemon=True).start()
+    return server
+
+
+def run_worker(sock: socket.socket, qa) -> None:
+    os.environ["RAG_PREFORK_CHILD"] = "1"
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # a master állítja le a workereket
+    try:
+        import torch
+        torch.set_num_threads(TORCH_THREADS_PER_WORKER)
+    except ImportError:
+        pass
+    try:
+        # a fork eldobta a Chroma klienst: az első valódi kérés se legyen hideg
+        try:
+            report = qa.warm_worker()
+            print(f"  worker {os.getpid()}: Chroma bemelegítve ({report['worker']:.2f} s, "
+                  f"{report['questions']} kérdés)")
+        except Exception as e:
+            print(f"⚠️  worker {os.getpid()}: bemelegítés sikertelen, hidegen indul: {e}")
+        serve_on(sock, qa)
+    finally:
+        os._exit(0)
+
+
+def serve(host: str, port: int, workers: int, reuse_port: bool = False) -> None:
+    sock = make_socket(host, port, reuse_port)
+    probe = warming_probe(sock)
+    qa = preload()
+    probe.shutdown()
+
+    if workers <= 0:
+        # független (nem forkolt) mód – a bench "N független folyamat" összevetéséhez
+        print(f"🚀 Egyfolyamatos szerver: http://{host}:{port} (pid {os.getpid()})")
+        serve_on(sock, qa)
+        return
+
+    children: Dict[int, int] = {}
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, qa)
+        children[pid] = slot
+
+    for slot in range(workers):
+        spawn(slot)
+    print(f"🚀 Prefork szerver: http://{host}:{port} (master {os.getpid()}, {workers} worker)")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # felügyelet: kiesett worker helyett újat forkolunk
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"⚠️  Worker {pid} kilépett ({status}), újraindítás")
+            spawn(slot)
+    sock.close()
+
+
+# ================== BENCH ==================
+
+def _ask(url: str, question: str) -> float:
+    t0 = time.perf_counter()
+    req = urllib.request.Request(url, data=json.dumps({"question": question}).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=300) as resp:
+        resp.read()
+    return time.perf_counter() - t0
+
+
+def _wait_ready(url: str, timeout: float = 600.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/ready", timeout=2):
+                pass
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def _load(url: str, n_requests: int, concurrency: int) -> float:
+    lock = threading.Lock()
+    todo = list(range(n_requests))
+
+    def client():
+        while True:
+            with lock:
+                if not todo:
+                    return
+                i = todo.pop()
+            _ask(url + "/ask", QUESTIONS[i % len(QUESTIONS)])
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return n_requests / (time.perf_counter() - t0)
+
+
+def _measure(mode: str, n: int, port: int, n_requests: int) -> dict:
+    script = os.path.abspath(__file__)
+    if mode == "prefork":
+        procs = [subprocess.Popen([sys.executable, script, "serve", "--workers", str(n), "--port", str(port)],
+                                  stdout=subprocess.DEVNULL)]
+    else:
+        procs = [subprocess.Popen([sys.executable, script, "serve", "--workers", "0", "--port", str(port),
+                                   "--reuse-port"], stdout=subprocess.DEVNULL) for _ in range(n)]
+    url = f"http://{HOST}:{port}"
+    try:
+        if not _wait_ready(url):
+            raise RuntimeError("a szerver nem indult el")
+        time.sleep(2.0 if mode == "prefork" else 2.0 * n)   # minden worker / folyamat felálljon
+        _load(url, n * 2, n)                                 # bemelegítés
+        rps = _load(url, n_requests, n * 2)
+
+        pids = [p.pid for p in procs] + [c for p in procs for c in child_pids(p.pid)]
+        mem = [memory_kb(pid) for pid in pids]
+        return {
+            "rps": rps,
+            "rss": sum(m["rss"] for m in mem) / 1024,
+            "pss": sum(m["pss"] for m in mem) / 1024,
+            "worker_rss": max((memory_kb(c)["rss"] for p in procs for c in child_pids(p.pid)), default=0) / 1024,
+        }
+    finally:
+        for p in procs:
+            p.send_signal(signal.SIGTERM)
+        for p in procs:
+            p.wait(timeout=30)
+
+
+def bench(levels: List[int], n_requests: int, port: int) -> None:
+    print(f"{'mód':>10} {'N':>3} {'kérés/s':>9} {'skála':>6} {'ΣRSS MB':>9} {'ΣPSS MB':>9} {'worker RSS':>11}")
+    for mode in ("prefork", "független"):
+        base = None
+        for n in levels:
+            r = _measure("prefork" if mode == "prefork" else "independent", n, port, n_requests)
+            base = base or r["rps"] / n
+            worker = f"{r['worker_rss']:>9.0f}MB" if mode == "prefork" else f"{'-':>11}"
+            print(f"{mode:>10} {n:>3} {r['rps']:>9.2f} {r['rps'] / base:>5.1f}× {r['rss']:>9.0f} "
+                  f"{r['pss']:>9.0f} {worker}")
+    print("ΣRSS a megosztott lapokat többször számolja; a valós memóriaigény a ΣPSS.")
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Pre-fork QA szerver")
+    ap.add_argument("cmd", choices=["serve", "bench"])
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--workers", type=int, nargs="+", default=[WORKERS])
+    ap.add_argument("--reuse-port", action="store_true")
+    ap.add_argument("--requests", type=int, default=100)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        serve(args.host, args.port, args.workers[0], args.reuse_port)
+    else:
+        bench(args.workers, args.requests, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
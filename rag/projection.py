@@ -0,0 +1,155 @@
+# rag/projection.py
+"""
+Embedding dimenziócsökkentés az index építésekor.
+
+Két módszer:
+    "pca"        – PCA a chunk embeddingeken (átlag + főkomponensek)
+    "matryoshka" – Matryoshka-tanított modelleknél (pl. text-embedding-3-*)
+                   egyszerű levágás az első N dimenzióra + újranormálás
+
+A vetítés (projection.npz) az index snapshot mellé kerül, a regiszter
+lekérdezéskor ugyanezzel vetíti a kérdés vektorát. A kollekció
+metaadatában az eredeti (source_dim) és a tárolt (embed_dim) dimenzió is
+szerepel, az eltérő vektort a regiszter a Chroma előtt elutasítja.
+
+    python rag/projection.py bench [kollekció] [--dims 64 128 192 256]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+PROJECTION_FILE = "projection.npz"
+
+# Ezeknél a modelleknél az első N dimenzió önmagában is használható embedding
+MATRYOSHKA_MODELS = (
+    "text-embedding-3-small",
+    "text-embedding-3-large",
+    "nomic-ai/nomic-embed-text-v1.5",
+)
+
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(norms, 1e-12)
+
+
+class Projection:
+    def __init__(self, method: str, source_dim: int, mean: np.ndarray, components: np.ndarray):
+        self.method = method
+        self.source_dim = source_dim
+        self.mean = mean.astype(np.float32)              # (source_dim,)
+        self.components = components.astype(np.float32)  # (out_dim, source_dim)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    def apply(self, vectors) -> np.ndarray:
+        """(n, source_dim) vagy (source_dim,) → normalizált (n, dim) / (dim,)."""
+        x = np.asarray(vectors, dtype=np.float32)
+        if x.shape[-1] != self.source_dim:
+            raise ValueError(f"{x.shape[-1]} dimenziós vektor, a vetítés {self.source_dim} dimenziót vár")
+        if self.method == "matryoshka":
+            return normalize(x[..., :self.dim])
+        return normalize((x - self.mean) @ self.components.T)
+
+    def save(self, index_dir) -> Path:
+        path = Path(index_dir) / PROJECTION_FILE
+        np.savez(path, method=np.array(self.method), source_dim=np.array(self.source_dim),
+                 mean=self.mean, components=self.components)
+        return path
+
+    @classmethod
+    def load(cls, index_dir) -> Optional["Projection"]:
+        path = Path(index_dir) / PROJECTION_FILE
+        if not path.exists():
+            return None
+        data = np.load(path)
+        return cls(str(data["method"]), int(data["source_dim"]), data["mean"], data["components"])
+
+
+def fit_pca(embeddings, dim: int) -> Projection:
+    x = np.asarray(embeddings, dtype=np.float32)
+    if dim >= x.shape[1]:
+        raise ValueError(f"A cél dimenzió ({dim}) nem kisebb az eredetinél ({x.shape[1]})")
+    mean = x.mean(axis=0)
+    # SVD a centrált mátrixon: a jobb szinguláris vektorok a főkomponensek
+    _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+    return Projection("pca", x.shape[1], mean, vt[:dim])
+
+
+def matryoshka(source_dim: int, dim: int) -> Projection:
+    return Projection("matryoshka", source_dim, np.zeros(source_dim, dtype=np.float32),
+                      np.eye(dim, source_dim, dtype=np.float32))
+
+
+def fit(embeddings, dim: int, embed_model: str) -> Projection:
+    """Matryoshka modellnél levágás, egyébként PCA."""
+    if embed_model.split("/")[-1] in MATRYOSHKA_MODELS or embed_model in MATRYOSHKA_MODELS:
+        return matryoshka(len(embeddings[0]), dim)
+    return fit_pca(embeddings, dim)
+
+
+# ================== CLI ==================
+
+def _topk(base: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    out = []
+    for q in queries:
+        diff = base - q
+        l2 = np.einsum("ij,ij->i", diff, diff)
+        out.append(set(np.argpartition(l2, k)[:k].tolist()))
+    return out
+
+
+def bench(embeddings: np.ndarray, dims: List[int], embed_model: str, k: int = 5) -> None:
+    x = normalize(np.asarray(embeddings, dtype=np.float32))
+    rng = np.random.default_rng(0)
+    idx = rng.choice(len(x), size=min(200, len(x)), replace=False)
+    queries = normalize(x[idx] + rng.normal(0, 0.02, size=(len(idx), x.shape[1])).astype(np.float32))
+
+    t0 = time.perf_counter()
+    truth = _topk(x, queries, k)
+    t_full = (time.perf_counter() - t0) / len(queries)
+
+    print(f"Vektorok: {len(x)} × {x.shape[1]} dim ({embed_model})")
+    print(f"{'dim':>6} {'recall@' + str(k):>10} {'ms/lekérdezés':>14} {'B/vektor':>10} {'memória':>8}")
+    print(f"{x.shape[1]:>6} {1.0:>10.3f} {t_full * 1000:>14.2f} {x.shape[1] * 4:>10} {'100%':>8}")
+
+    for dim in dims:
+        if dim >= x.shape[1]:
+            continue
+        proj = fit(x, dim, embed_model)
+        base = proj.apply(x)
+        t0 = time.perf_counter()
+        got = _topk(base, proj.apply(queries), k)
+        dt = (time.perf_counter() - t0) / len(queries)
+        recall = sum(len(a & b) for a, b in zip(got, truth)) / (k * len(queries))
+        print(f"{dim:>6} {recall:>10.3f} {dt * 1000:>14.2f} {dim * 4:>10} {100 * dim / x.shape[1]:>7.0f}%")
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Dimenziócsökkentés: recall vs. sebesség / memória")
+    ap.add_argument("cmd", choices=["bench"])
+    ap.add_argument("collection", nargs="?", default="rackhost_kb")
+    ap.add_argument("--dims", type=int, nargs="+", default=[64, 128, 192, 256])
+    args = ap.parse_args(argv)
+
+    from kb_registry import get_registry
+
+    registry = get_registry()
+    col = registry.get_collection(args.collection)
+    meta = col.metadata or {}
+    if meta.get("projection"):
+        print(f"⚠️  A(z) {args.collection} már vetített vektorokat tárol ({meta['projection']}, "
+              f"{meta.get('embed_dim')} dim) – a bench az eredeti dimenziós indexen értelmes.")
+    embeddings = np.asarray(col.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+    bench(embeddings, args.dims, meta.get("embed_model") or registry.spec(args.collection).embed_model)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,89 @@
+# rag/query_cache.py
+"""
+Kis, folyamaton belüli LRU cache-ek a QA útvonalhoz.
+
+Ügyfélszolgálati forgalomban ugyanaz a néhány kérdés sokszor visszatér;
+ezeknél az embeddinget és a keresés eredményét nem számoljuk újra.
+
+- EMBED_CACHE:     normalizált kérdés → kérdés embedding
+- RETRIEVAL_CACHE: (kérdés, top_k, mód, indexek) → találatok
+
+A retrieval kulcsban az élő index útvonalai is benne vannak, így snapshot
+csere után a régi találatok maguktól kiesnek. A találati arányt a
+rag/replay.py riportolja (cache_stats).
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE", "2048"))        # 0 = kikapcsolva
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RAG_RETRIEVAL_CACHE", "1024"))
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value) -> None:
+        if self.maxsize <= 0 or value is None:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def reset_stats(self) -> None:
+        # bemelegítés után: a feltöltés hiányai ne rontsák a találati arányt
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def summary(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+EMBED_CACHE = LRUCache("embed", EMBED_CACHE_SIZE)
+RETRIEVAL_CACHE = LRUCache("retrieval", RETRIEVAL_CACHE_SIZE)
+
+
+def cache_stats(extra: Optional[Dict[str, object]] = None) -> Dict[str, dict]:
+    """Cache-enkénti találati statisztika; extra: további, hits/misses attribútumú objektumok (pl. GYIK tábla)."""
+    stats = {c.name: c.summary() for c in (EMBED_CACHE, RETRIEVAL_CACHE)}
+    for name, obj in (extra or {}).items():
+        total = obj.hits + obj.misses
+        stats[name] = {"size": len(obj), "hits": obj.hits, "misses": obj.misses,
+                       "hit_rate": obj.hits / total if total else 0.0}
+    return stats
@@ -0,0 +1,130 @@
+# rag/query_log.py
+"""
+Rotáló lekérdezés-napló (opcionális, RAG_QUERY_LOG=1).
+
+Minden belépési pont (rag_qa_ollama, rag_qa, rag_cli, rag_chat, async_qa)
+soronként egy JSON rekordot ír: időbélyeg, belépési pont, kérdés, a
+visszakapott chunk ID-k és távolságok, a kapu döntése és a lépések ideje.
+A naplót a rag/replay.py játssza vissza terheléses teszthez.
+
+    logs/queries.jsonl, logs/queries.jsonl.1, ...   (méret alapján rotál)
+
+Prefork workerek (prefork_server.py) saját fájlba írnak (queries.<pid>.jsonl),
+a rotáció folyamatonként biztonságos; az iter_log időrendben fésüli össze őket.
+"""
+import glob
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+QUERY_LOG_ENABLED = os.getenv("RAG_QUERY_LOG", "") not in ("", "0")
+QUERY_LOG_PATH = Path(os.getenv("RAG_QUERY_LOG_PATH", str(BASE_DIR / "logs" / "queries.jsonl")))
+QUERY_LOG_MAX_BYTES = 50 * 1024 * 1024
+QUERY_LOG_BACKUPS = 5
+
+_logger: Optional[logging.Logger] = None
+_lock = threading.Lock()
+
+
+def _log_path() -> Path:
+    if os.environ.get("RAG_PREFORK_CHILD"):
+        return QUERY_LOG_PATH.with_name(f"{QUERY_LOG_PATH.stem}.{os.getpid()}{QUERY_LOG_PATH.suffix}")
+    return QUERY_LOG_PATH
+
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    if _logger is None:
+        with _lock:
+            if _logger is None:
+                path = _log_path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                handler = RotatingFileHandler(path, maxBytes=QUERY_LOG_MAX_BYTES,
+                                              backupCount=QUERY_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger(f"rag.querylog.{os.getpid()}")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+
+def _after_fork() -> None:
+    # a gyerek saját fájlba ír (RAG_PREFORK_CHILD), nem a szülő handlerébe
+    global _logger, _lock
+    _logger, _lock = None, threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def log_query(entry: str, question: str, hits: Optional[List[dict]] = None,
+              timings: Optional[dict] = None, **extra) -> None:
+    """Egy lekérdezés naplózása; kikapcsolt naplónál nem csinál semmit."""
+    if not QUERY_LOG_ENABLED:
+        return
+    hits = hits or []
+    record = {
+        "ts": time.time(),
+        "entry": entry,
+        "question": question,
+        "ids": [h.get("id", "") for h in hits],
+        "distances": [round(float(h["distance"]), 4) for h in hits if h.get("distance") is not None],
+        "timings": {k: round(v, 4) for k, v in (timings or {}).items()},
+    }
+    record.update(extra)
+    try:
+        _get_logger().info(json.dumps(record, ensure_ascii=False))
+    except OSError as e:
+        # a napló soha nem akaszthatja meg a kiszolgálást
+        print(f"⚠️  Query log írási hiba: {e}")
+
+
+def _iter_file(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def _backup_no(path: str) -> int:
+    """RotatingFileHandler mentés sorszáma (queries.jsonl.3 → 3), egyébként 0."""
+    suffix = Path(path).suffix.lstrip(".")
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def _rotated(path: str) -> List[str]:
+    """Egy napló és a rotált példányai időrendben (legrégebbi .N elöl)."""
+    backups = sorted((p for p in glob.glob(glob.escape(path) + ".*") if _backup_no(p)), key=_backup_no, reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def _iter_chain(paths: List[str]) -> Iterator[dict]:
+    for p in paths:
+        yield from _iter_file(p)
+
+
+def iter_log(paths: Optional[List[str]] = None) -> Iterator[dict]:
+    """
+    Napló rekordok időrendben. paths: fájlok / glob minták; alapból a
+    QUERY_LOG_PATH és a prefork workerek fájljai.
+    """
+    if not paths:
+        paths = [str(QUERY_LOG_PATH), str(QUERY_LOG_PATH.with_name(f"{QUERY_LOG_PATH.stem}.*{QUERY_LOG_PATH.suffix}"))]
+    files = sorted({f for p in paths for f in (glob.glob(p) or [p]) if not _backup_no(f)})
+    streams = [_iter_chain(_rotated(f)) for f in files]
+    return heapq.merge(*streams, key=lambda r: r.get("ts", 0.0))
@@ -1,39 +1,32 @@
 # rag/rag_cli.py
-from pathlib import Path
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
+import time
 
-BASE_DIR = Path(__file__).resolve().parent.parent   # .../rackhostllm
-DB_DIR   = BASE_DIR / "chroma_kb"
+from kb_registry import get_registry, DEFAULT_COLLECTION
+from query_log import log_query
 
-client = chromadb.PersistentClient(path="../chroma_kb")
-collection = client.get_collection("rackhost_kb")
+# A regiszter a repo gyökeréhez képest oldja fel a chroma_kb utat,
+# így a script bármelyik könyvtárból futtatható
+registry = get_registry()
 
-
-embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-
-def retrieve(query, top_k=5):
-    q_emb = embedder.encode([query])[0].tolist()
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=top_k,
-    )
-    return res
+def retrieve(query, top_k=5, collections=None):
+    t0 = time.perf_counter()
+    hits = registry.query(query, names=collections or [DEFAULT_COLLECTION], top_k=top_k)
+    log_query("rag_cli", query, hits, {"retrieve": time.perf_counter() - t0})
+    return hits
 
 if __name__ == "__main__":
     import sys
+    from answer_engine import synthesize_answer
+
     query = " ".join(sys.argv[1:]) or "cPanel bejelentkezés"
-    res = retrieve(query)
-    for i in range(len(res["ids"][0])):
+    results = retrieve(query)
+    for hit in results:
         print("---")
-        print("TITLE:", res["metadatas"][0][i].get("title"))
-        print("URL:  ", res["metadatas"][0][i].get("url"))
-        print("TEXT:", res["documents"][0][i][:400], "...")
-
-from answer_engine import synthesize_answer
-
-contexts = [m["document"] for m in results]
-answer = synthesize_answer(query, contexts)
-print("\n\n=== FINAL ANSWER ===\n")
-print(answer)
+        print("TITLE:", hit.get("title"))
+        print("URL:  ", hit.get("url"))
+        print("TEXT:", hit["text"][:400], "...")
+
+    contexts = [hit["text"] for hit in results]
+    answer = synthesize_answer(query, contexts)
+    print("\n\n=== FINAL ANSWER ===\n")
+    print(answer)
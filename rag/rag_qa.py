@@ -1,86 +1,76 @@
 import sys
+import time
 from pathlib import Path
 from typing import Union  # ÚJ: A Python 3.9 kompatibilitás miatt
 
-import torch
-from chromadb import PersistentClient
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from confidence_gate import GATE_K, REFUSAL_TEXT, get_gate, report as confidence_gate_report
+from deadline import DEFAULT_BUDGET, Deadline
+from generators import get_generator
+from kb_registry import get_registry
+from query_cache import EMBED_CACHE, RETRIEVAL_CACHE, normalize_question
+from query_log import log_query
+from warmup import WARMUP_TOP_N, warm_up as run_warm_up, warm_worker as run_warm_worker
 
 # ================== ALAP BEÁLLÍTÁSOK ==================
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-CHROMA_PATH = BASE_DIR / "chroma_kb"
 COLLECTION_NAME = "rackhost_kb"
 
-# Eszköz
-# Az MPS/VRAM problémák miatt alapértelmezetten CPU-ra állítva a stabilitás érdekében.
-# Ha nagyobb modell és több RAM áll rendelkezésre, át lehet állítani "mps"-re vagy "cuda"-ra.
-if torch.cuda.is_available():
-    DEVICE = "cuda"
-# elif torch.backends.mps.is_available():
-#     DEVICE = "mps" # Kikapcsolva 8GB RAM esetén
-else:
-    DEVICE = "cpu"
-
-print(f"Eszköz (DEVICE): {DEVICE}") # Kiegészítő kiírás
-
 # Ugyanaz az embedder, mint indexelésnél
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-embedder = SentenceTransformer(EMBED_MODEL_NAME)
+registry = get_registry()
+embedder = registry.get_embedder(EMBED_MODEL_NAME)
 
-# Kicsi seq2seq modell – flan-t5-small
+# Kicsi seq2seq modell – flan-t5-small, a generátor-rétegben egyszer töltve.
+# Eszköz: az MPS/VRAM problémák miatt CPU (vagy CUDA, ha van), lásd generators.py
 LLM_MODEL_NAME = "google/flan-t5-small"
-tokenizer = AutoTokenizer.from_pretrained(LLM_MODEL_NAME)
-# A modell betöltése a kiválasztott eszközre
-model = AutoModelForSeq2SeqLM.from_pretrained(LLM_MODEL_NAME).to(DEVICE)
-model.eval()
+generator = get_generator("hf", model=LLM_MODEL_NAME)
+print(f"Eszköz (DEVICE): {generator.device}") # Kiegészítő kiírás
 
 MAX_CONTEXT_CHARS = 800
 MAX_INPUT_TOKENS = 512
-MAX_NEW_TOKENS = 120  # 2–4 mondat
+MAX_NEW_TOKENS = 120  # 2–4 mondat; határidő szorításában kevesebb (deadline.py)
+DEADLINE_BUDGET = DEFAULT_BUDGET  # s, RAG_DEADLINE; 0 = nincs határidő
 
 
 # ================== CHROMA ==================
 
 def get_collection():
-    client = PersistentClient(path=str(CHROMA_PATH))
-    collection = client.get_collection(COLLECTION_NAME)
-    return collection
+    return registry.get_collection(COLLECTION_NAME)
 
 
 # ================== RAG LÉPÉSEK ==================
 
 def embed_query(query: str):
-    vec = embedder.encode([query])
-    return vec[0].tolist()
+    # visszatérő kérdésnél nem embeddelünk újra (query_cache.py), a többi
+    # párhuzamos kérdéssel egy encode hívásban fut (micro_batch.py)
+    key = normalize_question(query)
+    vec = EMBED_CACHE.get(key)
+    if vec is None:
+        vec = registry.embed(EMBED_MODEL_NAME, query)
+        EMBED_CACHE.put(key, vec)
+    return vec
+
+
+def retrieve_contexts(question: str, top_k: int = GATE_K, q_emb=None):
+    # az élő index útvonala is a kulcs része: snapshot csere után nincs elavult találat
+    key = ("rag_qa", normalize_question(question), top_k, registry.index_path(COLLECTION_NAME))
+    cached = RETRIEVAL_CACHE.get(key)
+    if cached is not None:
+        return [dict(hit) for hit in cached]
+    q_emb = embed_query(question) if q_emb is None else q_emb
+
+    # GATE_K találat: a kapu ugyanazon az ablakon dönt, amin a küszöbeit tanulta.
+    # A regiszter ellenőrzi az embeddert és vetített indexnél a kérdés
+    # vektorát is az index terébe vetíti (kb_registry.query_collection).
+    hits = registry.query_collection(COLLECTION_NAME, q_emb, top_k)
+    RETRIEVAL_CACHE.put(key, [dict(hit) for hit in hits])
+    return hits
 
 
 def retrieve_best_context(question: str):
-    collection = get_collection()
-    q_emb = embed_query(question)
-
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=1,
-        include=["documents", "metadatas"],
-    )
-
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-
-    if not docs:
-        return None
-
-    txt = docs[0]
-    meta = metas[0] if metas else {}
-
-    return {
-        "text": txt,
-        "title": meta.get("title", ""),
-        "url": meta.get("url", ""),
-        "category": meta.get("category", ""),
-    }
+    hits = retrieve_contexts(question, top_k=1)
+    return hits[0] if hits else None
 
 
 # Típus-annotáció javítva Python 3.9-re
@@ -122,30 +112,18 @@ def build_prompt(question: str, ctx: Union[dict, None]) -> str:
 
 # ================== GENERÁLÁS ==================
 
-def generate_answer(prompt: str) -> str:
-    enc = tokenizer(
-        prompt,
-        return_tensors="pt",
-        truncation=True,
-        max_length=MAX_INPUT_TOKENS,
-        padding=True,
-    )
-    input_ids = enc["input_ids"].to(DEVICE)
-    attention_mask = enc["attention_mask"].to(DEVICE)
-
-    with torch.no_grad():
-        out_ids = model.generate(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            max_new_tokens=MAX_NEW_TOKENS,
-            do_sample=False,
-            num_beams=1,
-            early_stopping=False, # MÓDOSÍTVA: True helyett False, a kis modell befulladásának elkerülésére
-        )
+def generate_answer(prompt: str, deadline: Deadline = None) -> str:
+    # MAX_INPUT_TOKENS-re vágás és mohó dekódolás a HF backendben történik
+    if deadline is None:
+        return generator.generate(prompt, max_tokens=MAX_NEW_TOKENS) or ""
 
-    gen_ids = out_ids[0]
-    text = tokenizer.decode(gen_ids, skip_special_tokens=True).strip()
-    return text
+    # a HF generálás nem szakítható meg: a max_new_tokens a hátralévő időhöz
+    # igazodik, és a hedge a határidőnél visszaadja a vezérlést
+    max_tokens = deadline.max_tokens(MAX_NEW_TOKENS)
+    if not max_tokens:
+        return ""
+    return deadline.run(generator.generate, prompt, max_tokens=max_tokens, timeout=generator.timeout,
+                        timeout_arg="timeout" if generator.interruptible else None) or ""
 
 
 # ================== FŐ FÜGGVÉNY ==================
@@ -173,24 +151,74 @@ def fallback_snippet_answer(question: str, ctx: Union[dict, None]) -> str:
     return "\n".join(parts)
 
 
-def answer_question(question: str):
-    ctx = retrieve_best_context(question)
-
-    prompt = build_prompt(question, ctx)
-    llm_answer = generate_answer(prompt)
-    
-    # A kiíratás meggyőződése érdekében, hogy a prompt futott:
-    # print("\n--- PROMPT ---\n", prompt, "\n--------------\n")
-    # print("--- LLM VÁLASZ HOSSZA: ", len(llm_answer), "\n--------------\n")
-
-    # Ha a modell válasza túl rövid vagy láthatóan szemét, fallback
-    if not llm_answer or len(llm_answer) < 20:
-        final = fallback_snippet_answer(question, ctx)
-        final = "⚠️ RÖVID VÁLASZ/HIBA (FALLBACK):\n" + final
+def answer(question: str, deadline: Deadline = None) -> dict:
+    """Kérdés → {"answer", "decision", "title", "url", "cut"}; kiírás nélkül (prefork_server is ezt hívja)."""
+    deadline = deadline or Deadline(DEADLINE_BUDGET)
+    t0 = time.perf_counter()
+    hits = retrieve_contexts(question)
+    timings = {"retrieve": time.perf_counter() - t0}
+
+    # Kapu: kontextus nélküli / bizonytalan kérdésre nem futtatjuk a modellt
+    decision = get_gate(COLLECTION_NAME).decide(hits)
+    ctx = hits[0] if hits else None
+    result = {"decision": decision, "title": (ctx or {}).get("title", ""), "url": (ctx or {}).get("url", "")}
+
+    if decision == "refuse":
+        result["answer"] = REFUSAL_TEXT
+    elif decision == "snippet":
+        result["answer"] = fallback_snippet_answer(question, ctx)
     else:
-        final = "✅ LLM VÁLASZ:\n" + llm_answer
+        t = time.perf_counter()
+        llm_answer = generate_answer(build_prompt(question, ctx), deadline)
+        timings["generate"] = time.perf_counter() - t
+
+        # Ha a modell válasza túl rövid vagy láthatóan szemét, fallback
+        if not llm_answer or len(llm_answer) < 20:
+            result.update(decision="fallback", answer=fallback_snippet_answer(question, ctx))
+        else:
+            result["answer"] = llm_answer
+
+    timings["total"] = time.perf_counter() - t0
+    result["cut"] = list(deadline.cut)
+    log_query("rag_qa", question, hits, timings, decision=result["decision"], cut=result["cut"])
+    return result
+
+
+def warm_up(top_n: int = WARMUP_TOP_N, questions=None) -> dict:
+    """
+    Modell + index bemelegítés és a gyakori kérdésekkel az embed / retrieval
+    cache feltöltése kiszolgálás előtt (warmup.py).
+    """
+    report = run_warm_up(
+        registry, [COLLECTION_NAME],
+        embed=embed_query,
+        retrieve=lambda q, q_emb: retrieve_contexts(q, q_emb=q_emb),
+        generate=lambda: generate_answer("Válasz: bemelegítés"),
+        questions=questions, top_n=top_n,
+    )
+    EMBED_CACHE.reset_stats()
+    RETRIEVAL_CACHE.reset_stats()
+    return report
+
 
-    print(final)
+def warm_worker() -> dict:
+    """Fork után, a kérések fogadása előtt: a worker saját Chroma kapcsolatának bemelegítése."""
+    return run_warm_worker(registry, [COLLECTION_NAME], embed_query, top_k=GATE_K)
+
+
+def answer_question(question: str):
+    result = answer(question)
+
+    if result["decision"] == "refuse":
+        print("⚠️ NINCS RELEVÁNS TALÁLAT:\n" + result["answer"])
+    elif result["decision"] == "snippet":
+        print("ℹ️ BIZONYTALAN TALÁLAT (SNIPPET, LLM NÉLKÜL):\n" + result["answer"])
+    elif result["decision"] == "fallback":
+        print("⚠️ RÖVID VÁLASZ/HIBA (FALLBACK):\n" + result["answer"])
+    else:
+        print("✅ LLM VÁLASZ:\n" + result["answer"])
+    if result["cut"]:
+        print(f"⏱️ Határidő miatt megkurtítva: {', '.join(result['cut'])}")
 
 
 if __name__ == "__main__":
@@ -199,4 +227,5 @@ if __name__ == "__main__":
         sys.exit(1)
 
     q = " ".join(sys.argv[1:])
-    answer_question(q)
\ No newline at end of file
+    answer_question(q)
+    print("\n" + confidence_gate_report())
\ No newline at end of file
@@ -1,76 +1,113 @@
+import os
 import sys
+import time
 from pathlib import Path
 from typing import Union
-import requests
-import json
 
-from chromadb import PersistentClient
-from sentence_transformers import SentenceTransformer
+from confidence_gate import GATE_K, MAX_DISTANCE, REFUSAL_TEXT, get_gate, report as confidence_gate_report
+from deadline import DEFAULT_BUDGET, Deadline
+from faq_table import get_faq_table
+from generators import get_generator
+from kb_registry import get_registry
+from query_cache import EMBED_CACHE, RETRIEVAL_CACHE, normalize_question
+from query_log import log_query
+from sentence_index import MAX_SENTENCES, compress
+from warmup import WARMUP_TOP_N, warm_up as run_warm_up
 
 # ================== ALAP BEÁLLÍTÁSOK ==================
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-CHROMA_PATH = BASE_DIR / "chroma_kb"
 COLLECTION_NAME = "rackhost_kb"
 
-# Embedder - ugyanaz marad
+# Ezekben a kollekciókban keresünk egyszerre (lásd collections.json),
+# pl. ["rackhost_kb", "tickets_hu"]
+SEARCH_COLLECTIONS = [COLLECTION_NAME]
+
+registry = get_registry()
+
+# Embedder - ugyanaz marad (a regiszter cache-eli, nem töltjük be kétszer)
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-embedder = SentenceTransformer(EMBED_MODEL_NAME)
+embedder = registry.get_embedder(EMBED_MODEL_NAME)
 
-# Ollama beállítások
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+# Generátor beállítások (RAG_GENERATOR=ollama | llamacpp | hf | stub, lásd generators.py)
+GENERATOR_BACKEND = os.getenv("RAG_GENERATOR", "ollama")
 OLLAMA_MODEL = "mistral:latest"
 
 MAX_CONTEXT_CHARS = 1200
-TOP_K_DOCS = 2
+TOP_K_DOCS = 2            # ennyi chunk kerül a promptba
+RETRIEVE_K = max(TOP_K_DOCS, GATE_K)   # a kapu fix GATE_K találaton dönt (confidence_gate.py)
+MAX_NEW_TOKENS = 200      # határidő szorításában kevesebb (deadline.py)
+
+# Kérésenkénti latencia költségvetés (s), RAG_DEADLINE; 0 = nincs határidő
+DEADLINE_BUDGET = DEFAULT_BUDGET
+
+# Kontextus tömörítés: chunkonként csak a kérdéshez legközelebbi mondatok
+# (előre számolt mondat-index, lásd sentence_index.py); 0 = kikapcsolva
+CONTEXT_SENTENCES = int(os.getenv("RAG_CONTEXT_SENTENCES", str(MAX_SENTENCES)))
+
+# Keresési mód: "exact" (Chroma) vagy "binary" (bites első kör + float
+# újrapontozás, előtte: python rag/binary_index.py build)
+SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "exact")
 
 # ================== CHROMA ==================
 
 def get_collection():
-    client = PersistentClient(path=str(CHROMA_PATH))
-    collection = client.get_collection(COLLECTION_NAME)
-    return collection
+    return registry.get_collection(COLLECTION_NAME)
 
 # ================== RAG LÉPÉSEK ==================
 
 def embed_query(query: str):
-    vec = embedder.encode([query])
-    return vec[0].tolist()
-
-def retrieve_best_contexts(question: str, top_k: int = TOP_K_DOCS):
-    collection = get_collection()
-    q_emb = embed_query(question)
-
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"],
-    )
-
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-    distances = res.get("distances", [[]])[0]
-
-    if not docs:
-        return []
+    # visszatérő kérdésnél nem embeddelünk újra (query_cache.py), a többi
+    # párhuzamos kérdéssel egy encode hívásban fut (micro_batch.py)
+    key = normalize_question(query)
+    vec = EMBED_CACHE.get(key)
+    if vec is None:
+        vec = registry.embed(EMBED_MODEL_NAME, query)
+        EMBED_CACHE.put(key, vec)
+    return vec
+
+def retrieve_best_contexts(question: str, top_k: int = RETRIEVE_K, q_emb=None, mode: str = None,
+                           deadline: Deadline = None):
+    # az élő index útvonala is a kulcs része: snapshot csere után nincs elavult találat
+    mode = mode or SEARCH_MODE
+    key = (normalize_question(question), top_k, mode,
+           tuple(registry.index_path(name) for name in SEARCH_COLLECTIONS))
+    cached = RETRIEVAL_CACHE.get(key)
+    if cached is not None:
+        return [dict(hit) for hit in cached]
+
+    # A regiszter embeddel, párhuzamosan kérdezi a kollekciókat és
+    # normalizált pontszám szerint fésüli össze a találatokat
+    q_embs = {EMBED_MODEL_NAME: q_emb} if q_emb is not None else None
+    n_cut = len(deadline.cut) if deadline is not None else 0
+    hits = registry.query(question, names=SEARCH_COLLECTIONS, top_k=top_k, q_embs=q_embs, mode=mode,
+                          deadline=deadline)
 
     contexts = []
-    for i, (doc, meta, dist) in enumerate(zip(docs, metas, distances)):
-        if dist > 1.5:
+    for hit in hits:
+        if hit["distance"] > MAX_DISTANCE:
             continue
-        
-        contexts.append({
-            "text": doc,
-            "title": meta.get("title", ""),
-            "url": meta.get("url", ""),
-            "category": meta.get("category", ""),
-            "distance": dist,
-            "rank": i + 1
-        })
-    
+        contexts.append(hit)
+
+    # határidő miatt hiányos találatot nem cache-elünk
+    if deadline is None or len(deadline.cut) == n_cut:
+        RETRIEVAL_CACHE.put(key, [dict(hit) for hit in contexts])
     return contexts
 
-def build_prompt(question: str, contexts: list) -> str:
+def compress_contexts(contexts: list, q_emb) -> list:
+    if not CONTEXT_SENTENCES or q_emb is None:
+        return contexts
+    out = []
+    for ctx in contexts:
+        index = registry.get_sentence_index(ctx.get("collection") or COLLECTION_NAME)
+        out.extend(compress([ctx], q_emb, index, EMBED_MODEL_NAME, CONTEXT_SENTENCES))
+    return out
+
+def build_prompt(question: str, contexts: list, q_emb=None) -> str:
+    # a kapu miatt több találat jön, a promptba csak az első TOP_K_DOCS;
+    # q_emb megadásakor a chunkokból csak a releváns mondatok kerülnek be
+    contexts = compress_contexts(contexts[:TOP_K_DOCS], q_emb)
+
     if not contexts:
         return (
             "Válaszolj magyarul, szakszerűen, de érthetően 2-4 mondatban.\n\n"
@@ -116,39 +153,26 @@ VÁLASZ:"""
 
 # ================== OLLAMA GENERÁLÁS ==================
 
-def generate_with_ollama(prompt: str, model: str = OLLAMA_MODEL) -> Union[str, None]:
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.7,
-            "top_p": 0.9,
-            "top_k": 40,
-            "num_predict": 200,
-        }
-    }
-    
-    try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json=payload,
-            timeout=60
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        answer = result.get("response", "").strip()
-        
-        return answer if answer else None
-        
-    except requests.exceptions.ConnectionError:
-        print("❌ HIBA: Nem lehet csatlakozni az Ollama-hoz!")
-        print("   Futtasd: brew services start ollama")
-        return None
-    except Exception as e:
-        print(f"❌ Ollama hiba: {e}")
+def get_llm(model: str = OLLAMA_MODEL):
+    if GENERATOR_BACKEND == "ollama":
+        return get_generator("ollama", model=model)
+    return get_generator(GENERATOR_BACKEND)
+
+def generate_with_ollama(prompt: str, model: str = OLLAMA_MODEL, deadline: Deadline = None) -> Union[str, None]:
+    # Hosszú életű backend: timeout, circuit breaker, latencia metrika.
+    # None → a hívó a snippet fallbackre vált.
+    llm = get_llm(model)
+    if deadline is None:
+        return llm.generate(prompt, max_tokens=MAX_NEW_TOKENS)
+
+    # a num_predict a hátralévő időhöz igazodik; ha már semmi nem fér bele, nem hívunk
+    max_tokens = deadline.max_tokens(MAX_NEW_TOKENS)
+    if not max_tokens:
         return None
+    # hedge: a határidő előtt a hívó mindenképp visszakapja a vezérlést (HTTP
+    # backendnél a hívó szálán, a hátralévő idő a kérés timeoutja)
+    return deadline.run(llm.generate, prompt, max_tokens=max_tokens, timeout=llm.timeout,
+                        timeout_arg="timeout" if llm.interruptible else None)
 
 # ================== FALLBACK ==================
 
@@ -176,13 +200,75 @@ def fallback_snippet_answer(contexts: list) -> str:
 
 # ================== FŐ FÜGGVÉNY ==================
 
+def answer(question: str, deadline: Deadline = None) -> dict:
+    """
+    Egy kérdés megválaszolása kiírás nélkül.
+    decision: "faq" | "refuse" | "snippet" | "generate" | "fallback";
+    timings: lépésenkénti idő (s); cut: határidő miatt megkurtított lépések.
+    Bekapcsolt naplónál a query logba is ír.
+    """
+    deadline = deadline or Deadline(DEADLINE_BUDGET)
+    timings = {}
+    t0 = time.perf_counter()
+    q_emb = embed_query(question)
+    timings["embed"] = time.perf_counter() - t0
+
+    # Előre generált, jóváhagyott GYIK válasz → nincs LLM hívás
+    t = time.perf_counter()
+    faq = get_faq_table().lookup(q_emb)
+    timings["faq"] = time.perf_counter() - t
+    if faq:
+        result = {"decision": "faq", "answer": faq["answer"], "faq": faq, "contexts": []}
+    else:
+        t = time.perf_counter()
+        contexts = retrieve_best_contexts(question, top_k=RETRIEVE_K, q_emb=q_emb, deadline=deadline)
+        timings["retrieve"] = time.perf_counter() - t
+
+        # Magabiztossági kapu: bizonytalan / reménytelen kérdésre nem hívunk LLM-et
+        decision = get_gate(COLLECTION_NAME).decide(contexts)
+        if decision == "refuse":
+            final = REFUSAL_TEXT
+        elif decision == "snippet":
+            final = fallback_snippet_answer(contexts)
+        else:
+            t = time.perf_counter()
+            llm_answer = generate_with_ollama(build_prompt(question, contexts, q_emb=q_emb), deadline=deadline)
+            timings["generate"] = time.perf_counter() - t
+
+            if not llm_answer or len(llm_answer) < 30:
+                decision, final = "fallback", fallback_snippet_answer(contexts)
+            else:
+                final = llm_answer
+        result = {"decision": decision, "answer": final, "contexts": contexts}
+
+    timings["total"] = time.perf_counter() - t0
+    result["timings"] = timings
+    result["cut"] = list(deadline.cut)
+    log_query("rag_qa_ollama", question, result["contexts"], timings, decision=result["decision"],
+              cut=result["cut"])
+    return result
+
 def answer_question(question: str):
     print(f"\n🔍 Keresés a tudásbázisban: '{question}'\n")
-    
-    contexts = retrieve_best_contexts(question, top_k=TOP_K_DOCS)
-    
-    if not contexts:
+
+    result = answer(question)
+    decision, contexts = result["decision"], result["contexts"]
+
+    if decision == "faq":
+        faq = result["faq"]
+        print(f"⚡ GYIK találat (hasonlóság: {faq['similarity']:.3f}): {faq['question']}\n")
+        print("=" * 70)
+        print("VÁLASZ:")
+        print("=" * 70)
+        print(faq["answer"])
+        print("=" * 70)
+        if faq.get("url"):
+            print(f"\n📚 Források:\n  • {faq['url']}")
+        return
+
+    if decision == "refuse":
         print("⚠️  Nem találtam releváns dokumentumot.\n")
+        print(REFUSAL_TEXT)
         return
     
     print(f"✓ {len(contexts)} releváns dokumentum találva")
@@ -190,21 +276,17 @@ def answer_question(question: str):
         print(f"  • {ctx.get('title', 'N/A')} (távolság: {ctx.get('distance', 0):.3f})")
     print()
     
-    prompt = build_prompt(question, contexts)
-    
-    print("🤖 LLM válasz generálása...\n")
-    llm_answer = generate_with_ollama(prompt)
-    
-    if not llm_answer or len(llm_answer) < 30:
+    if decision == "snippet":
+        print("ℹ️  Bizonytalan találat – forrásolt kivonat, LLM hívás nélkül:\n")
+    elif decision == "fallback" and "generate" in result["cut"]:
+        print("⏱️  FALLBACK MÓD (a határidőig nem készült el az LLM válasz):\n")
+    elif decision == "fallback":
         print("⚠️  FALLBACK MÓD (LLM hiba):\n")
-        final = fallback_snippet_answer(contexts)
-    else:
-        final = llm_answer
     
     print("=" * 70)
     print("VÁLASZ:")
     print("=" * 70)
-    print(final)
+    print(result["answer"])
     print("=" * 70)
     
     if contexts:
@@ -213,6 +295,30 @@ def answer_question(question: str):
             if ctx.get("url"):
                 print(f"  • {ctx.get('url')}")
 
+    if result["cut"]:
+        print(f"\n⏱️  Határidő miatt megkurtítva: {', '.join(result['cut'])} "
+              f"({result['timings']['total']:.1f} s / {DEADLINE_BUDGET:g} s)")
+
+# ================== BEMELEGÍTÉS ==================
+
+def warm_up(top_n: int = WARMUP_TOP_N, questions=None) -> dict:
+    """
+    Hosszan futó folyamat indulásakor: modell + index bemelegítés, a GYIK
+    tábla betöltése, és az embed / retrieval cache feltöltése a query log
+    leggyakoribb kérdéseiből (warmup.py). A végén warmup.is_ready() igaz.
+    """
+    get_faq_table()
+    report = run_warm_up(
+        registry, SEARCH_COLLECTIONS,
+        embed=embed_query,
+        retrieve=lambda q, q_emb: retrieve_best_contexts(q, q_emb=q_emb),
+        generate=lambda: get_llm().generate("Válasz: ok", max_tokens=1),
+        questions=questions, top_n=top_n,
+    )
+    EMBED_CACHE.reset_stats()
+    RETRIEVAL_CACHE.reset_stats()
+    return report
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print('Használat: python3 rag_qa_ollama.py "kérdés szövege"')
@@ -221,3 +327,4 @@ if __name__ == "__main__":
 
     q = " ".join(sys.argv[1:])
     answer_question(q)
+    print("\n" + confidence_gate_report())
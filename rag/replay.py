@@ -0,0 +1,204 @@
+# rag/replay.py
+"""
+Valós forgalom visszajátszása a QA útvonalra (rag_qa_ollama.answer) stub LLM-mel.
+
+A query log (RAG_QUERY_LOG=1, lásd query_log.py) kérdéseit az eredeti
+ütemezés szerint – vagy N-szeres sebességgel – újra kiadjuk, nyílt
+hurokban: a kérés akkor indul, amikor a log szerint érkezett, függetlenül
+attól, hogy az előzőek végeztek-e már. Így a sorban állás is látszik.
+Valódi embedder, GYIK tábla, Chroma és kapu fut; csak a generálás stub
+(RAG_GENERATOR=stub, fix késleltetés, korlátozott párhuzamosság).
+
+Riport: áteresztőképesség, latencia percentilisek (sorban állással és
+anélkül), lépésenkénti idők, kapu döntések, cache találati arányok,
+mikro-batch méretek.
+
+    python rag/replay.py                               # logs/queries*.jsonl, eredeti tempó
+    python rag/replay.py logs/queries.jsonl --speed 10 # 10× gyorsabban
+    python rag/replay.py --speed 0 --limit 500         # amilyen gyorsan csak lehet
+    python rag/replay.py --max-gap 2 --latency 0.8     # éjszakai szünetek levágva
+    python rag/replay.py --speed 20 --deadline 3       # p99 határidővel (deadline.py)
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 16        # egyszerre futó kérések (ennyi ügyfélszolgálatos)
+
+
+def load_requests(paths, limit=None, entries=None):
+    from query_log import iter_log
+
+    out = []
+    for rec in iter_log(paths):
+        if not rec.get("question") or (entries and rec.get("entry") not in entries):
+            continue
+        out.append(rec)
+        if limit and len(out) >= limit:
+            break
+    return out
+
+
+def schedule(records, speed: float, max_gap: float = None):
+    """Relatív indulási idők (s). speed=0 → mind azonnal; max_gap levágja a hosszú szüneteket."""
+    offsets, t, prev = [], 0.0, None
+    for rec in records:
+        ts = rec.get("ts", 0.0)
+        if prev is not None and speed > 0:
+            gap = max(0.0, ts - prev)
+            if max_gap is not None:
+                gap = min(gap, max_gap)
+            t += gap / speed
+        prev = ts
+        offsets.append(t)
+    return offsets
+
+
+def replay(records, speed: float = 1.0, workers: int = MAX_WORKERS, max_gap: float = None) -> dict:
+    import rag_qa_ollama
+
+    offsets = schedule(records, speed, max_gap)
+    latencies, service, lag = [], [], []
+    stages = defaultdict(list)
+    decisions = Counter()
+    cuts = Counter()
+    errors = 0
+    lock = threading.Lock()
+
+    def run_one(question: str, due: float):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            result = rag_qa_ollama.answer(question)
+        except Exception as e:
+            with lock:
+                errors += 1
+            print(f"❌ {question[:60]!r}: {e}")
+            return
+        done = time.perf_counter()
+        with lock:
+            latencies.append(done - due)          # sorban állással együtt
+            service.append(done - started)
+            decisions[result["decision"]] += 1
+            cuts.update(result.get("cut", []))
+            for name, sec in result["timings"].items():
+                stages[name].append(sec)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rec, offset in zip(records, offsets):
+            due = t0 + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lag.append(max(0.0, time.perf_counter() - due))
+            pool.submit(run_one, rec["question"], due)
+    wall = time.perf_counter() - t0
+
+    return {
+        "requests": len(records),
+        "completed": len(latencies),
+        "errors": errors,
+        "wall": wall,
+        "offered": len(records) / offsets[-1] if offsets and offsets[-1] > 0 else float("inf"),
+        "throughput": len(latencies) / wall if wall > 0 else 0.0,
+        "latencies": latencies,
+        "service": service,
+        "dispatch_lag": max(lag) if lag else 0.0,
+        "stages": stages,
+        "decisions": decisions,
+        "cuts": cuts,
+    }
+
+
+def print_report(r: dict) -> None:
+    from async_loadtest import percentile
+    from faq_table import get_faq_table
+    from generators import metrics_report
+    from kb_registry import get_registry
+    from query_cache import cache_stats
+
+    def ms(values, p):
+        return percentile(values, p) * 1000
+
+    print(f"\nKérések: {r['requests']} (kész: {r['completed']}, hiba: {r['errors']}), "
+          f"futásidő: {r['wall']:.1f} s")
+    offered = "∞" if r["offered"] == float("inf") else f"{r['offered']:.1f}"
+    print(f"Áteresztőképesség: {r['throughput']:.1f} req/s (kínált terhelés: {offered} req/s)")
+    if r["dispatch_lag"] > 0.05:
+        print(f"⚠️  Az ütemező lemaradt ({r['dispatch_lag'] * 1000:.0f} ms) – a kínált terhelés pontatlan")
+
+    print(f"\n{'':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    print(f"{'latencia (sorral)':<22} {ms(r['latencies'], 50):>8.0f} {ms(r['latencies'], 95):>8.0f} "
+          f"{ms(r['latencies'], 99):>8.0f}")
+    print(f"{'kiszolgálás':<22} {ms(r['service'], 50):>8.0f} {ms(r['service'], 95):>8.0f} "
+          f"{ms(r['service'], 99):>8.0f}")
+    for name in ("embed", "faq", "retrieve", "generate"):
+        if r["stages"].get(name):
+            print(f"{'  ' + name:<22} {ms(r['stages'][name], 50):>8.0f} {ms(r['stages'][name], 95):>8.0f} "
+                  f"{ms(r['stages'][name], 99):>8.0f}")
+
+    total = sum(r["decisions"].values()) or 1
+    print("\nKapu döntések: " + ", ".join(f"{d}: {n} ({n / total:.0%})" for d, n in r["decisions"].most_common()))
+    if r["cuts"]:
+        print("⏱️  Határidő miatt megkurtítva: " + ", ".join(f"{c}: {n} ({n / total:.0%})"
+                                                          for c, n in r["cuts"].most_common()))
+
+    print("\nCache találati arány:")
+    for name, s in cache_stats({"faq": get_faq_table()}).items():
+        print(f"  {name:<10} {s['hit_rate']:>6.1%}  ({s['hits']} találat / {s['misses']} hiány, méret: {s['size']})")
+
+    batches = get_registry().batch_stats()
+    if batches:
+        print("\nMikro-batch (micro_batch.py):")
+        for name, b in batches.items():
+            print(f"  {name:<40} {b['items']} elem / {b['batches']} hívás, átlag {b['avg']:.1f}, max {b['max']}")
+
+    for name, m in metrics_report().items():
+        print(f"\nGenerátor {name}: {m['calls']} hívás, p50 {m['p50'] * 1000:.0f} ms, "
+              f"p95 {m['p95'] * 1000:.0f} ms, elutasítva: {m['rejected']}, breaker: {m['breaker']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query log visszajátszása stub LLM-mel")
+    ap.add_argument("logs", nargs="*", help="napló fájlok / glob minták (alap: logs/queries*.jsonl)")
+    ap.add_argument("--speed", type=float, default=1.0, help="N× gyorsítás; 0 = amilyen gyorsan lehet")
+    ap.add_argument("--limit", type=int, default=None, help="legfeljebb ennyi kérés")
+    ap.add_argument("--entry", nargs="*", default=None, help="csak ezekről a belépési pontokról (pl. rag_qa_ollama)")
+    ap.add_argument("--max-gap", type=float, default=None, help="két kérés közti szünet felső korlátja (s)")
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    ap.add_argument("--latency", type=float, default=None, help="stub LLM válaszideje (s)")
+    ap.add_argument("--backend-limit", type=int, default=None, help="stub LLM párhuzamossága")
+    ap.add_argument("--deadline", type=float, default=None, help="kérésenkénti határidő (s), 0 = nincs")
+    args = ap.parse_args()
+
+    # a QA modulok importálása előtt: stub generátor, a visszajátszás ne írjon a naplóba
+    os.environ["RAG_GENERATOR"] = "stub"
+    os.environ["RAG_QUERY_LOG"] = "0"
+    if args.latency is not None:
+        os.environ["RAG_STUB_LATENCY"] = str(args.latency)
+    if args.backend_limit is not None:
+        os.environ["RAG_STUB_PARALLEL"] = str(args.backend_limit)
+    if args.deadline is not None:
+        os.environ["RAG_DEADLINE"] = str(args.deadline)
+
+    records = load_requests(args.logs, args.limit, args.entry)
+    if not records:
+        print("❌ Üres query log (RAG_QUERY_LOG=1 mellett gyűlik, lásd rag/query_log.py)")
+        return
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"{len(records)} kérés, eredeti időtartam: {span / 60:.1f} perc, "
+          f"sebesség: {'max' if args.speed <= 0 else f'{args.speed:g}×'}")
+
+    print("🚀 QA útvonal betöltése (embedder, index)...")
+    import rag_qa_ollama
+    rag_qa_ollama.get_collection()
+
+    print_report(replay(records, args.speed, args.workers, args.max_gap))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# rag/sentence_index.py
+"""
+Mondat-szintű al-index a kontextus tömörítéséhez.
+
+Index építéskor minden chunkot mondatokra bontunk és a mondatokat előre
+embeddeljük (chunk_id → mondat-tartomány). Lekérdezéskor a Chroma által
+visszaadott chunkokból csak a kérdéshez leginkább hasonló néhány mondat
+kerül a promptba – egy vektorizált skalárszorzattal, modellhívás nélkül
+(a kérdés embeddingje már megvan). Kevesebb prompt token → rövidebb
+prefill CPU-n.
+
+Felépítés (<index könyvtár>/sentences/):
+    sentences.json   | embed_model, chunk_id → [első sor, utolsó sor + 1, szöveg hash], mondatok
+    embeddings.npy   | normalizált mondat-embeddingek (float16)
+
+    python rag/sentence_index.py build [kollekció]       # az élő kollekcióból
+    python rag/sentence_index.py bench kerdesek.txt [--generate]
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+SENTENCE_DIR = "sentences"
+MAX_SENTENCES = 3          # chunkonként ennyi mondat marad
+MIN_SENTENCE_CHARS = 25    # rövidebb töredéket a következő mondathoz fűzünk
+BUILD_PAGE = 512           # ennyi chunkot olvasunk egyszerre a kollekcióból
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?:])\s+(?=[A-ZÁÉÍÓÖŐÚÜŰ0-9„\"(])|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    out, carry = [], ""
+    for part in _SENTENCE_RE.split(text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        part = f"{carry} {part}".strip() if carry else part
+        if len(part) < MIN_SENTENCE_CHARS:
+            carry = part
+            continue
+        out.append(part)
+        carry = ""
+    if carry:
+        if out:
+            out[-1] = f"{out[-1]} {carry}"
+        else:
+            out.append(carry)
+    return out
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.maximum(norms, 1e-12)
+
+
+class SentenceIndex:
+    def __init__(self, embed_model: str, chunks: Dict[str, list], sentences: List[str], embeddings: np.ndarray):
+        self.embed_model = embed_model
+        self.chunks = chunks
+        self.sentences = sentences
+        self.embeddings = embeddings
+
+    @staticmethod
+    def exists(index_dir) -> bool:
+        return (Path(index_dir) / SENTENCE_DIR / "sentences.json").exists()
+
+    @classmethod
+    def load(cls, index_dir) -> Optional["SentenceIndex"]:
+        path = Path(index_dir) / SENTENCE_DIR
+        if not (path / "sentences.json").exists():
+            return None
+        with (path / "sentences.json").open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["embed_model"], meta["chunks"], meta["sentences"], np.load(path / "embeddings.npy"))
+
+    def save(self, index_dir) -> Path:
+        path = Path(index_dir) / SENTENCE_DIR
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "embeddings.npy", self.embeddings.astype(np.float16))
+        with (path / "sentences.json").open("w", encoding="utf-8") as f:
+            json.dump({"embed_model": self.embed_model, "chunks": self.chunks, "sentences": self.sentences},
+                      f, ensure_ascii=False)
+        return path
+
+    def top_sentences(self, chunk_id: str, q: np.ndarray, n: int = MAX_SENTENCES) -> Optional[str]:
+        """A chunk n legrelevánsabb mondata eredeti sorrendben, vagy None, ha nincs indexelve."""
+        span = self.chunks.get(chunk_id)
+        if span is None:
+            return None
+        start, end = span[0], span[1]
+        if end - start <= n:
+            return " ".join(self.sentences[start:end])
+        sims = self.embeddings[start:end].astype(np.float32) @ q
+        keep = np.sort(np.argpartition(-sims, n - 1)[:n])
+        return " ".join(self.sentences[start + i] for i in keep)
+
+
+def compress(contexts: List[dict], q_emb, index: Optional[SentenceIndex], embed_model: str,
+             n: int = MAX_SENTENCES) -> List[dict]:
+    """
+    A kontextusok szövegét a kérdéshez legközelebbi n mondatra cseréli.
+    Ha nincs index, vagy a kérdés más embedderrel készült, változatlanul adja vissza.
+    """
+    if index is None or q_emb is None or embed_model != index.embed_model:
+        return contexts
+    q = _normalize(np.asarray(q_emb, dtype=np.float32))
+    if q.shape[-1] != index.embeddings.shape[1]:
+        return contexts
+
+    out = []
+    for ctx in contexts:
+        short = index.top_sentences(ctx.get("id", ""), q, n)
+        out.append(dict(ctx, text=short) if short else ctx)
+    return out
+
+
+# ================== ÉPÍTÉS ==================
+
+def build_from_collection(col, index_dir, embed_fn: Callable, embed_model: str) -> SentenceIndex:
+    """
+    Mondat-index a kollekció összes chunkjából. A könyvtárban már meglévő
+    (pl. inkrementális snapshotba átmásolt) indexből a változatlan szövegű
+    chunkok mondatait és embeddingjeit újrahasznosítjuk.
+    """
+    old = SentenceIndex.load(index_dir)
+    if old is not None and old.embed_model != embed_model:
+        old = None
+
+    chunks: Dict[str, list] = {}
+    sentences: List[str] = []
+    parts: List[np.ndarray] = []
+    reused = 0
+
+    total = col.count()
+    for offset in range(0, total, BUILD_PAGE):
+        page = col.get(limit=BUILD_PAGE, offset=offset, include=["documents"])
+        todo = []
+        for cid, doc in zip(page["ids"], page["documents"]):
+            digest = _text_hash(doc)
+            prev = old.chunks.get(cid) if old is not None else None
+            if prev is not None and prev[2] == digest:
+                start = len(sentences)
+                sentences.extend(old.sentences[prev[0]:prev[1]])
+                parts.append(old.embeddings[prev[0]:prev[1]].astype(np.float32))
+                chunks[cid] = [start, len(sentences), digest]
+                reused += 1
+            else:
+                todo.append((cid, digest, split_sentences(doc)))
+
+        flat = [s for _, _, sents in todo for s in sents]
+        if flat:
+            parts.append(_normalize(np.asarray(embed_fn(flat), dtype=np.float32)))
+        for cid, digest, sents in todo:
+            start = len(sentences)
+            sentences.extend(sents)
+            chunks[cid] = [start, len(sentences), digest]
+
+    dim = parts[0].shape[1] if parts else 0
+    embeddings = np.vstack(parts) if parts else np.zeros((0, dim), dtype=np.float32)
+    index = SentenceIndex(embed_model, chunks, sentences, embeddings)
+    index.save(index_dir)
+    print(f"Mondat-index: {len(chunks)} chunk, {len(sentences)} mondat (újrahasznosítva: {reused} chunk)")
+    return index
+
+
+# ================== CLI ==================
+
+def estimate_tokens(text: str) -> int:
+    """Durva becslés a prompt tokenszámára (szó + írásjel darabok)."""
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def bench(questions: List[str], generate: bool = False) -> None:
+    import rag_qa_ollama as qa
+
+    rows = {"teljes": [], "tömörített": []}
+    for question in questions:
+        q_emb = qa.embed_query(question)
+        contexts = qa.retrieve_best_contexts(question, q_emb=q_emb)
+        for label, emb in (("teljes", None), ("tömörített", q_emb)):
+            t0 = time.perf_counter()
+            prompt = qa.build_prompt(question, contexts, q_emb=emb)
+            if generate:
+                qa.generate_with_ollama(prompt)
+            rows[label].append((estimate_tokens(prompt), len(prompt), time.perf_counter() - t0))
+
+    print(f"{'prompt':>12} {'≈token':>8} {'karakter':>9} {'idő (s)':>9}")
+    for label, vals in rows.items():
+        n = max(1, len(vals))
+        print(f"{label:>12} {sum(v[0] for v in vals) / n:>8.0f} {sum(v[1] for v in vals) / n:>9.0f} "
+              f"{sum(v[2] for v in vals) / n:>9.3f}")
+    if not generate:
+        print("(idő generálás nélkül; --generate a teljes végponttól végpontig méréshez)")
+
+
+def main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="Mondat-szintű kontextus tömörítés")
+    ap.add_argument("cmd", choices=["build", "bench"])
+    ap.add_argument("arg", nargs="?", help="build: kollekció, bench: kérdések fájl (soronként egy)")
+    ap.add_argument("--generate", action="store_true", help="bench: LLM hívással együtt mér")
+    args = ap.parse_args(argv)
+
+    from kb_registry import get_registry, DEFAULT_COLLECTION
+
+    if args.cmd == "build":
+        registry = get_registry()
+        name = args.arg or DEFAULT_COLLECTION
+        model = registry.spec(name).embed_model
+        embedder = registry.get_embedder(model)
+        build_from_collection(registry.get_collection(name), registry.index_path(name),
+                              lambda texts: embedder.encode(texts, batch_size=64), model)
+        return 0
+
+    if not args.arg:
+        print("Adj meg egy kérdés fájlt.")
+        return 1
+    with open(args.arg, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    bench(questions, args.generate)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
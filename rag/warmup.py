@@ -0,0 +1,184 @@
+# rag/warmup.py
+"""
+Induláskori bemelegítés és cache feltöltés a valós forgalomból.
+
+Újraindítás után az első kérdések fizetik a lusta modell-betöltést, a
+Chroma / HNSW fájlok első lapbeolvasásait, a tokenizáló / torch első
+futását és az üres cache-eket. A warm_up() ezeket a kiszolgálás előtt
+elvégzi:
+
+    1. modellek: egy próba encode és egy próba generálás
+    2. index:    a kollekciók index fájljainak végigolvasása (page cache),
+                 az mmap-elt / numpy mellékindexek betöltése
+    3. cache:    a query log leggyakoribb kérdései (vagy egy kézi lista)
+                 végigmennek az embed + retrieve lépésen – ez a
+                 Chroma szegmenseket is betölti, és feltölti a cache-eket
+
+Amíg a bemelegítés fut, is_ready() hamis (prefork_server: GET /ready → 503).
+
+Fork után (prefork_server) a Chroma kliens és a kollekciók nem jönnek át a
+workerbe (kb_registry._after_fork), és a cache-ek sem érintik a Chromát.
+Ezért minden worker a kérések fogadása előtt lefuttatja a warm_worker()-t:
+a master kérdéseit közvetlenül a kollekciókon kérdezi le.
+
+    RAG_WARMUP_TOP_N=50            # ennyi kérdés a query logból (0 = csak modell + index)
+    RAG_WARMUP_QUESTIONS=path.txt  # kézi kérdéslista (soronként egy), a log helyett
+    RAG_WARMUP_TOUCH_MB=2048       # kollekciónként legfeljebb ennyi index fájlt olvasunk be
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence
+
+WARMUP_TOP_N = int(os.getenv("RAG_WARMUP_TOP_N", "50"))
+WARMUP_QUESTIONS = os.getenv("RAG_WARMUP_QUESTIONS", "")
+WARMUP_TOUCH_MB = int(os.getenv("RAG_WARMUP_TOUCH_MB", "2048"))
+WARMUP_LOG_RECORDS = 50000     # a log legutóbbi ennyi rekordjából számolunk gyakoriságot
+READ_CHUNK = 1024 * 1024
+
+_ready = threading.Event()
+_primed: List[str] = []    # a master cache feltöltő kérdései; fork után a workerek ismétlik
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    return _ready.wait(timeout)
+
+
+# ================== KÉRDÉSEK ==================
+
+def load_questions(path: str) -> List[str]:
+    """Kézi kérdéslista: soronként egy kérdés, # kezdetű sor megjegyzés."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def top_questions(n: int, paths: Optional[List[str]] = None, recent: int = WARMUP_LOG_RECORDS) -> List[str]:
+    """A query log legutóbbi rekordjaiból a n leggyakoribb kérdés (normalizálva számolva)."""
+    from query_cache import normalize_question
+    from query_log import iter_log
+
+    counts, latest = Counter(), {}
+    # csak az utolsó recent rekord marad memóriában, nem az egész log
+    for rec in deque(iter_log(paths), maxlen=recent):
+        q = (rec.get("question") or "").strip()
+        if q:
+            key = normalize_question(q)
+            counts[key] += 1
+            latest[key] = q
+    return [latest[key] for key, _ in counts.most_common(n)]
+
+
+def warmup_questions(top_n: int = WARMUP_TOP_N) -> List[str]:
+    if top_n <= 0:
+        return []
+    if WARMUP_QUESTIONS:
+        return load_questions(WARMUP_QUESTIONS)[:top_n]
+    return top_questions(top_n)
+
+
+# ================== INDEX ==================
+
+def touch_files(root: str, limit_mb: int = WARMUP_TOUCH_MB) -> int:
+    """Az index könyvtár fájljainak végigolvasása (OS page cache); visszaadja a beolvasott bájtokat."""
+    budget = limit_mb * 1024 * 1024
+    done = 0
+    for path in sorted(Path(root).rglob("*")):
+        if done >= budget:
+            break
+        if not path.is_file():
+            continue
+        try:
+            with path.open("rb", buffering=0) as f:
+                while done < budget:
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    done += len(chunk)
+        except OSError:
+            continue
+    return done
+
+
+def touch_index(registry, name: str) -> int:
+    """Kollekció megnyitása, index fájlok beolvasása, mellékindexek betöltése."""
+    registry.get_collection(name)
+    n_bytes = touch_files(registry.index_path(name))
+    registry.get_corpus(name)
+    for loader in (registry.get_binary_index, registry.get_sentence_index, registry.get_projection):
+        try:
+            loader(name)
+        except FileNotFoundError:
+            pass
+    return n_bytes
+
+
+# ================== BEMELEGÍTÉS ==================
+
+def warm_up(registry, collections: Sequence[str], embed: Callable[[str], object],
+            retrieve: Callable[[str, object], object], generate: Optional[Callable[[], object]] = None,
+            questions: Optional[Iterable[str]] = None, top_n: int = WARMUP_TOP_N) -> dict:
+    """
+    embed(kérdés) → vektor, retrieve(kérdés, vektor) → találatok,
+    generate() → egy rövid próba generálás. questions None esetén a
+    warmup_questions(top_n) adja a cache feltöltés kérdéseit.
+    Visszaad: lépésenkénti idők (s), beolvasott MB, feltöltött kérdések száma.
+    """
+    _ready.clear()
+    report = {}
+    t0 = time.perf_counter()
+
+    t = time.perf_counter()
+    embed("bemelegítés")
+    if generate is not None:
+        generate()
+    report["models"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    n_bytes = sum(touch_index(registry, name) for name in collections)
+    report["index"] = time.perf_counter() - t
+    report["index_mb"] = n_bytes / (1024 * 1024)
+
+    t = time.perf_counter()
+    try:
+        questions = list(questions) if questions is not None else warmup_questions(top_n)
+    except OSError as e:
+        print(f"⚠️  Bemelegítő kérdések nem olvashatók: {e}")
+        questions = []
+    for q in questions:
+        retrieve(q, embed(q))
+    _primed[:] = questions
+    report["prime"] = time.perf_counter() - t
+    report["questions"] = len(questions)
+
+    report["total"] = time.perf_counter() - t0
+    _ready.set()
+    return report
+
+
+def warm_worker(registry, collections: Sequence[str], embed: Callable[[str], object], top_k: int = 5) -> dict:
+    """
+    Fork utáni bemelegítés a workerben, mielőtt fogadná a kéréseket: a
+    kollekciók újranyitása és a master által használt kérdések lekérdezése
+    közvetlenül a kollekciókon (a retrieval cache-t megkerülve), így a
+    worker saját Chroma kapcsolata is betölti a HNSW szegmenst és az sqlite
+    lapokat. A modellek és a page cache a mastertől örökölt.
+    """
+    t = time.perf_counter()
+    questions = _primed or ["bemelegítés"]
+    for name in collections:
+        registry.get_collection(name)
+        for q in questions:
+            registry.query_collection(name, embed(q), top_k)
+    return {"worker": time.perf_counter() - t, "questions": len(questions)}
+
+
+def format_report(report: dict) -> str:
+    return (f"✓ Bemelegítés kész: {report['total']:.1f} s (modellek {report['models']:.1f} s, "
+            f"index {report['index']:.1f} s / {report['index_mb']:.0f} MB, "
+            f"cache {report['prime']:.1f} s / {report['questions']} kérdés)")
@@ -0,0 +1,178 @@
+"""
+Éjszakai GYIK-építő: cikkenként néhány valószínű ügyfélkérdés (doc2query)
+és hozzájuk a cikkből generált, forrásolt válasz.
+
+Inkrementális: csak azoknál a cikkeknél generál újra, amelyek tartalma
+(content hash) megváltozott; a többinél a meglévő kérdés / válasz /
+embedding / jóváhagyás marad. A generálás korlátozott párhuzamossággal fut.
+
+    python scripts/build_faq.py                 # építés / frissítés
+    python scripts/build_faq.py unreviewed      # jóváhagyásra váró válaszok
+    python scripts/build_faq.py approve <id>... # válasz jóváhagyása
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR / "rag"))
+from faq_table import FAQ_DIR, load_entries, load_table, save_table
+from rag_qa_ollama import EMBED_MODEL_NAME, build_prompt, get_llm, registry
+
+KB_CLEAN_PATH = BASE_DIR / "data" / "kb_clean.jsonl"
+
+QUESTIONS_PER_ARTICLE = 3
+FAQ_WORKERS = 2              # párhuzamos LLM hívások (ne fojtsuk meg az Ollamát)
+MAX_ARTICLE_CHARS = 2400     # ennyit adunk a kérdésgeneráló promptnak
+
+_LIST_PREFIX = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def content_hash(article: dict) -> str:
+    raw = (article.get("title") or "") + "\n" + (article.get("body") or "")
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def iter_articles(path: Path):
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ================== GENERÁLÁS ==================
+
+def generate_questions(llm, article: dict) -> list:
+    prompt = f"""Az alábbi Rackhost tudásbázis cikk alapján írj {QUESTIONS_PER_ARTICLE} rövid,
+valószínű ügyfélkérdést, amire a cikk választ ad. Magyarul, soronként egy kérdés,
+számozás és magyarázat nélkül.
+
+CÍM: {article.get("title", "")}
+
+SZÖVEG:
+{(article.get("body") or "")[:MAX_ARTICLE_CHARS]}
+
+KÉRDÉSEK:"""
+
+    out = llm.generate(prompt, max_tokens=150) or ""
+    questions = []
+    for line in out.splitlines():
+        q = _LIST_PREFIX.sub("", line).strip()
+        if len(q) >= 10 and q not in questions:
+            questions.append(q)
+    return questions[:QUESTIONS_PER_ARTICLE]
+
+
+def build_article_entries(llm, article: dict, digest: str) -> list:
+    ctx = {
+        "text": article.get("body") or "",
+        "title": article.get("title") or "",
+        "url": article.get("url") or "",
+    }
+    entries = []
+    for i, question in enumerate(generate_questions(llm, article)):
+        answer = llm.generate(build_prompt(question, [ctx]), max_tokens=200)
+        if not answer or len(answer) < 30:
+            continue
+        entries.append({
+            "id": f"{article['id']}-faq-{i}",
+            "doc_id": article["id"],
+            "content_hash": digest,
+            "question": question,
+            "answer": answer,
+            "title": ctx["title"],
+            "url": ctx["url"],
+            "reviewed": False,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+    return entries
+
+
+# ================== ÉPÍTÉS ==================
+
+def build(kb_path: Path, workers: int = FAQ_WORKERS) -> None:
+    old_entries, old_emb = load_table(FAQ_DIR)
+    old_by_doc = {}
+    for i, e in enumerate(old_entries):
+        old_by_doc.setdefault(e["doc_id"], []).append(i)
+
+    kept_rows, todo = [], []
+    n_articles = 0
+    for article in iter_articles(kb_path):
+        if not article.get("id") or not (article.get("body") or "").strip():
+            continue
+        n_articles += 1
+        digest = content_hash(article)
+        rows = old_by_doc.get(article["id"], [])
+        if rows and all(old_entries[r]["content_hash"] == digest for r in rows):
+            kept_rows.extend(rows)            # változatlan cikk → marad
+        else:
+            todo.append((article, digest))
+
+    print(f"Cikkek: {n_articles}, változatlan: {n_articles - len(todo)}, újragenerálandó: {len(todo)}")
+
+    llm = get_llm()
+    t0 = time.perf_counter()
+    new_entries = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, entries in enumerate(pool.map(lambda a: build_article_entries(llm, *a), todo), 1):
+            new_entries.extend(entries)
+            if i % 10 == 0:
+                print(f"  {i}/{len(todo)} cikk kész ({time.perf_counter() - t0:.0f} s)")
+
+    entries = [old_entries[r] for r in kept_rows] + new_entries
+    parts = []
+    if kept_rows:
+        parts.append(old_emb[kept_rows])
+    if new_entries:
+        embedder = registry.get_embedder(EMBED_MODEL_NAME)
+        parts.append(embedder.encode([e["question"] for e in new_entries], batch_size=64))
+    embeddings = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    save_table(entries, embeddings, FAQ_DIR)
+    n_reviewed = sum(1 for e in entries if e.get("reviewed"))
+    print(f"GYIK tábla: {len(entries)} kérdés ({len(new_entries)} új, {n_reviewed} jóváhagyott), "
+          f"generálás: {time.perf_counter() - t0:.0f} s → {FAQ_DIR}")
+
+
+def set_reviewed(ids: list) -> None:
+    entries, embeddings = load_table(FAQ_DIR)
+    if not entries:
+        print("Nincs GYIK tábla.")
+        return
+    wanted = set(ids)
+    for e in entries:
+        if e["id"] in wanted:
+            e["reviewed"] = True
+    save_table(entries, embeddings, FAQ_DIR)
+    print(f"Jóváhagyva: {len(wanted & {e['id'] for e in entries})} db")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Előre generált GYIK válaszok építése")
+    ap.add_argument("cmd", nargs="?", default="build", choices=["build", "unreviewed", "approve"])
+    ap.add_argument("ids", nargs="*")
+    ap.add_argument("--input", type=Path, default=KB_CLEAN_PATH)
+    ap.add_argument("--workers", type=int, default=FAQ_WORKERS)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        build(args.input, args.workers)
+    elif args.cmd == "unreviewed":
+        for e in load_entries(FAQ_DIR):
+            if not e.get("reviewed"):
+                print(f"[{e['id']}] {e['question']}\n    {e['answer'][:200]}\n")
+    elif args.cmd == "approve":
+        set_reviewed(args.ids)
+
+
+if __name__ == "__main__":
+    main()
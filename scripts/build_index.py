@@ -1,82 +1,259 @@
 from pathlib import Path
-import json
 import hashlib
+import os
+import shutil
+import sys
+import time
+from typing import Callable, Iterable, List, Optional
 
 import chromadb
 from chromadb.utils import embedding_functions
 
 BASE_DIR = Path(__file__).resolve().parent.parent        # .../rackhostllm
-DB_DIR   = BASE_DIR / "chroma_kb"                        # lokális Chroma DB
+sys.path.insert(0, str(BASE_DIR / "rag"))
+from kb_registry import load_specs, DEFAULT_COLLECTION
+from confidence_gate import GATE_FILE
+from corpus_store import iter_records
+from binary_index import build_from_collection
+from projection import PROJECTION_FILE, Projection, fit as fit_projection
+import sentence_index
+import index_snapshots
 
 KB_PATH  = BASE_DIR / "data" / "kb_chunks.jsonl"         # RAG input
 
+# Dimenziócsökkentés (PCA / Matryoshka levágás), pl. 128; None = eredeti dimenzió
+PROJECT_DIM = int(os.getenv("RAG_PROJECT_DIM", "0")) or None
+
+# Batchenként embeddelünk és írunk, így a memória a bemenet méretétől független
+INDEX_BATCH = 256
+PROJECTION_FIT_ROWS = 5000   # a vetítést az első ennyi chunkon illesztjük
+
 
 def make_doc_id(obj, idx: int) -> str:
   """
   Stabil, de laza ID generálás:
-  - ha van obj["id"], azt használja
+  - ha van obj["chunk_id"] (chunk_kb.py kimenete) vagy obj["id"], azt használja
   - ha nincs, url+idx-ből hash
   """
-  raw = obj.get("id")
+  raw = obj.get("chunk_id") or obj.get("id")
   if not raw:
     base = (obj.get("url") or "kb") + f"#{idx}"
     raw = "kb-" + hashlib.md5(base.encode("utf-8")).hexdigest()[:16]
   return str(raw)
 
 
-def build_index():
-  print(f"Loading from: {KB_PATH}")
+def iter_batches(records: Iterable[dict], batch_size: int = INDEX_BATCH):
+  """
+  (ids, texts, metadatas, embeddings) batchek; az üres chunkokat kihagyja.
+  embeddings None, ha nem minden rekord hozott előre számolt "embedding"-et
+  (a pipeline embed lépése ezt kitölti).
+  """
+  ids, texts, metadatas, given = [], [], [], []
+  for i, obj in enumerate(records):
+    body = obj.get("body") or obj.get("text") or ""
+    if not body.strip():
+      continue  # üres chunk nem kell
 
-  client = chromadb.PersistentClient(path=str(DB_DIR))
+    ids.append(make_doc_id(obj, i))
+    texts.append(body)
+    metadatas.append({
+      "url": obj.get("url", ""),
+      "title": obj.get("title", ""),
+      "category": obj.get("category", ""),
+      "source": obj.get("source", ""),
+    })
+    given.append(obj.get("embedding"))
+    if len(ids) >= batch_size:
+      yield ids, texts, metadatas, (given if all(e is not None for e in given) else None)
+      ids, texts, metadatas, given = [], [], [], []
+  if ids:
+    yield ids, texts, metadatas, (given if all(e is not None for e in given) else None)
 
-  collection = client.get_or_create_collection(
-    name="rackhost_kb"  # fontos: ezt használja a rag_cli is
-  )
 
-  texts = []
-  metadatas = []
-  ids = []
-
-  with KB_PATH.open("r", encoding="utf-8") as f:
-    for i, line in enumerate(f):
-      line = line.strip()
-      if not line:
-        continue
-      obj = json.loads(line)
-
-      doc_id = make_doc_id(obj, i)
-      body   = obj.get("body") or obj.get("text") or ""
-      if not body.strip():
-        continue  # üres chunk nem kell
-
-      ids.append(doc_id)
-      texts.append(body)
-      metadatas.append({
-        "url": obj.get("url", ""),
-        "title": obj.get("title", ""),
-        "category": obj.get("category", ""),
-      })
-
-  if not texts:
-    print("Nincs indexelhető chunk (texts üres).")
-    return
+def _start_snapshot(spec, incremental: bool, snap_dir: Optional[Path] = None) -> Path:
+  """
+  Új snapshot könyvtár. Inkrementális módban az élő index másolatából
+  indulunk, és abba upsertelünk – az élő indexet ez sem érinti.
+  Megadott, már létező (félbemaradt) snapshot könyvtárban folytatjuk.
+  """
+  if snap_dir is not None and (snap_dir / "chroma.sqlite3").exists():
+    print(f"Folytatás a félbemaradt snapshotban: {snap_dir}")
+    return snap_dir
+  snap_dir = snap_dir or index_snapshots.new_snapshot_dir(spec.path)
+  live = index_snapshots.resolve_index_path(spec.path)
+  if incremental and (live / "chroma.sqlite3").exists():
+    shutil.copytree(live, snap_dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns(
+      index_snapshots.SNAPSHOT_DIR, index_snapshots.POINTER_NAME, index_snapshots.HISTORY_NAME))
+    print(f"Inkrementális snapshot (alap: {live.name}): {snap_dir}")
+  else:
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Snapshot: {snap_dir}")
+  return snap_dir
+
+
+def _same_projection(a: Path, b: Path) -> bool:
+  """Ugyanaz a vetítés (vagy egyik sem vetített) → a távolságok skálája is ugyanaz."""
+  pa, pb = a / PROJECTION_FILE, b / PROJECTION_FILE
+  if not pa.exists() or not pb.exists():
+    return not pa.exists() and not pb.exists()
+  return pa.read_bytes() == pb.read_bytes()
+
+
+def index_records(records: Iterable[dict], name: str = DEFAULT_COLLECTION, dim: Optional[int] = PROJECT_DIM,
+                  incremental: bool = False, snap_dir: Optional[Path] = None,
+                  on_batch: Optional[Callable[[List[str]], None]] = None,
+                  stale: Optional[Callable[[object], List[str]]] = None) -> bool:
+  """
+  Chunk rekordok (kb_chunks.jsonl formátum) embeddelése és upsertje egy új
+  snapshotba, validálás után élesítés. A rekordok streamelve is érkezhetnek
+  (pl. scripts/ingest_tickets.py, scripts/pipeline.py), batchenként
+  dolgozzuk fel őket. snap_dir: adott (pl. félbemaradt) snapshot könyvtár,
+  on_batch: minden upsert után a beírt chunk ID-kkal hívódik (checkpoint),
+  stale: az utolsó upsert után a snapshot kollekciójával hívódik, és a
+  törlendő (elavult) chunk ID-kat adja vissza – inkrementális módban a
+  rövidült vagy megszűnt cikkek maradék chunkjai.
+  """
+  # a kollekció helye, neve és embeddere a regiszter konfigjából jön
+  specs = {s.name: s for s in load_specs()}
+  if name not in specs:
+    print(f"Ismeretlen kollekció: {name} (ismert: {', '.join(specs)})")
+    return False
+  spec = specs[name]
 
   embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+    model_name=spec.embed_model
   )
 
-  print(f"Embedding documents: {len(texts)} db")
-  embeddings = embedding_fn(texts)
+  # Mindig új snapshot könyvtárba építünk, az élő indexet a build nem érinti.
+  # Az embedder-identitás a kollekcióval együtt tárolódik, a regiszter
+  # lekérdezéskor ez alapján utasítja el az eltérő vektorokat.
+  snap_dir = _start_snapshot(spec, incremental, snap_dir)
+  client = chromadb.PersistentClient(path=str(snap_dir))
+
+  collection, projection, start_count = None, None, 0
+  if (snap_dir / "chroma.sqlite3").exists():
+    collection = client.get_collection(spec.collection)
+    start_count = collection.count()
+    projection = Projection.load(snap_dir)   # a meglévő vetítést használjuk tovább
+    if dim and projection is None:
+      print(f"⚠️  A meglévő index vetítés nélkül épült, inkrementálisan nem vetítünk ({dim} dim figyelmen kívül).")
+    dim = None
+
+  def flush(ids, texts, metadatas, embeddings):
+    nonlocal collection
+    source_dim = len(embeddings[0])
+    if projection is not None:
+      embeddings = projection.apply(embeddings).tolist()
+
+    if collection is None:
+      metadata = {
+        "embed_model": spec.embed_model,
+        "embed_dim": len(embeddings[0]),
+        "tenant": spec.tenant,
+      }
+      if projection is not None:
+        # a kérdés vektora source_dim dimenziós, a regiszter vetíti embed_dim-re
+        metadata.update({"source_dim": source_dim, "projection": projection.method})
+      collection = client.get_or_create_collection(
+        name=spec.collection,  # fontos: ezt használja a rag_cli is
+        metadata=metadata,
+      )
+
+    collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    if on_batch is not None:
+      on_batch(ids)
+
+  def fit_and_flush(pending):
+    nonlocal projection
+    projection = fit_projection([e for b in pending for e in b[3]], dim, spec.embed_model)
+    print(f"Vetítés ({projection.method}): {projection.source_dim} → {projection.dim} dim")
+    for batch in pending:
+      flush(*batch)
+
+  t0 = time.perf_counter()
+  n_chunks = 0
+  new_ids = set()
+  pending = []   # a vetítés illesztéséig visszatartott batchek
+  for ids, texts, metadatas, given in iter_batches(records):
+    embeddings = [list(map(float, e)) for e in (given or embedding_fn(texts))]
+    n_chunks += len(ids)
+
+    known = set(collection.get(ids=ids, include=[])["ids"]) if start_count else set()
+    new_ids.update(i for i in ids if i not in known)
+
+    if dim and projection is None:
+      pending.append((ids, texts, metadatas, embeddings))
+      if sum(len(b[0]) for b in pending) >= PROJECTION_FIT_ROWS:
+        fit_and_flush(pending)
+        pending = []
+    else:
+      flush(ids, texts, metadatas, embeddings)
+
+    if n_chunks % (INDEX_BATCH * 20) < len(ids):
+      print(f"  {n_chunks} chunk ({n_chunks / (time.perf_counter() - t0):.0f} chunk/s)")
+
+  if pending:
+    fit_and_flush(pending)
+
+  if collection is None:
+    print("Nincs indexelhető chunk (texts üres).")
+    shutil.rmtree(snap_dir, ignore_errors=True)
+    return False
+
+  if projection is not None:
+    projection.save(snap_dir)
+
+  deleted = [] if stale is None else list(stale(collection))
+  for i in range(0, len(deleted), INDEX_BATCH):
+    collection.delete(ids=deleted[i:i + INDEX_BATCH])
+
+  print(f"Index építve. Feldolgozott chunk: {n_chunks}, új: {len(new_ids)}, elavult törölve: {len(deleted)}, "
+        f"összes elem: {collection.count()} ({time.perf_counter() - t0:.0f} s)")
+
+  # validálás, és csak utána állítjuk át a CURRENT mutatót
+  report = index_snapshots.validate_snapshot(snap_dir, spec.collection,
+                                             expected_count=start_count + len(new_ids) - len(deleted))
+  if not report["ok"]:
+    print(f"❌ Validálás sikertelen, a snapshot NEM élesedett: {report.get('error')}")
+    print(f"   (élő index változatlan: {index_snapshots.current_version(spec.path) or spec.path})")
+    return False
+
+  # bites első körös index (RAG_SEARCH_MODE=binary) ugyanabba a snapshotba
+  build_from_collection(collection, snap_dir)
+  # mondat-index a kontextus tömörítéshez (változatlan chunkoknál újrahasznosítva)
+  sentence_index.build_from_collection(collection, snap_dir, embedding_fn, spec.embed_model)
+
+  # a tanult magabiztossági küszöbök az indexszel együtt vándorolnak (újratanításig),
+  # de csak azonos távolság-skálán: új / eltérő vetítésnél a régi küszöbök nem érvényesek
+  live = index_snapshots.resolve_index_path(spec.path)
+  prev_gate = live / GATE_FILE
+  if prev_gate.exists():
+    if _same_projection(live, snap_dir):
+      shutil.copy2(prev_gate, snap_dir / GATE_FILE)
+    else:
+      (snap_dir / GATE_FILE).unlink(missing_ok=True)
+      print("⚠️  A vetítés változott, a kapu küszöbei nem kerültek át – "
+            "tanítsd újra: python rag/confidence_gate.py fit labels.jsonl")
+
+  index_snapshots.publish(snap_dir.name, spec.path)
+  removed = index_snapshots.prune(spec.path)
+  print(f"✓ Élesítve: {snap_dir.name} (elemszám: {report['count']}, minta recall: {report['recall']:.2f})")
+  if removed:
+    print(f"  Régi snapshotok törölve: {', '.join(removed)}")
+  return True
 
-  collection.add(
-    ids=ids,
-    documents=texts,
-    metadatas=metadatas,
-    embeddings=embeddings,
-  )
 
-  print(f"Index építve. Összes elem: {len(ids)}")
+def build_index(name: str = DEFAULT_COLLECTION, kb_path: Path = KB_PATH, dim: Optional[int] = PROJECT_DIM,
+                incremental: bool = False) -> bool:
+  print(f"Loading from: {kb_path}")
+  # JSONL vagy bináris korpusz (.rkc) – lásd rag/corpus_store.py
+  return index_records(iter_records(kb_path), name, dim, incremental)
 
 
 if __name__ == "__main__":
-  build_index()
+  # python scripts/build_index.py [kollekció] [chunks.jsonl | korpusz.rkc] [dim] [--incremental]
+  args = [a for a in sys.argv[1:] if a != "--incremental"]
+  name = args[0] if len(args) > 0 else DEFAULT_COLLECTION
+  path = Path(args[1]) if len(args) > 1 else KB_PATH
+  dim = int(args[2]) if len(args) > 2 else PROJECT_DIM
+  build_index(name, path, dim, incremental="--incremental" in sys.argv)
@@ -1,12 +1,34 @@
-import json
+import argparse
 import hashlib
+import json
+import random
+import re
+import time
+from collections import Counter
 from pathlib import Path
 
 IN_PATH = Path("kb_export.jsonl")
 OUT_PATH = Path("kb_clean.jsonl")
+BOILERPLATE_PATH = Path("boilerplate_lines.json")   # a pipeline is ezt használja újra
 
 SOURCE_NAME = "rackhost.hu/tudasbazis"
 
+# Boilerplate: az a sor, ami a cikkek legalább ekkora hányadában szerepel
+# (« Vissza, Tartalomjegyzék, Toggle, menü / breadcrumb elemek)
+BOILERPLATE_MIN_SHARE = 0.10
+BOILERPLATE_MIN_DOCS = 5
+BOILERPLATE_MIN_LEN = 3      # "A", "és", "." – inline tag miatt tört sorok, nem boilerplate
+
+# Near-duplicate: MinHash + LSH szó-shingle-ökön
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+# b sáv × r sor: a jelölt küszöb ≈ (1/b)^(1/r); 16 × 8 → ~0.71, így a 0.85 fölötti
+# párokat ~99%-ban jelöltnek látjuk, a lényegesen eltérőket viszont nem
+LSH_BANDS = 16
+NEAR_DUP_THRESHOLD = 0.85
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
 
 def extract_category(url: str, fallback: str = "") -> str:
     """
@@ -33,43 +55,233 @@ def make_id(url: str) -> str:
     return f"kb-{h[:12]}"
 
 
-def main():
-    if not IN_PATH.exists():
-        raise FileNotFoundError(f"Input file not found: {IN_PATH}")
+def iter_raw(path: Path):
+    """Soronként olvas, nem tartja memóriában az exportot."""
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
 
-    out_f = OUT_PATH.open("w", encoding="utf-8")
 
-    with IN_PATH.open("r", encoding="utf-8") as f:
-        for line in f:
+# ================== BOILERPLATE ==================
+
+def _line_key(line: str) -> int:
+    # 8 bájtos hash a teljes sor helyett → a számláló memóriája korlátos
+    return int.from_bytes(hashlib.blake2b(line.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def detect_boilerplate(path: Path) -> set:
+    """
+    1. menet: minden sort cikkenként egyszer számolunk; ami a cikkek
+    BOILERPLATE_MIN_SHARE hányadában előfordul, az boilerplate.
+    """
+    counts = Counter()
+    samples = {}
+    n_docs = 0
+
+    for raw in iter_raw(path):
+        n_docs += 1
+        seen = set()
+        for line in (raw.get("text") or "").splitlines():
             line = line.strip()
-            if not line:
+            if len(line) < BOILERPLATE_MIN_LEN:
+                continue
+            key = _line_key(line)
+            if key in seen:
                 continue
+            seen.add(key)
+            counts[key] += 1
+            if key not in samples and counts[key] >= BOILERPLATE_MIN_DOCS:
+                samples[key] = line
+
+    min_docs = max(BOILERPLATE_MIN_DOCS, int(n_docs * BOILERPLATE_MIN_SHARE))
+    return {samples[k] for k, c in counts.items() if c >= min_docs and k in samples}
+
+
+def load_boilerplate(path: Path = BOILERPLATE_PATH) -> set:
+    """A legutóbbi teljes tisztításkor detektált boilerplate sorok (streaming futáshoz)."""
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as f:
+        return set(json.load(f))
+
+
+def strip_boilerplate(text: str, boilerplate: set) -> str:
+    lines = [ln.strip() for ln in text.splitlines()]
+    return "\n".join(ln for ln in lines if ln and ln not in boilerplate)
+
+
+# ================== MINHASH / LSH ==================
+
+# Univerzális hash család h → (a·h + b) mod p permutációnként; az XOR maszk
+# nem min-wise független, torzítaná a Jaccard becslést
+_PRIME = (1 << 61) - 1
+_rng = random.Random(42)
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def minhash(text: str) -> tuple:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+    hashes = [_line_key(s) % _PRIME for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _HASH_PARAMS)
+
 
-            raw = json.loads(line)
+def estimate_jaccard(a: tuple, b: tuple) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
 
-            url = (raw.get("url") or "").strip()
-            title = (raw.get("title") or "").strip()
-            html = raw.get("html") or ""
-            body = (raw.get("text") or "").strip()
-            raw_cat = raw.get("category") or ""
 
-            category = extract_category(url, raw_cat)
+class NearDuplicateIndex:
+    """Streaming LSH: minden új cikket csak a vele egy sávba eső korábbiakkal vet össze."""
 
-            doc = {
-                "id": make_id(url),
-                "source": SOURCE_NAME,
-                "url": url,
-                "title": title,
-                "category": category,
-                "body": body,
-                "html": html,
-            }
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, bands: int = LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.buckets = [dict() for _ in range(bands)]
+        self.signatures = {}
 
+    def add(self, doc_id: str, sig: tuple):
+        """Ha van közeli duplikátum, annak ID-ját adja vissza (és nem veszi fel)."""
+        candidates = set()
+        for b in range(self.bands):
+            band = sig[b * self.rows:(b + 1) * self.rows]
+            candidates.update(self.buckets[b].get(band, ()))
+
+        for other in candidates:
+            if estimate_jaccard(sig, self.signatures[other]) >= self.threshold:
+                return other
+
+        self.insert(doc_id, sig)
+        return None
+
+    def insert(self, doc_id: str, sig: tuple) -> None:
+        """Felvétel összevetés nélkül (már publikált, megtartott cikk)."""
+        self.signatures[doc_id] = sig
+        for b in range(self.bands):
+            band = sig[b * self.rows:(b + 1) * self.rows]
+            self.buckets[b].setdefault(band, []).append(doc_id)
+
+
+# ================== TISZTÍTÁS ==================
+
+class Cleaner:
+    """
+    Cikkenkénti tisztítás: boilerplate levágás, pontos és near-duplicate
+    szűrés. Állapotot tart (látott cikkek), ezért egy szálon fut; a
+    scripts/pipeline.py is ezt használja streamelve.
+    """
+
+    def __init__(self, boilerplate: set, dedup: bool = True, keep_html: bool = True):
+        self.boilerplate = boilerplate
+        self.dedup = NearDuplicateIndex() if dedup else None
+        self.keep_html = keep_html
+        self.seen_exact = set()
+        self.n_in = self.n_out = self.n_exact = self.n_near = 0
+        self.chars_in = self.chars_out = 0
+
+    def clean(self, raw: dict):
+        """Nyers cikk → tisztított dokumentum, vagy None (üres / duplikátum)."""
+        self.n_in += 1
+
+        url = (raw.get("url") or "").strip()
+        title = (raw.get("title") or "").strip()
+        raw_body = (raw.get("text") or "").strip()
+        raw_cat = raw.get("category") or ""
+
+        body = strip_boilerplate(raw_body, self.boilerplate)
+        self.chars_in += len(raw_body)
+        if not body:
+            return None
+
+        doc_id = make_id(url)
+
+        digest = hashlib.sha1(body.encode("utf-8")).digest()
+        if digest in self.seen_exact:
+            self.n_exact += 1
+            return None
+        self.seen_exact.add(digest)
+
+        if self.dedup is not None:
+            dup_of = self.dedup.add(doc_id, minhash(body))
+            if dup_of:
+                self.n_near += 1
+                print(f"  near-duplicate: {url} ≈ {dup_of}")
+                return None
+
+        doc = {
+            "id": doc_id,
+            "source": SOURCE_NAME,
+            "url": url,
+            "title": title,
+            "category": extract_category(url, raw_cat),
+            "body": body,
+        }
+        if self.keep_html:
+            doc["html"] = raw.get("html") or ""
+
+        self.n_out += 1
+        self.chars_out += len(body)
+        return doc
+
+    def remember(self, raw: dict) -> None:
+        """
+        Változatlan, már publikált cikk (pipeline.py inkrementális futás):
+        nem tisztítjuk újra, de a duplikátum-szűrők ismerjék, különben egy
+        új, közel azonos másolata átcsúszna mellette.
+        """
+        body = strip_boilerplate((raw.get("text") or "").strip(), self.boilerplate)
+        if not body:
+            return
+        self.seen_exact.add(hashlib.sha1(body.encode("utf-8")).digest())
+        if self.dedup is not None:
+            self.dedup.insert(make_id((raw.get("url") or "").strip()), minhash(body))
+
+    def report(self) -> str:
+        line = (f"Cikkek: {self.n_in} → {self.n_out} "
+                f"(pontos duplikátum: {self.n_exact}, near-duplicate: {self.n_near})")
+        if self.chars_in:
+            line += (f"\nSzöveg: {self.chars_in} → {self.chars_out} karakter "
+                     f"({100 * self.chars_out / self.chars_in:.1f}%)")
+        return line
+
+
+# ================== FŐ FÜGGVÉNY ==================
+
+def main():
+    ap = argparse.ArgumentParser(description="KB export tisztítása, boilerplate és duplikátum szűréssel")
+    ap.add_argument("--input", type=Path, default=IN_PATH)
+    ap.add_argument("--output", type=Path, default=OUT_PATH)
+    ap.add_argument("--drop-html", action="store_true", help="a nyers HTML-t nem írja ki")
+    ap.add_argument("--no-dedup", action="store_true", help="near-duplicate szűrés kikapcsolása")
+    args = ap.parse_args()
+
+    if not args.input.exists():
+        raise FileNotFoundError(f"Input file not found: {args.input}")
+
+    t0 = time.perf_counter()
+    boilerplate = detect_boilerplate(args.input)
+    with BOILERPLATE_PATH.open("w", encoding="utf-8") as f:
+        json.dump(sorted(boilerplate), f, ensure_ascii=False, indent=2)
+    print(f"Boilerplate sorok: {len(boilerplate)} (→ {BOILERPLATE_PATH})")
+
+    cleaner = Cleaner(boilerplate, dedup=not args.no_dedup, keep_html=not args.drop_html)
+    with args.output.open("w", encoding="utf-8") as out_f:
+        for raw in iter_raw(args.input):
+            doc = cleaner.clean(raw)
+            if doc is None:
+                continue
             out_f.write(json.dumps(doc, ensure_ascii=False))
             out_f.write("\n")
 
-    out_f.close()
-    print(f"OK – írtam: {OUT_PATH}")
+    dt = time.perf_counter() - t0
+    print(cleaner.report())
+    print(f"OK – írtam: {args.output} ({dt:.1f} s)")
 
 
 if __name__ == "__main__":
@@ -50,6 +50,31 @@ def chunk_text(text, max_chars=MAX_CHARS, overlap=OVERLAP_CHARS):
   return chunks
 
 
+def chunk_article(article):
+  """
+  Egy tisztított cikk (build_kb_clean kimenet) → chunk rekordok.
+  Vissza: list[dict] (üres, ha nincs id vagy szöveg)
+  """
+  doc_id = article.get("id") or ""
+  body = article.get("body") or ""
+  if not doc_id or not body.strip():
+    return []
+
+  return [
+    {
+      "doc_id": doc_id,
+      "chunk_local_index": i,
+      "chunk_id": f"{doc_id}-chunk-{i}",
+      "source": article.get("source") or "rackhost.hu/tudasbazis",
+      "url": article.get("url") or "",
+      "title": article.get("title") or "",
+      "category": article.get("category") or "",
+      "text": chunk,
+    }
+    for i, chunk in enumerate(chunk_text(body))
+  ]
+
+
 def main():
   if not os.path.exists(INPUT_PATH):
     print(f"HIBA: Nem találom az input fájlt: {INPUT_PATH}")
@@ -72,32 +97,12 @@ def main():
         print(f"JSON hiba, sor kihagyva: {e}")
         continue
 
-      doc_id = article.get("id") or ""
-      body = article.get("body") or ""
-      url = article.get("url") or ""
-      title = article.get("title") or ""
-      category = article.get("category") or ""
-
-      if not doc_id or not body.strip():
-        continue
-
-      total_articles += 1
-
-      chunks = chunk_text(body)
+      chunks = chunk_article(article)
       if not chunks:
         continue
 
-      for i, chunk in enumerate(chunks):
-        chunk_obj = {
-          "doc_id": doc_id,
-          "chunk_local_index": i,
-          "chunk_id": f"{doc_id}-chunk-{i}",
-          "source": article.get("source") or "rackhost.hu/tudasbazis",
-          "url": url,
-          "title": title,
-          "category": category,
-          "text": chunk,
-        }
+      total_articles += 1
+      for chunk_obj in chunks:
         fout.write(json.dumps(chunk_obj, ensure_ascii=False) + "\n")
         total_chunks += 1
 
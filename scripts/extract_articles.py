@@ -0,0 +1,284 @@
+"""
+Gyors, párhuzamos HTML extrakció a letöltött cikkekre (lxml, process pool).
+
+A scraper.parse_html (BeautifulSoup, html.parser) tiszta Pythonban épít
+teljes fát oldalanként – párhuzamos letöltésnél ez lesz a szűk keresztmetszet.
+Itt a C-alapú lxml parser és előre fordított XPath selektorok futnak egy
+process poolban, a kimenet ugyanaz a rekord: url, title, category, html, text.
+
+A letöltött nyers oldalak a data/raw/ cache-ben vannak (scraper.fetch_html),
+így az extrakció letöltés nélkül újrafuttatható:
+
+    python scripts/extract_articles.py                        # data/raw → kb_export.jsonl
+    python scripts/extract_articles.py --raw data/raw --output kb_export.jsonl --workers 4
+    python scripts/extract_articles.py bench                  # oldal/s: bs4 vs lxml vs lxml pool
+    python scripts/extract_articles.py bench --pages page1.html page2.html
+    python scripts/extract_articles.py bench --synthetic 300
+
+Ha az lxml nincs telepítve, a BeautifulSoup referencia fut (lassabban).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = lxml_html = None   # opcionális: nélküle a bs4 referencia fut
+
+EXTRACT_WORKERS = os.cpu_count() or 2
+CHUNKSIZE = 8                       # ennyi oldal megy egyszerre egy workernek
+NON_TEXT_TAGS = {"script", "style", "template"}   # a bs4 get_text() sem adja vissza
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# a scraper.parse_html selektorai, egyszer lefordítva
+if etree is not None:
+    XP_TITLE = etree.XPath("(//h1)[1]")
+    XP_ARTICLE = etree.XPath("(//article)[1]")
+    XP_SINGLE_CONTENT = etree.XPath(f"(//div[{_has_class('single-content')}])[1]")
+    XP_BREADCRUMB_LINKS = etree.XPath(f"(//nav[{_has_class('breadcrumb')}])[1]//a")
+
+
+# ================== EXTRAKCIÓ ==================
+
+def _iter_text(el) -> Iterator[str]:
+    """Szöveg csomópontok dokumentum sorrendben, script/style/komment nélkül (mint a bs4)."""
+    if not isinstance(el.tag, str) or el.tag.lower() in NON_TEXT_TAGS:
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        yield from _iter_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _get_text(el, sep: str = "") -> str:
+    return sep.join(s for s in (t.strip() for t in _iter_text(el)) if s)
+
+
+def _parse(page: str):
+    try:
+        return lxml_html.document_fromstring(page)
+    except ValueError:
+        # XML deklarációs (encoding="...") str bemenetet az lxml csak bájtként fogad el
+        return lxml_html.document_fromstring(page.encode("utf-8"))
+
+
+def extract(url: str, page: str) -> dict:
+    """Egy nyers oldal → cikk rekord; ugyanazok a mezők, mint scraper.parse_html."""
+    if etree is None:
+        from scraper import parse_html
+        return parse_html(url, page)
+
+    root = _parse(page)
+
+    title_el = XP_TITLE(root)
+    title = _get_text(title_el[0]) if title_el else url
+
+    # pl. fő tartalom egy <article> vagy .single-content div, különben az egész oldal
+    content = XP_ARTICLE(root) or XP_SINGLE_CONTENT(root) or [root]
+    content_el = content[0]
+
+    # kategória – breadcrumb utolsó előtti linkje
+    cat = None
+    links = XP_BREADCRUMB_LINKS(root)
+    if len(links) >= 2:
+        cat = _get_text(links[-2])
+
+    return {
+        "url": url,
+        "title": title,
+        "category": cat,
+        "html": etree.tostring(content_el, encoding="unicode", method="html", with_tail=False),
+        "text": _get_text(content_el, "\n"),
+    }
+
+
+def extract_item(item: dict) -> Optional[dict]:
+    """Pool worker: {"url", "html"} vagy {"url", "file"} (cache-ből a worker olvassa)."""
+    try:
+        page = item.get("html")
+        if page is None:
+            page = Path(item["file"]).read_text(encoding="utf-8", errors="replace")
+        return extract(item["url"], page)
+    except Exception as e:
+        print(f"⚠️  Extrakciós hiba: {item.get('url')}: {e}")
+        return None
+
+
+def make_pool(workers: int = EXTRACT_WORKERS) -> ProcessPoolExecutor:
+    # spawn: a pipeline szálai mellett nem forkolunk (zárolt lockok a gyerekben)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def extract_many(items: Iterable[dict], workers: int = EXTRACT_WORKERS) -> Iterator[dict]:
+    """Rekordok a bemenet sorrendjében; workers <= 1 esetén a hívó folyamatban."""
+    if workers <= 1:
+        for item in items:
+            rec = extract_item(item)
+            if rec:
+                yield rec
+        return
+    with make_pool(workers) as pool:
+        for rec in pool.map(extract_item, items, chunksize=CHUNKSIZE):
+            if rec:
+                yield rec
+
+
+def iter_raw_cache(raw_dir: Path) -> Iterator[dict]:
+    """A cache oldalai ({"url", "file"}); URL-enként a legutóbb letöltött változat."""
+    from scraper import RAW_INDEX
+
+    index_path = Path(raw_dir) / RAW_INDEX
+    if not index_path.exists():
+        print(f"❌ Nincs nyers HTML cache: {index_path}")
+        return
+    latest = {}
+    with index_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                latest[entry["url"]] = entry["file"]
+    for url in sorted(latest):
+        path = Path(raw_dir) / latest[url]
+        if path.exists():
+            yield {"url": url, "file": str(path)}
+
+
+# ================== BENCHMARK ==================
+
+def synthetic_page(i: int) -> str:
+    """Tudásbázis cikkhez hasonló oldal (menü, breadcrumb, cikk, lábléc, scriptek)."""
+    menu = "".join(f'<li class="menu-item"><a href="/tudasbazis/kategoria-{k}/">Kategória {k}</a></li>'
+                   for k in range(60))
+    paras = "".join(
+        f"<p>A(z) {i}. cikk {k}. bekezdése: a <strong>cPanel</strong> felületén a "
+        f"<a href='/tudasbazis/tarhely/cikk-{k}/'>Domainek</a> menüpontban állítható be, "
+        f"majd a változás akár 24 órán belül érvényesül.</p>"
+        f"<ul><li>Lépés {k}.1</li><li>Lépés {k}.2 &nbsp;<code>dig example.hu</code></li></ul>"
+        for k in range(25)
+    )
+    return f"""<!DOCTYPE html>
+<html lang="hu"><head><meta charset="utf-8"><title>Cikk {i} – Rackhost</title>
+<style>.single-content {{ color: #333; }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}</script>
+</head><body>
+<header><nav class="main-menu"><ul>{menu}</ul></nav></header>
+<nav class="breadcrumb"><a href="/">Főoldal</a> › <a href="/tudasbazis/">Tudásbázis</a> ›
+<a href="/tudasbazis/tarhely/">Tárhely</a> › <span>Cikk {i}</span></nav>
+<main><article class="post"><h1>Hogyan állítsam be a(z) {i}. beállítást?</h1>
+<div class="single-content">{paras}
+<table><tr><th>Rekord</th><th>Érték</th></tr><tr><td>A</td><td>185.1.{i % 255}.1</td></tr></table>
+<!-- belső megjegyzés --></div></article></main>
+<footer><p>© Rackhost Zrt.</p><script>console.log("footer");</script></footer>
+</body></html>"""
+
+
+def load_bench_pages(args) -> List[dict]:
+    if args.pages:
+        return [{"url": f"file://{Path(p).resolve()}", "html": Path(p).read_text(encoding="utf-8", errors="replace")}
+                for p in args.pages]
+    if args.synthetic is None and args.raw.exists():
+        pages = [{"url": it["url"], "html": Path(it["file"]).read_text(encoding="utf-8", errors="replace")}
+                 for it in iter_raw_cache(args.raw)]
+        if pages:
+            return pages[:args.limit] if args.limit else pages
+    n = args.synthetic or 200
+    return [{"url": f"https://www.rackhost.hu/tudasbazis/tarhely/cikk-{i}/", "html": synthetic_page(i)}
+            for i in range(n)]
+
+
+def _timed(fn, pages) -> tuple:
+    t0 = time.perf_counter()
+    out = fn(pages)
+    return out, time.perf_counter() - t0
+
+
+def bench(args) -> None:
+    pages = load_bench_pages(args)
+    mb = sum(len(p["html"]) for p in pages) / 1e6
+    print(f"{len(pages)} oldal ({mb:.1f} MB)\n")
+
+    rows = []
+    ref = None
+    try:
+        from scraper import parse_html
+        ref, dt = _timed(lambda ps: [parse_html(p["url"], p["html"]) for p in ps], pages)
+        rows.append(("bs4 html.parser", dt))
+    except ImportError as e:
+        print(f"⚠️  bs4 referencia kihagyva: {e}")
+
+    if etree is None:
+        print("❌ Az lxml nincs telepítve (pip install lxml) – nincs mit összevetni.")
+        return
+
+    fast, dt = _timed(lambda ps: [extract(p["url"], p["html"]) for p in ps], pages)
+    rows.append(("lxml, 1 folyamat", dt))
+    for w in args.workers:
+        if w > 1:
+            _, dt = _timed(lambda ps: list(extract_many(ps, w)), pages)
+            rows.append((f"lxml, {w} folyamat", dt))
+
+    base = rows[0][1]
+    print(f"{'parser':<20} {'oldal/s':>9} {'MB/s':>7} {'gyorsulás':>10}")
+    for name, dt in rows:
+        print(f"{name:<20} {len(pages) / dt:>9.1f} {mb / dt:>7.1f} {base / dt:>9.1f}×")
+
+    if ref is not None:
+        # a két parser ugyanazt a rekordot kell adja (a html szerializáció eltérhet)
+        diff = {k: sum(1 for a, b in zip(ref, fast) if a[k] != b[k]) for k in ("title", "category", "text")}
+        print(f"\nEltérés a bs4 kimenettől: " + ", ".join(f"{k}: {n}/{len(pages)}" for k, n in diff.items()))
+        for a, b in zip(ref, fast):
+            if a["text"] != b["text"]:
+                i = next((k for k, (x, y) in enumerate(zip(a["text"], b["text"])) if x != y),
+                         min(len(a["text"]), len(b["text"])))
+                print(f"  első eltérés: {a['url']}")
+                print(f"    bs4:  {a['text'][max(0, i - 40):i + 40]!r}")
+                print(f"    lxml: {b['text'][max(0, i - 40):i + 40]!r}")
+                break
+
+
+# ================== FUTTATÁS ==================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from scraper import RAW_DIR
+
+    ap = argparse.ArgumentParser(description="Párhuzamos lxml extrakció a nyers HTML cache-ből")
+    ap.add_argument("cmd", nargs="?", default="extract", choices=("extract", "bench"))
+    ap.add_argument("--raw", type=Path, default=RAW_DIR, help="nyers HTML cache (scraper.fetch_html)")
+    ap.add_argument("--output", type=Path, default=Path("kb_export.jsonl"))
+    ap.add_argument("--workers", type=int, nargs="+", default=[EXTRACT_WORKERS],
+                    help="folyamatok száma (bench: több érték is)")
+    ap.add_argument("--pages", nargs="*", help="bench: fixture HTML fájlok")
+    ap.add_argument("--synthetic", type=int, default=None, help="bench: ennyi generált oldal")
+    ap.add_argument("--limit", type=int, default=None, help="bench: legfeljebb ennyi cache oldal")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        bench(args)
+        return 0
+
+    t0 = time.perf_counter()
+    n = 0
+    with args.output.open("w", encoding="utf-8") as f:
+        for rec in extract_many(iter_raw_cache(args.raw), args.workers[0]):
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    dt = time.perf_counter() - t0
+    print(f"✓ {n} cikk → {args.output} ({dt:.1f} s, {n / max(dt, 1e-9):.0f} oldal/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""
+Historikus (lezárt) ticketek betöltése a RAG indexbe.
+
+Támogatott exportok (lustán, streamelve olvasva):
+    .csv    – soronként egy üzenet (ticket_id, role / from, subject, body, created_at)
+    .mbox   – levelek; ticket azonosító X-Ticket-ID fejlécből vagy a tárgyból
+    .jsonl  – soronként egy ticket {"id", "subject", "messages": [...]}
+              vagy egy üzenet {"ticket_id", "role", "body", ...}
+
+Lépések: üzenetek → ticketenként szálba fűzés (ügyfél kérdés / ügyfélszolgálati
+válasz váltások) → PII szűrés (e-mail, telefonszám, domain) → chunkolás
+(chunk_kb.chunk_text) → ugyanaz az inkrementális indexelés, mint a
+kb_chunks.jsonl-nél (build_index.index_records), source címkével.
+
+A memória korlátos: egyszerre legfeljebb MAX_OPEN_TICKETS nyitott ticket
+van a memóriában, a legrégebben látott lezárul és továbbmegy.
+
+    python scripts/ingest_tickets.py export.csv export.mbox --collection tickets_hu
+    python scripts/ingest_tickets.py export.jsonl --output data/ticket_chunks.jsonl
+"""
+import argparse
+import csv
+import hashlib
+import json
+import mailbox
+import re
+import sys
+import time
+from collections import OrderedDict
+from email.header import decode_header, make_header
+from email.utils import parseaddr
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from chunk_kb import chunk_text
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SOURCE_TAG = "tickets"
+DEFAULT_COLLECTION = "tickets_hu"     # collections.json-ban kell szerepelnie
+AGENT_DOMAINS = ("rackhost.hu",)      # innen jövő levél = ügyfélszolgálati válasz
+MAX_OPEN_TICKETS = 2000
+MIN_TICKET_CHARS = 40                 # ennél rövidebb szál nem ér indexelést
+REPORT_EVERY = 1000
+
+AGENT_ROLES = {"agent", "support", "staff", "operator", "ugyintezo", "ügyintéző"}
+
+# ================== PII SZŰRÉS ==================
+
+# Előre fordított minták, a sorrend számít: e-mail → telefon → domain
+EMAIL_RE = re.compile(r"[\w.+-]+@(?:[\w-]+\.)+[a-z]{2,}", re.IGNORECASE)
+PHONE_RE = re.compile(
+    r"(?<![\w+])(?:\+36|0036|06)[\s/-]?\(?\d{1,2}\)?[\s/-]?\d{3}[\s-]?\d{3,4}(?!\d)"   # magyar
+    r"|(?<![\w+])\+\d{1,3}[\s-]?(?:\(?\d{1,4}\)?[\s-]?){2,4}\d{2,4}(?!\d)"             # nemzetközi
+)
+DOMAIN_RE = re.compile(
+    r"\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+"
+    r"(?:hu|com|net|org|eu|info|biz|io|co|de|at|sk|ro|uk|dev|app|shop|online|site|xyz|store|tech)\b",
+    re.IGNORECASE,
+)
+QUOTE_RE = re.compile(r"^\s*>.*$", re.MULTILINE)
+REPLY_HEADER_RE = re.compile(r"^.{0,200}(?:írta|wrote):\s*$", re.MULTILINE | re.IGNORECASE)
+SUBJECT_PREFIX_RE = re.compile(r"^\s*(?:(?:re|fw|fwd|vá|tov)\s*:\s*)+", re.IGNORECASE)
+TICKET_IN_SUBJECT_RE = re.compile(r"\[#?(\d{3,})\]|#(\d{3,})")
+
+
+def _domain_sub(m: re.Match) -> str:
+    host = m.group(0).lower()
+    if any(host == d or host.endswith("." + d) for d in AGENT_DOMAINS):
+        return m.group(0)   # saját domain nem személyes adat
+    return "[DOMAIN]"
+
+
+def scrub(text: str) -> str:
+    text = EMAIL_RE.sub("[EMAIL]", text)
+    text = PHONE_RE.sub("[TELEFON]", text)
+    return DOMAIN_RE.sub(_domain_sub, text)
+
+
+def strip_quoted(text: str) -> str:
+    """Idézett előzmények levágása (> sorok, "... írta:" utáni rész)."""
+    m = REPLY_HEADER_RE.search(text)
+    if m:
+        text = text[:m.start()]
+    return QUOTE_RE.sub("", text).strip()
+
+
+# ================== EXPORT OLVASÓK ==================
+# Mindegyik üzeneteket ad: {"ticket_id", "role", "subject", "body", "category"}
+
+def _role(value: str) -> str:
+    return "agent" if (value or "").strip().lower() in AGENT_ROLES else "customer"
+
+
+def _role_from_address(addr: str) -> str:
+    domain = parseaddr(addr or "")[1].rpartition("@")[2].lower()
+    return "agent" if any(domain == d or domain.endswith("." + d) for d in AGENT_DOMAINS) else "customer"
+
+
+def iter_csv(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            role = _role(row["role"]) if row.get("role") else _role_from_address(row.get("from", ""))
+            yield {
+                "ticket_id": row.get("ticket_id") or row.get("id") or "",
+                "role": role,
+                "subject": row.get("subject", ""),
+                "body": row.get("body") or row.get("message") or "",
+                "category": row.get("category", ""),
+            }
+
+
+def _header(msg, name: str) -> str:
+    raw = msg.get(name)
+    if raw is None:
+        return ""
+    try:
+        return str(make_header(decode_header(raw)))
+    except Exception:
+        return str(raw)
+
+
+def _mail_body(msg) -> str:
+    part = msg
+    if msg.is_multipart():
+        part = next((p for p in msg.walk() if p.get_content_type() == "text/plain"), None)
+        if part is None:
+            return ""
+    payload = part.get_payload(decode=True) or b""
+    return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+
+
+def iter_mbox(path: Path) -> Iterator[dict]:
+    # a mailbox modul csak az üzenetek offsetjeit tartja memóriában
+    for msg in mailbox.mbox(str(path)):
+        subject = _header(msg, "Subject")
+        ticket_id = _header(msg, "X-Ticket-ID")
+        if not ticket_id:
+            m = TICKET_IN_SUBJECT_RE.search(subject)
+            ticket_id = (m.group(1) or m.group(2)) if m else SUBJECT_PREFIX_RE.sub("", subject).strip().lower()
+        yield {
+            "ticket_id": ticket_id,
+            "role": _role_from_address(_header(msg, "From")),
+            "subject": SUBJECT_PREFIX_RE.sub("", subject).strip(),
+            "body": strip_quoted(_mail_body(msg)),
+            "category": _header(msg, "X-Ticket-Category"),
+        }
+
+
+def iter_jsonl(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "messages" in obj:   # ticketenként egy sor
+                for msg in obj["messages"]:
+                    yield {
+                        "ticket_id": str(obj.get("id") or obj.get("ticket_id") or ""),
+                        "role": _role(msg.get("role", "")),
+                        "subject": obj.get("subject", ""),
+                        "body": msg.get("body") or msg.get("text") or "",
+                        "category": obj.get("category", ""),
+                    }
+            else:                   # üzenetenként egy sor
+                yield {
+                    "ticket_id": str(obj.get("ticket_id") or ""),
+                    "role": _role(obj.get("role", "")),
+                    "subject": obj.get("subject", ""),
+                    "body": obj.get("body") or obj.get("text") or "",
+                    "category": obj.get("category", ""),
+                }
+
+
+READERS = {".csv": iter_csv, ".mbox": iter_mbox, ".jsonl": iter_jsonl}
+
+
+def iter_messages(paths: Iterable[Path]) -> Iterator[dict]:
+    for path in paths:
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            print(f"⚠️  Ismeretlen export formátum, kihagyva: {path}")
+            continue
+        yield from reader(path)
+
+
+# ================== SZÁLBA FŰZÉS ==================
+
+def iter_tickets(messages: Iterable[dict], max_open: int = MAX_OPEN_TICKETS) -> Iterator[dict]:
+    """
+    Üzenetek ticketekbe gyűjtése. Az exportok jellemzően ticketenként
+    rendezettek, de ha nem, a nyitott ticketeket egy korlátos LRU-ban
+    tartjuk; ami kiesik belőle, lezártnak tekintjük.
+    Ha egy már lezárt tickethez később még jön üzenet, az új szegmensként
+    (segment = 1, 2, …) megy tovább, saját doc_id-vel, így nem írja felül a
+    korábban indexelt chunkokat. Ehhez csak a kiesett ticketek számlálóját
+    tartjuk meg (azonosítónként egy int).
+    """
+    open_tickets: "OrderedDict[str, dict]" = OrderedDict()
+    closed: Dict[str, int] = {}   # ticket id → eddig lezárt szegmensek száma
+    for msg in messages:
+        tid = msg["ticket_id"]
+        if not tid or not msg["body"].strip():
+            continue
+        ticket = open_tickets.get(tid)
+        if ticket is None:
+            ticket = open_tickets[tid] = {"id": tid, "segment": closed.get(tid, 0), "subject": msg["subject"],
+                                          "category": msg["category"], "messages": []}
+            if len(open_tickets) > max_open:
+                evicted = open_tickets.popitem(last=False)[1]
+                closed[evicted["id"]] = evicted["segment"] + 1
+                yield evicted
+        else:
+            open_tickets.move_to_end(tid)
+        ticket["messages"].append(msg)
+    yield from open_tickets.values()
+
+
+def thread_turns(ticket: dict) -> List[tuple]:
+    """Egymást követő, azonos szerepű üzenetek összevonása: [(role, text), ...]"""
+    turns = []
+    for msg in ticket["messages"]:
+        body = msg["body"].strip()
+        if turns and turns[-1][0] == msg["role"]:
+            turns[-1] = (msg["role"], turns[-1][1] + "\n" + body)
+        else:
+            turns.append((msg["role"], body))
+    return turns
+
+
+def ticket_chunks(ticket: dict, source: str = SOURCE_TAG) -> List[dict]:
+    turns = thread_turns(ticket)
+    # válasz nélküli ticketből nem tanul semmit a RAG
+    if not any(role == "agent" for role, _ in turns):
+        return []
+
+    labels = {"customer": "Ügyfél", "agent": "Ügyfélszolgálat"}
+    subject = scrub(ticket["subject"] or "")
+    text = "\n\n".join(f"{labels[role]}: {scrub(body)}" for role, body in turns)
+    if len(text) < MIN_TICKET_CHARS:
+        return []
+
+    doc_id = "tk-" + hashlib.md5(ticket["id"].encode("utf-8")).hexdigest()[:12]
+    if ticket.get("segment"):
+        doc_id += f"-s{ticket['segment']}"   # LRU-ból kiesett ticket késői folytatása
+    return [{
+        "doc_id": doc_id,
+        "chunk_local_index": i,
+        "chunk_id": f"{doc_id}-chunk-{i}",
+        "source": source,
+        "url": "",
+        "title": subject,
+        "category": ticket.get("category") or "",
+        "text": chunk,
+    } for i, chunk in enumerate(chunk_text(text))]
+
+
+class Throughput:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.tickets = 0
+        self.chunks = 0
+
+    def line(self) -> str:
+        dt = time.perf_counter() - self.t0
+        return (f"{self.tickets} ticket, {self.chunks} chunk, {dt:.1f} s "
+                f"({self.tickets / max(dt, 1e-9):.0f} ticket/s)")
+
+
+def iter_ticket_chunks(paths: Iterable[Path], source: str, stats: Throughput) -> Iterator[dict]:
+    for ticket in iter_tickets(iter_messages(paths)):
+        stats.tickets += 1
+        for chunk in ticket_chunks(ticket, source):
+            stats.chunks += 1
+            yield chunk
+        if stats.tickets % REPORT_EVERY == 0:
+            print(f"  {stats.line()}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Historikus ticketek streamelt betöltése")
+    ap.add_argument("exports", type=Path, nargs="+", help=".csv / .mbox / .jsonl export(ok)")
+    ap.add_argument("--collection", default=DEFAULT_COLLECTION)
+    ap.add_argument("--source", default=SOURCE_TAG, help="source címke a chunkokon")
+    ap.add_argument("--output", type=Path, help="indexelés helyett chunk JSONL-be ír")
+    args = ap.parse_args(argv)
+
+    stats = Throughput()
+    chunks = iter_ticket_chunks(args.exports, args.source, stats)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with args.output.open("w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        print(f"✓ {stats.line()} → {args.output}")
+        return 0
+
+    from build_index import index_records
+    ok = index_records(chunks, args.collection, incremental=True)
+    print(f"{'✓' if ok else '❌'} {stats.line()}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+"""
+Egyparancsos, streamelt betöltés: crawl → extract → clean → chunk → embed → upsert.
+
+A lépések generátorok / szálak, korlátos sorokkal összekötve: a cikkek már
+tisztulnak, chunkolódnak és embeddelődnek, miközben a crawler még fut. Ha
+egy lépés lassú, előtte megtelik a sor, és a korábbi lépések megállnak
+(backpressure) – a memória így korlátos.
+
+    crawl (fetch_workers, nyers HTML → data/raw/) → extract (extract_workers
+        folyamat, lxml, lásd extract_articles.py) → clean (1, dedup állapot)
+        → chunk (chunk_workers) → embed (embed_workers, batch)
+        → upsert (1, build_index.index_records)
+
+Checkpoint:
+    data/pipeline_state.json       – futás közben: a félbemaradt snapshot neve és
+                                     a már teljesen beírt cikkek (url → tartalom hash);
+                                     --resume ezeket nem tölti le újra
+    data/pipeline_checkpoint.json  – élesítés után: a publikált cikkek hash-e;
+                                     a változatlan tartalmú cikket a következő
+                                     futás nem embeddeli újra (inkrementális mód)
+
+Inkrementális módban élesítés előtt töröljük az elavult chunkokat: egy
+változott cikk új darabszámon felüli -chunk-{n} elemeit, valamint a
+forrásból eltűnt (vagy tisztításkor kiesett) cikkek összes chunkját. Ha a
+forrás olvasása hibával megszakadt, a listázás hiányos, ezért eltűnt
+cikket ilyenkor nem törlünk.
+
+    python scripts/pipeline.py                          # crawl a rackhost.hu-ról
+    python scripts/pipeline.py --input kb_export.jsonl  # meglévő exportból
+    python scripts/pipeline.py --raw data/raw           # nyers HTML cache-ből, letöltés nélkül
+    python scripts/pipeline.py --resume                 # megszakadt futás folytatása
+    python scripts/pipeline.py --input kb_export.jsonl --output data/kb_chunks.jsonl   # index nélkül
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from build_kb_clean import BOILERPLATE_PATH, Cleaner, iter_raw, load_boilerplate
+from chunk_kb import chunk_article
+from extract_articles import EXTRACT_WORKERS, extract_item, iter_raw_cache, make_pool
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATE_PATH = BASE_DIR / "data" / "pipeline_state.json"
+CHECKPOINT_PATH = BASE_DIR / "data" / "pipeline_checkpoint.json"
+
+FETCH_WORKERS = 4
+CHUNK_WORKERS = 1
+EMBED_WORKERS = 2
+EMBED_BATCH = 64
+QUEUE_SIZE = 256             # lépések közti sor mérete (elem)
+REPORT_INTERVAL = 10.0       # mp
+CHECKPOINT_INTERVAL = 5.0    # mp
+
+_DONE = object()             # sor vége jelző
+
+
+# ================== LÉPÉSEK ==================
+
+class Stage:
+    """
+    Egy lépés: workers szál olvas az in_q-ból, fn(elem) → kimenetek
+    listája megy az out_q-ba. batch > 1 esetén fn egy listát kap.
+    Ha minden worker végzett, a _DONE jelet továbbadja.
+    """
+
+    def __init__(self, name: str, fn: Callable, in_q: queue.Queue, out_q: Optional[queue.Queue],
+                 workers: int = 1, batch: int = 1):
+        self.name = name
+        self.fn = fn
+        self.in_q = in_q
+        self.out_q = out_q
+        self.workers = max(1, workers)
+        self.batch = batch
+        self.n_in = 0
+        self.n_out = 0
+        self.busy = 0.0
+        self._alive = self.workers
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+                        for i in range(self.workers)]
+
+    def start(self) -> "Stage":
+        for t in self.threads:
+            t.start()
+        return self
+
+    def _take(self) -> list:
+        item = self.in_q.get()
+        if item is _DONE:
+            self.in_q.put(_DONE)   # a többi worker is lássa
+            return []
+        items = [item]
+        while len(items) < self.batch:
+            try:
+                item = self.in_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self.in_q.put(_DONE)
+                break
+            items.append(item)
+        return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._take()
+            if not items:
+                break
+            t0 = time.perf_counter()
+            try:
+                outputs = self.fn(items if self.batch > 1 else items[0]) or []
+            except Exception as e:
+                print(f"⚠️  {self.name}: hiba, {len(items)} elem kihagyva: {e}")
+                outputs = []
+            with self._lock:
+                self.busy += time.perf_counter() - t0
+                self.n_in += len(items)
+                self.n_out += len(outputs)
+            if self.out_q is not None:
+                for out in outputs:
+                    self.out_q.put(out)
+
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        if last and self.out_q is not None:
+            self.out_q.put(_DONE)
+
+    def join(self) -> None:
+        for t in self.threads:
+            t.join()
+
+
+def iter_queue(q: queue.Queue) -> Iterable:
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        yield item
+
+
+def feed(source: Iterable, out_q: queue.Queue, stats: dict) -> threading.Thread:
+    """A forrás (URL-ek vagy nyers cikkek) betolása az első sorba, külön szálon."""
+    def run():
+        try:
+            for item in source:
+                out_q.put(item)
+                stats["n"] += 1
+            stats["complete"] = True
+        except Exception as e:
+            print(f"⚠️  Forrás hiba, a futás a már beolvasott elemekkel folytatódik: {e}")
+        finally:
+            out_q.put(_DONE)
+
+    t = threading.Thread(target=run, name="source", daemon=True)
+    t.start()
+    return t
+
+
+# ================== CHECKPOINT ==================
+
+def content_hash(raw: dict) -> str:
+    text = (raw.get("title") or "") + "\n" + (raw.get("text") or "")
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_json(path: Path, default):
+    if not path.exists():
+        return default
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json_atomic(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class Progress:
+    """
+    Cikk akkor kész, ha minden chunkja beírásra került (az embed lépés
+    párhuzamos, így egy cikk chunkjai több batchben, tetszőleges sorrendben
+    érkezhetnek).
+    """
+
+    def __init__(self, state: dict, save_path: Optional[Path] = STATE_PATH):
+        self.state = state
+        self.state.setdefault("chunks", {})   # url → az új változat chunkjainak száma
+        self.save_path = save_path
+        self.pending = {}      # doc_id → [url, hash, hátralévő chunk]
+        self.written = 0
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    def expect(self, doc_id: str, url: str, digest: str, n_chunks: int) -> None:
+        with self._lock:
+            self.state["chunks"][url] = max(n_chunks, 0)
+            if n_chunks <= 0:
+                self.state["done"][url] = digest
+            else:
+                self.pending[doc_id] = [url, digest, n_chunks]
+
+    def dropped(self, url: str) -> None:
+        """Tisztításkor kiesett (üres / duplikátum) cikk: a régi chunkjai törlendők."""
+        with self._lock:
+            self.state["chunks"][url] = 0
+
+    def chunks_written(self, ids: List[str]) -> None:
+        with self._lock:
+            self.written += len(ids)
+            for cid in ids:
+                doc_id = cid.rsplit("-chunk-", 1)[0]
+                entry = self.pending.get(doc_id)
+                if entry is None:
+                    continue
+                entry[2] -= 1
+                if entry[2] <= 0:
+                    self.state["done"][entry[0]] = entry[1]
+                    del self.pending[doc_id]
+            if self.save_path is not None and time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+                self._saved_at = time.monotonic()
+                write_json_atomic(self.save_path, self.state)
+
+
+def find_stale(collection, counts: Dict[str, int], batch: int = 500) -> List[str]:
+    """
+    counts: url → a cikk új chunkszáma (0 = a cikk megszűnt). Elavult az a
+    chunk, amelynek indexe (…-chunk-{i}) nem kisebb az új darabszámnál.
+    """
+    urls = list(counts)
+    stale = []
+    for i in range(0, len(urls), batch):
+        got = collection.get(where={"url": {"$in": urls[i:i + batch]}}, include=["metadatas"])
+        for cid, meta in zip(got["ids"], got["metadatas"]):
+            n = counts.get((meta or {}).get("url"), 0)
+            _, sep, idx = cid.rpartition("-chunk-")
+            if not sep or not idx.isdigit() or int(idx) >= n:
+                stale.append(cid)
+    return stale
+
+
+# ================== FUTTATÁS ==================
+
+def report(stages: List[Stage], source_stats: dict, progress: Progress, t0: float) -> str:
+    dt = max(time.perf_counter() - t0, 1e-9)
+    lines = [f"{'lépés':>8} {'be':>7} {'ki':>7} {'elem/s':>8} {'foglalt':>8} {'sor':>6}",
+             f"{'forrás':>8} {'-':>7} {source_stats['n']:>7} {source_stats['n'] / dt:>8.1f} {'-':>8} {'-':>6}"]
+    for st in stages:
+        busy = 100 * st.busy / (dt * st.workers)
+        lines.append(f"{st.name:>8} {st.n_in:>7} {st.n_out:>7} {st.n_in / dt:>8.1f} "
+                     f"{busy:>7.0f}% {st.in_q.qsize():>6}")
+    sink_q = stages[-1].out_q
+    lines.append(f"{'upsert':>8} {progress.written:>7} {'-':>7} {progress.written / dt:>8.1f} {'-':>8} "
+                 f"{sink_q.qsize():>6}")
+    return "\n".join(lines)
+
+
+def run(args) -> int:
+    boilerplate = load_boilerplate(args.boilerplate)
+    if not boilerplate:
+        print(f"⚠️  Nincs boilerplate lista ({args.boilerplate}) – futtasd egyszer a build_kb_clean.py-t.")
+
+    state = {"snapshot": None, "collection": args.collection, "done": {}}
+    if args.resume:
+        state = load_json(STATE_PATH, state)
+        print(f"Folytatás: {len(state['done'])} cikk már kész (snapshot: {state.get('snapshot')})")
+    published = {} if args.full else load_json(CHECKPOINT_PATH, {})
+    skip_urls = set(state["done"]) if args.resume else set()
+
+    # ---- források ----
+    # a forrás minden URL-jét feljegyezzük: ami a publikáltak közül hiányzik, az megszűnt
+    listed = set(skip_urls)
+
+    def listing(items, url_of):
+        for it in items:
+            listed.add(url_of(it))
+            if url_of(it) not in skip_urls:
+                yield it
+
+    fetch, extract_pool = None, None
+    if args.input:
+        source = listing(iter_raw(args.input), lambda r: r.get("url"))
+    elif args.raw:
+        source = listing(iter_raw_cache(args.raw), lambda it: it["url"])
+        extract_pool = make_pool(args.extract_workers)
+    else:
+        from scraper import fetch_raw, iter_article_urls
+        source = listing(iter_article_urls(), lambda u: u)
+        fetch = fetch_raw
+        extract_pool = make_pool(args.extract_workers)
+
+    progress = Progress(state, None if args.output else STATE_PATH)
+    cleaner = Cleaner(boilerplate, dedup=not args.no_dedup, keep_html=False)
+    n_unchanged = [0]
+
+    def clean(raw):
+        digest = content_hash(raw)
+        if published.get(raw.get("url")) == digest:
+            n_unchanged[0] += 1
+            cleaner.remember(raw)  # a near-duplicate szűrő a változatlan cikkeket is lássa
+            return []          # a publikált indexben már így szerepel
+        doc = cleaner.clean(raw)
+        if not doc:
+            progress.dropped(raw.get("url"))
+            return []
+        return [dict(doc, _hash=digest)]
+
+    def chunk(doc):
+        chunks = chunk_article(doc)
+        progress.expect(doc["id"], doc["url"], doc["_hash"], len(chunks))
+        return chunks
+
+    q_src = queue.Queue(maxsize=args.queue_size)
+    q_html = queue.Queue(maxsize=args.queue_size)
+    q_raw = queue.Queue(maxsize=args.queue_size)
+    q_doc = queue.Queue(maxsize=args.queue_size)
+    q_chunk = queue.Queue(maxsize=args.queue_size)
+    q_emb = queue.Queue(maxsize=args.queue_size)
+
+    stages = []
+    if fetch is not None:
+        stages.append(Stage("crawl", lambda url: [a for a in [fetch(url)] if a], q_src, q_html, args.fetch_workers))
+    if extract_pool is not None:
+        # a parse CPU-munka folyamatokban fut; workerenként egy szál vár egy eredményre
+        stages.append(Stage("extract", lambda item: [a for a in [extract_pool.submit(extract_item, item).result()] if a],
+                            q_html if fetch is not None else q_src, q_raw, args.extract_workers))
+        clean_in = q_raw
+    else:
+        clean_in = q_src
+    stages.append(Stage("clean", clean, clean_in, q_doc, 1))
+    stages.append(Stage("chunk", chunk, q_doc, q_chunk, args.chunk_workers))
+
+    if args.output:
+        sink_q = q_chunk
+    else:
+        from kb_registry import load_specs
+        spec = {s.name: s for s in load_specs()}[args.collection]
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(spec.embed_model)
+
+        def embed(chunks):
+            vecs = model.encode([c["text"] for c in chunks], batch_size=EMBED_BATCH)
+            return [dict(c, embedding=v.tolist()) for c, v in zip(chunks, vecs)]
+
+        stages.append(Stage("embed", embed, q_chunk, q_emb, args.embed_workers, batch=EMBED_BATCH))
+        sink_q = q_emb
+
+    t0 = time.perf_counter()
+    source_stats = {"n": 0, "complete": False}
+
+    def removed_urls() -> set:
+        # hiányos listázásnál (forrás hiba) nem tekintünk semmit megszűntnek
+        if not source_stats["complete"]:
+            return set()
+        return {url for url in published if url not in listed}
+
+    def stale(collection) -> List[str]:
+        counts = dict(state["chunks"], **{url: 0 for url in removed_urls()})
+        return find_stale(collection, counts)
+
+    feed(source, q_src, source_stats)
+    for st in stages:
+        st.start()
+
+    stop_reporting = threading.Event()
+
+    def reporter():
+        while not stop_reporting.wait(args.report_interval):
+            print(report(stages, source_stats, progress, t0) + "\n")
+
+    threading.Thread(target=reporter, name="report", daemon=True).start()
+
+    # ---- nyelő: chunk JSONL vagy index (upsert a hívó szálon) ----
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with args.output.open("w", encoding="utf-8") as f:
+            for c in iter_queue(sink_q):
+                f.write(json.dumps(c, ensure_ascii=False) + "\n")
+                progress.chunks_written([c["chunk_id"]])
+        ok = True
+    else:
+        import index_snapshots
+        from build_index import index_records
+
+        if not state.get("snapshot"):
+            state["snapshot"] = index_snapshots.new_snapshot_dir(spec.path).name
+        snap_dir = Path(spec.path) / index_snapshots.SNAPSHOT_DIR / state["snapshot"]
+        write_json_atomic(STATE_PATH, state)
+        ok = index_records(iter_queue(sink_q), args.collection, incremental=not args.full,
+                           snap_dir=snap_dir, on_batch=progress.chunks_written,
+                           stale=None if args.full else stale)
+
+    for st in stages:
+        st.join()
+    stop_reporting.set()
+    if extract_pool is not None:
+        extract_pool.shutdown()
+
+    print(report(stages, source_stats, progress, t0))
+    print(cleaner.report())
+    print(f"Változatlan (kihagyva): {n_unchanged[0]}, összesen {time.perf_counter() - t0:.1f} s")
+
+    if ok and not args.output:
+        # élesítve: a publikált hash-ek a következő inkrementális futáshoz;
+        # a megszűnt és a tisztításkor kiesett cikkek kikerülnek belőle
+        gone = removed_urls() | {url for url, n in state["chunks"].items() if not n and url not in state["done"]}
+        kept = {url: h for url, h in published.items() if url not in gone}
+        write_json_atomic(CHECKPOINT_PATH, dict(kept, **state["done"]))
+        STATE_PATH.unlink(missing_ok=True)
+    elif not ok:
+        write_json_atomic(STATE_PATH, state)
+        print("❌ A futás nem élesedett, folytatás: python scripts/pipeline.py --resume")
+    return 0 if ok else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Streamelt crawl → clean → chunk → embed → upsert")
+    ap.add_argument("--input", type=Path, help="meglévő nyers export (kb_export.jsonl) crawl helyett")
+    ap.add_argument("--raw", type=Path, help="nyers HTML cache (data/raw) crawl helyett, újra-extrakcióval")
+    ap.add_argument("--output", type=Path, help="chunk JSONL kimenet, embed / index nélkül")
+    ap.add_argument("--collection", default="rackhost_kb")
+    ap.add_argument("--boilerplate", type=Path, default=BOILERPLATE_PATH)
+    ap.add_argument("--resume", action="store_true", help="megszakadt futás folytatása")
+    ap.add_argument("--full", action="store_true", help="teljes újraépítés (nem az élő indexre épít)")
+    ap.add_argument("--no-dedup", action="store_true")
+    ap.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    ap.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS)
+    ap.add_argument("--chunk-workers", type=int, default=CHUNK_WORKERS)
+    ap.add_argument("--embed-workers", type=int, default=EMBED_WORKERS)
+    ap.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    ap.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    args = ap.parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,49 @@
 import os
+import re
+import sys
+import time
+from collections import OrderedDict
 from pathlib import Path
 from textwrap import dedent
 
-import chromadb
-from chromadb.config import Settings
+import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "rag"))
+from confidence_gate import GATE_K, REFUSAL_TEXT, get_gate, report as confidence_gate_report
+from generators import get_generator
+from kb_registry import EmbedderMismatchError, get_registry
+from query_log import log_query
+from sentence_index import compress
+
 # --- KONFIG ---
-CHROMA_PATH = Path(__file__).resolve().parent.parent / "chroma_kb"
-COLLECTION_NAME = "rackhost_kb"
+# Az OpenAI embeddinggel épült kollekció neve a collections.json-ban
+# (embed_model: text-embedding-3-large). A MiniLM-es rackhost_kb-t a
+# regiszter eltérő embedder miatt elutasítja.
+COLLECTION_NAME = os.getenv("RAG_CHAT_COLLECTION", "rackhost_kb")
 EMBED_MODEL = "text-embedding-3-large"
+EMBED_DIM = 3072                     # a text-embedding-3-large vektorainak hossza
 CHAT_MODEL = "gpt-4.1-mini"  # vagy amit használsz
 
+# --- BESZÉLGETÉS ---
+# A korábbi fordulók találatait (embeddinggel) memóriában tartjuk; a
+# következő kérdésnél először ezt a poolt pontozzuk újra, és csak akkor
+# megyünk a teljes indexhez, ha a pool legjobb találata a kapu szerint
+# nem elég magabiztos ("generate" küszöb).
+POOL_MAX_CHUNKS = 60
+HISTORY_TURNS = 2                 # ennyi korábbi kérdés-válasz kerül a promptba
+FOLLOWUP_CONTEXT_WEIGHT = 0.5     # rákérdezésnél az előző kérdés vektorának súlya
+FOLLOWUP_MAX_WORDS = 5            # ennél rövidebb kérdés rákérdezésnek számít
+FOLLOWUP_RE = re.compile(r"^\s*(és|de|meg|akkor|viszont|mi van|mi a helyzet|ehhez|ahhoz|ezt|azt|ott|itt|és ha)\b",
+                         re.IGNORECASE)
+
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-chroma_client = chromadb.PersistentClient(
-    path=str(CHROMA_PATH),
-    settings=Settings(allow_reset=False)
-)
-collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
+registry = get_registry()
+llm = get_generator("openai", model=CHAT_MODEL, temperature=0.1)
 
 
 def embed(text: str):
@@ -32,21 +54,39 @@ def embed(text: str):
     return resp.data[0].embedding
 
 
-def retrieve(query: str, k: int = 6):
-    q_emb = embed(query)
-    res = collection.query(
-        query_embeddings=[q_emb],
-        n_results=k
-    )
-    # Chroma visszaad: ids, documents, metadatas
+def index_vector(q_emb, served=None):
+    """A kérdés vektora az index terében (vetített indexnél PCA / Matryoshka után)."""
+    projection = registry.get_projection(COLLECTION_NAME, served)
+    return projection.apply(q_emb).tolist() if projection is not None else list(q_emb)
+
+
+def retrieve(query: str, k: int = 6, q_emb=None, with_embeddings: bool = False):
+    q_emb = q_emb or embed(query)
+    # eltérő embedder / dimenzió esetén itt áll meg, nem a Chroma-ban
+    registry.check_embedding(COLLECTION_NAME, EMBED_MODEL, len(q_emb))
+    # kollekció és vetítés ugyanabból a snapshotból (közben lehet csere)
+    path, collection = registry.served(COLLECTION_NAME)
+    include = ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+    # vetített indexnél a kérdés vektora is az index terébe kerül
+    res = registry.chroma_query(COLLECTION_NAME, collection, index_vector(q_emb, (path, collection)), k, include)
+    # Chroma visszaad: ids, documents, metadatas, distances
     docs = res["documents"][0]
-    metas = res["metadatas"][0]
+    metas = [dict(m or {}, id=cid, distance=d)
+             for cid, m, d in zip(res["ids"][0], res["metadatas"][0], res["distances"][0])]
+    if with_embeddings:
+        return list(zip(docs, metas, res["embeddings"][0]))
     return list(zip(docs, metas))
 
 
-def build_context_snippet(results):
+def build_context_snippet(results, q_emb=None):
     """Források kontextusba rendezése, hogy a modell lássa,
-    melyik szöveg honnan jött."""
+    melyik szöveg honnan jött. q_emb megadásakor chunkonként csak a
+    kérdéshez legközelebbi mondatok maradnak (sentence_index)."""
+    if q_emb is not None:
+        index = registry.get_sentence_index(COLLECTION_NAME)
+        short = compress([dict(meta, text=text) for text, meta in results], q_emb, index, EMBED_MODEL)
+        results = [(ctx["text"], meta) for ctx, (_, meta) in zip(short, results)]
+
     parts = []
     for i, (text, meta) in enumerate(results):
         title = meta.get("title") or ""
@@ -57,61 +97,214 @@ def build_context_snippet(results):
     return "\n\n-----\n\n".join(parts)
 
 
-def answer(query: str):
-    results = retrieve(query, k=6)
+def snippet_fallback(results) -> str:
     if not results:
-        system = "Te egy Rackhost ügyfélszolgálati asszisztens vagy. Ha nincs adatod, mondd ki egyenesen."
-        msgs = [
-            {"role": "system", "content": system},
-            {"role": "user", "content": query},
-        ]
+        return "A tudásbázisban nincs rá egyértelmű adat, és az LLM most nem érhető el."
+    text, meta = results[0]
+    snippet = " ".join(text.split()[:60]) + "..."
+    return f"{meta.get('title') or ''}\n{snippet}\n\nForrás: {meta.get('url') or '-'}"
+
+
+def is_followup(query: str) -> bool:
+    return bool(FOLLOWUP_RE.match(query)) or len(query.split()) <= FOLLOWUP_MAX_WORDS
+
+
+class ChatSession:
+    """
+    Egy beszélgetés: a korábbi fordulók találatai (chunk → szöveg, meta,
+    embedding) és kérdései. A rákérdezéseket ("és ha VPS-em van?") az
+    előző kérdés vektorával keverjük, és először a jelölt-poolon
+    pontozzuk újra; teljes keresés csak gyenge pool találatnál fut.
+    """
+
+    def __init__(self, k: int = 6, pool_size: int = POOL_MAX_CHUNKS):
+        self.k = max(k, GATE_K)   # a kapu GATE_K találaton dönt
+        self.pool_size = pool_size
+        self.pool = OrderedDict()       # chunk_id → (szöveg, meta, embedding)
+        self.history = []               # (kérdés, válasz)
+        self.prev_emb = None
+        self.turns = []                 # fordulónként: {"source", "timings"}
+
+    def query_vector(self, query: str):
+        q_emb = embed(query)
+        if self.prev_emb is not None and is_followup(query):
+            q = np.asarray(q_emb, dtype=np.float32) + FOLLOWUP_CONTEXT_WEIGHT * np.asarray(self.prev_emb, dtype=np.float32)
+            q_emb = (q / max(float(np.linalg.norm(q)), 1e-12)).tolist()
+        return q_emb
+
+    def _rescore_pool(self, q_emb) -> list:
+        q = np.asarray(index_vector(q_emb), dtype=np.float32)
+        ids = list(self.pool)
+        embs = np.asarray([self.pool[cid][2] for cid in ids], dtype=np.float32)
+        # ugyanazon a skálán, mint a Chroma távolság (a kapu küszöbei erre vonatkoznak)
+        space = (registry.get_collection(COLLECTION_NAME).metadata or {}).get("hnsw:space", "l2")
+        if space == "l2":
+            diff = embs - q
+            dist = np.einsum("ij,ij->i", diff, diff)
+        elif space == "cosine":
+            dist = 1.0 - embs @ q / np.maximum(np.linalg.norm(embs, axis=1) * np.linalg.norm(q), 1e-12)
+        else:
+            dist = 1.0 - embs @ q
+        order = np.argsort(dist)[:self.k]
+        return [(self.pool[ids[i]][0], dict(self.pool[ids[i]][1], distance=float(dist[i]))) for i in order]
+
+    def _remember(self, found: list) -> None:
+        for text, meta, emb in found:
+            self.pool[meta["id"]] = (text, {k: v for k, v in meta.items() if k != "distance"}, emb)
+            self.pool.move_to_end(meta["id"])
+        while len(self.pool) > self.pool_size:
+            self.pool.popitem(last=False)
+
+    def retrieve(self, query: str, q_emb) -> tuple:
+        """(találatok, "pool" | "full")"""
+        if self.pool:
+            hits = self._rescore_pool(q_emb)
+            if get_gate(COLLECTION_NAME).peek([meta for _, meta in hits]) == "generate":
+                for _, meta in hits:
+                    self.pool.move_to_end(meta["id"])
+                return hits, "pool"
+        found = retrieve(query, k=self.k, q_emb=q_emb, with_embeddings=True)
+        self._remember(found)
+        return [(text, meta) for text, meta, _ in found], "full"
+
+    def record(self, query: str, reply: str, q_emb, source: str, timings: dict) -> None:
+        self.history = (self.history + [(query, reply)])[-HISTORY_TURNS:]
+        self.prev_emb = q_emb
+        self.turns.append({"source": source, "timings": timings})
+
+    def history_prompt(self) -> str:
+        if not self.history:
+            return ""
+        lines = [f"- Kérdés: {q}\n  Válasz: {' '.join(a.split())[:300]}" for q, a in self.history]
+        return "KORÁBBI FORDULÓK (csak az összefüggéshez):\n" + "\n".join(lines) + "\n\n"
+
+    def ask(self, query: str) -> str:
+        return answer(query, session=self)
+
+    def report(self) -> str:
+        if not self.turns:
+            return "Még nem volt kérdés."
+        by_source = {src: [t for t in self.turns if t["source"] == src] for src in ("pool", "full")}
+        avoided = len(by_source["pool"])
+        lines = [f"Fordulók: {len(self.turns)}, teljes keresés elkerülve: {avoided} "
+                 f"({100.0 * avoided / len(self.turns):.0f}%)"]
+        for src, turns in by_source.items():
+            if turns:
+                avg = sum(t["timings"].get("retrieve", 0.0) for t in turns) / len(turns) * 1000
+                lines.append(f"  {src:<5} keresés: {len(turns)} forduló, átlag {avg:.0f} ms")
+        return "\n".join(lines)
+
+
+def answer(query: str, session: ChatSession = None):
+    # trace: a query loghoz (találatok, kapu döntés, lépésidők)
+    trace = {"results": [], "decision": None, "source": "full", "timings": {}}
+    t0 = time.perf_counter()
+    try:
+        return _answer(query, trace, session)
+    finally:
+        trace["timings"]["total"] = time.perf_counter() - t0
+        log_query("rag_chat", query, [meta for _, meta in trace["results"]], trace["timings"],
+                  decision=trace["decision"], source=trace["source"])
+
+
+def _answer(query: str, trace: dict, session: ChatSession = None):
+    timings = trace["timings"]
+    t = time.perf_counter()
+    q_emb = session.query_vector(query) if session is not None else embed(query)
+    timings["embed"] = time.perf_counter() - t
+    t = time.perf_counter()
+    if session is not None:
+        results, trace["source"] = session.retrieve(query, q_emb)
     else:
-        context = build_context_snippet(results)
-
-        system = dedent("""
-        Te egy Rackhost ügyfélszolgálati asszisztens vagy.
-        Csak az alábbi KONTEKSTUS alapján válaszolj.
-        Ha a kontextus nem tartalmaz választ, mondd ki egyenesen, hogy a tudásbázisban nincs rá egyértelmű adat.
-        Mindig hivatkozz a releváns forrás(ok) számára (pl. [1], [3]) és ha van, említsd a URL-t.
-        Ne találj ki új szabályokat vagy árakat.
-        """).strip()
-
-        user_prompt = f"""
-        KÉRDÉS:
-        {query}
-
-        KONTEKSTUS (tudásbázis cikk chunkok):
-
-        {context}
-        """.strip()
-
-        msgs = [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user_prompt},
-        ]
-
-    resp = client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=msgs,
-        temperature=0.1,
-    )
-    return resp.choices[0].message.content
+        results = retrieve(query, k=6, q_emb=q_emb)
+    trace["results"] = results
+    timings["retrieve"] = time.perf_counter() - t
+
+    reply = _respond(query, results, q_emb, trace, session)
+    if session is not None:
+        session.record(query, reply, q_emb, trace["source"], timings)
+    return reply
+
+
+def _respond(query: str, results: list, q_emb, trace: dict, session: ChatSession = None):
+    timings = trace["timings"]
+
+    # Kapu: találat nélkül / bizonytalan találatnál nem hívjuk a chat modellt
+    decision = trace["decision"] = get_gate(COLLECTION_NAME).decide([meta for _, meta in results])
+    if decision == "refuse":
+        return REFUSAL_TEXT
+    if decision == "snippet":
+        return snippet_fallback(results)
+
+    context = build_context_snippet(results, q_emb)
+
+    system = dedent("""
+    Te egy Rackhost ügyfélszolgálati asszisztens vagy.
+    Csak az alábbi KONTEKSTUS alapján válaszolj.
+    Ha a kontextus nem tartalmaz választ, mondd ki egyenesen, hogy a tudásbázisban nincs rá egyértelmű adat.
+    Mindig hivatkozz a releváns forrás(ok) számára (pl. [1], [3]) és ha van, említsd a URL-t.
+    Ne találj ki új szabályokat vagy árakat.
+    """).strip()
+
+    user_prompt = f"""
+    KÉRDÉS:
+    {query}
+
+    KONTEKSTUS (tudásbázis cikk chunkok):
+
+    {context}
+    """.strip()
+    if session is not None:
+        user_prompt = session.history_prompt() + user_prompt
+
+    # közös generátor-réteg: timeout, circuit breaker → hiba esetén snippet
+    t = time.perf_counter()
+    reply = llm.generate(user_prompt, system=system, max_tokens=800)
+    timings["generate"] = time.perf_counter() - t
+    if not reply:
+        trace["decision"] = "fallback"
+    return reply or snippet_fallback(results)
+
+
+def check_setup() -> str:
+    """Indulás előtt: létezik-e a kollekció, és ugyanazzal az embedderrel épült-e. Hibaüzenet vagy ""."""
+    try:
+        registry.check_embedding(COLLECTION_NAME, EMBED_MODEL, EMBED_DIM)
+    except (KeyError, EmbedderMismatchError) as e:
+        return (f"{e}\nA chat {EMBED_MODEL} embeddinget használ: vegyél fel egy ezzel épült kollekciót a "
+                f"collections.json-ba, és add meg a nevét: RAG_CHAT_COLLECTION=<név>")
+    return ""
 
 
 def main():
+    problem = check_setup()
+    if problem:
+        print(f"❌ {problem}")
+        sys.exit(1)
+
     print("Rackhost KB RAG agent. Kilépéshez: üres sor vagy Ctrl+C.\n")
+    session = ChatSession()
     while True:
         try:
             q = input("Kérdés: ").strip()
             if not q:
                 break
-            ans = answer(q)
+            ans = session.ask(q)
             print("\nVálasz:\n")
             print(ans)
+            turn = session.turns[-1]
+            print(f"\n⏱️  {'pool (teljes keresés nélkül)' if turn['source'] == 'pool' else 'teljes keresés'}: "
+                  f"{turn['timings']['retrieve'] * 1000:.0f} ms, összesen {turn['timings']['total']:.1f} s")
             print("\n" + "=" * 60 + "\n")
+        except EmbedderMismatchError as e:
+            # pl. futás közben élesített, más embedderrel épült snapshot
+            print(f"\n❌ {e}\n")
         except KeyboardInterrupt:
             break
 
+    print("\n" + session.report())
+    print("\n" + confidence_gate_report())
+
 
 if __name__ == "__main__":
     main()
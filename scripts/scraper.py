@@ -1,5 +1,8 @@
 import time
 import json
+import hashlib
+import threading
+from pathlib import Path
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
@@ -7,6 +10,11 @@ from urllib.parse import urljoin
 BASE_URL = "https://www.rackhost.hu"
 KB_ROOT = "https://www.rackhost.hu/tudasbazis/"
 
+# Nyers HTML cache: az extrakció (extract_articles.py) letöltés nélkül újrafuttatható
+RAW_DIR = Path(__file__).resolve().parent.parent / "data" / "raw"
+RAW_INDEX = "index.jsonl"   # soronként: url, file, fetched_at
+_raw_lock = threading.Lock()   # a pipeline több szálon tölt le
+
 session = requests.Session()
 session.headers.update({
     "User-Agent": "Rackhost-KB-Export/1.0 (internal)"
@@ -54,8 +62,27 @@ def collect_article_urls_from_category(cat_url):
 
     return sorted(urls)
 
-def parse_article(url):
-    soup = get_soup(url)
+def raw_path(url, raw_dir=RAW_DIR):
+    return Path(raw_dir) / (hashlib.md5(url.encode("utf-8")).hexdigest() + ".html")
+
+def save_raw(url, html, raw_dir=RAW_DIR):
+    path = raw_path(url, raw_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(html, encoding="utf-8")
+    with _raw_lock, open(Path(raw_dir) / RAW_INDEX, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"url": url, "file": path.name, "fetched_at": time.time()}) + "\n")
+
+def fetch_html(url, raw_dir=RAW_DIR):
+    """Nyers oldal letöltése; raw_dir megadásakor a cache-be is mentjük."""
+    resp = session.get(url, timeout=10)
+    resp.raise_for_status()
+    if raw_dir is not None:
+        save_raw(url, resp.text, raw_dir)
+    return resp.text
+
+def parse_html(url, html):
+    """Referencia extrakció (BeautifulSoup); a gyors változat: extract_articles.py."""
+    soup = BeautifulSoup(html, "html.parser")
 
     # Ezeket a selektorokat a konkrét HTML alapján kell pontosítani
     title_el = soup.find("h1")
@@ -86,9 +113,12 @@ def parse_article(url):
         "text": content_text
     }
 
-def main():
-    all_article_urls = set()
+def parse_article(url):
+    return parse_html(url, fetch_html(url))
 
+def iter_article_urls():
+    """Cikk URL-ek streamelve, kategóriánként ahogy előkerülnek (egyedi)."""
+    seen = set()
     category_urls = collect_category_urls()
     print("Kategóriák:", len(category_urls))
 
@@ -96,18 +126,40 @@ def main():
         print("Kategória:", cat)
         urls = collect_article_urls_from_category(cat)
         print("  Cikkek:", len(urls))
-        all_article_urls.update(urls)
+        for url in urls:
+            if url not in seen:
+                seen.add(url)
+                yield url
+
+def fetch_article(url, delay=0.5):
+    """Egy cikk letöltése; hiba esetén None (a pipeline is ezt hívja)."""
+    try:
+        art = parse_article(url)
+        time.sleep(delay)
+        return art
+    except Exception as e:
+        print("Hiba:", url, e)
+        return None
+
+def fetch_raw(url, delay=0.5):
+    """Csak letöltés (extrakció nélkül) a pipeline-nak; hiba esetén None."""
+    try:
+        html = fetch_html(url)
+        time.sleep(delay)
+        return {"url": url, "html": html}
+    except Exception as e:
+        print("Hiba:", url, e)
+        return None
 
+def main():
+    all_article_urls = set(iter_article_urls())
     print("Összes egyedi cikk:", len(all_article_urls))
 
     with open("kb_export.jsonl", "w", encoding="utf-8") as f:
         for url in sorted(all_article_urls):
-            try:
-                art = parse_article(url)
+            art = fetch_article(url)
+            if art:
                 f.write(json.dumps(art, ensure_ascii=False) + "\n")
-                time.sleep(0.5)
-            except Exception as e:
-                print("Hiba:", url, e)
 
 if __name__ == "__main__":
     main()